@@ -0,0 +1,11 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Performance benchmarks for Plover.
+
+Each module in this package is a standalone script. Run them from the top of
+the source tree, e.g.:
+
+python -m benchmarks.dictionary_cache
+
+"""
@@ -0,0 +1,89 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Translating and formatting with action templates compiled at load time.
+
+Strokes for a realistic word stream are translated with the formatter
+listening, as in the engine. Translations are parsed by the formatter, with
+its parse cache, or compiled when the dictionary is loaded. A memory mapped
+compiled dictionary compiles them as they are looked up instead.
+
+Run with: python -m benchmarks.action_templates [strokes] [entries]
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import report, synthetic_entries, timeit
+from benchmarks.formatting import word_stream
+from plover import formatting
+from plover.dictionary_cache import CompiledDictionary, compile_dictionary
+from plover.formatting import Formatter
+from plover.steno import normalize_steno
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translator
+
+
+class _Stroke(object):
+
+    def __init__(self, rtfcre):
+        self.rtfcre = rtfcre
+        self.is_correction = rtfcre == '*'
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    translations = word_stream(entries, entries)
+    d = StenoDictionary((normalize_steno(k), english) for (k, v), english
+                        in zip(synthetic_entries(entries), translations))
+    # Write the keys with the same distribution as the word stream.
+    keys_by_english = {}
+    for key, english in d.iteritems():
+        keys_by_english.setdefault(english, key)
+    strokes = []
+    for english in word_stream(count, entries):
+        key = keys_by_english.get(english)
+        if key is not None:
+            strokes.extend(_Stroke(s) for s in key)
+    translator = Translator()
+    translator.set_dictionary(d)
+    translator.set_min_undo_length(10)
+    formatter = Formatter()
+    translator.add_listener(formatter.format)
+
+    def run():
+        translator.clear_state()
+        for stroke in strokes:
+            translator.translate(stroke)
+
+    report('compile dictionary',
+           timeit(lambda: (d.set_value_compiler(None),
+                           d.set_value_compiler(
+                               formatting.compile_translation)), 1),
+           len(d), 'entry')
+    d.set_value_compiler(None)
+    report('parse cache', timeit(run), len(strokes), 'stroke')
+    d.set_value_compiler(formatting.compile_translation)
+    report('compiled templates', timeit(run), len(strokes), 'stroke')
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'dict.plvc')
+        compile_dictionary(d, filename)
+        mapped = CompiledDictionary(filename)
+        translator.set_dictionary(mapped)
+        report('mapped, parse cache', timeit(run), len(strokes), 'stroke')
+        mapped.set_value_compiler(formatting.compile_translation)
+        report('mapped, compiled on lookup', timeit(run), len(strokes),
+               'stroke')
+        mapped.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Helpers shared by the benchmarks."""
+
+import json
+import random
+import time
+
+# Keys in steno order, used to generate plausible strokes.
+LEFT_KEYS = ('S', 'T', 'K', 'P', 'W', 'H', 'R')
+VOWEL_KEYS = ('A', 'O', '*', 'E', 'U')
+RIGHT_KEYS = ('F', 'R', 'P', 'B', 'L', 'G', 'T', 'S', 'D', 'Z')
+
+
+def random_stroke(rng):
+    """Return a random stroke in normalized RTF/CRE form."""
+    left = ''.join(k for k in LEFT_KEYS if rng.random() < 0.25)
+    vowels = ''.join(k for k in VOWEL_KEYS if rng.random() < 0.3)
+    right = ''.join(k for k in RIGHT_KEYS if rng.random() < 0.25)
+    if not (left or vowels or right):
+        left = rng.choice(LEFT_KEYS)
+    if vowels:
+        return left + vowels + right
+    if right:
+        return left + '-' + right
+    return left
+
+
+def random_word(rng, length=None):
+    if length is None:
+        length = rng.randint(2, 10)
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+                   for i in xrange(length))
+
+
+def synthetic_entries(count, seed=0, max_strokes=4, stroke_pool=None):
+    """Return a list of (strokes, translation) pairs.
+
+    strokes is a '/' separated string as found in a json dictionary. If
+    stroke_pool is given the strokes are drawn from that many distinct strokes,
+    like in a real dictionary, instead of being all random.
+
+    """
+    rng = random.Random(seed)
+    if stroke_pool:
+        pool = [random_stroke(rng) for i in xrange(stroke_pool)]
+        stroke = lambda: rng.choice(pool)
+    else:
+        stroke = lambda: random_stroke(rng)
+    entries = {}
+    while len(entries) < count:
+        length = min(rng.randint(1, max_strokes), rng.randint(1, max_strokes))
+        strokes = '/'.join(stroke() for i in xrange(length))
+        entries[strokes] = random_word(rng)
+    return sorted(entries.items())
+
+
+def write_json_dictionary(filename, entries):
+    with open(filename, 'wb') as f:
+        json.dump(dict(entries), f, indent=0, sort_keys=True)
+
+
+def timeit(fn, repeat=3):
+    """Return the best wall clock time of fn over repeat runs."""
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, seconds, count=None, unit='op'):
+    if count:
+        print '%-40s %10.3f ms  %10.2f us/%s' % (name, seconds * 1000,
+                                                seconds * 1e6 / count, unit)
+    else:
+        print '%-40s %10.3f ms' % (name, seconds * 1000)
@@ -0,0 +1,80 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Cold versus warm dictionary loading through the compiled cache.
+
+Cold: parse the json file with load_dictionary, as the engine used to.
+Compile: cold load plus writing the compiled cache file.
+Warm: validate and map an existing compiled cache file.
+
+Run with: python -m benchmarks.dictionary_cache [entries]
+
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import (report, synthetic_entries, timeit,
+                               write_json_dictionary)
+from plover.dictionary_cache import (cache_filename, load_dictionary_file)
+from plover.steno import normalize_steno
+from plover.steno_dictionary import load_dictionary
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 150000
+    tmp = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmp, 'dict.json')
+        cache_dir = os.path.join(tmp, 'cache')
+        entries = synthetic_entries(count)
+        write_json_dictionary(source, entries)
+        print 'dictionary: %d entries, %d bytes' % (count,
+                                                    os.path.getsize(source))
+
+        def cold():
+            with open(source, 'rb') as f:
+                load_dictionary(f.read())
+
+        def compile_():
+            cached = cache_filename(source, cache_dir)
+            if os.path.exists(cached):
+                os.remove(cached)
+            load_dictionary_file(source, cache_dir).close()
+
+        def warm():
+            load_dictionary_file(source, cache_dir).close()
+
+        report('cold json load', timeit(cold))
+        report('cold load + compile', timeit(compile_))
+        report('warm compiled load', timeit(warm))
+
+        rng = random.Random(1)
+        keys = [normalize_steno(k)
+                for k, v in rng.sample(entries, min(10000, len(entries)))]
+        keys.extend(normalize_steno(k + '/S') for k, v in entries[:10000])
+        with open(source, 'rb') as f:
+            parsed = load_dictionary(f.read())
+        compiled = load_dictionary_file(source, cache_dir)
+
+        def lookups(d):
+            def run():
+                get = d.get
+                for k in keys:
+                    get(k)
+            return run
+
+        report('lookup StenoDictionary', timeit(lookups(parsed)), len(keys),
+               'lookup')
+        report('lookup CompiledDictionary', timeit(lookups(compiled)),
+               len(keys), 'lookup')
+        compiled.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
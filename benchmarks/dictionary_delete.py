@@ -0,0 +1,61 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Deleting every entry of a dictionary, longest keys first.
+
+"rescan" recomputes longest_key by scanning all keys whenever a longest key is
+deleted, as StenoDictionary used to. "histogram" is the current per-length
+count, "delete_many" deletes in one batch and notifies listeners once.
+
+Run with: python -m benchmarks.dictionary_delete [entries]
+
+"""
+
+import sys
+import time
+
+from benchmarks.common import report, synthetic_entries
+from plover.steno import normalize_steno
+from plover.steno_dictionary import StenoDictionary
+
+
+class _RescanDictionary(StenoDictionary):
+
+    def __delitem__(self, key):
+        self._remove(key)
+        if len(key) == self.longest_key:
+            if self._dict:
+                self._longest_key = max(len(x) for x in self._dict.iterkeys())
+            else:
+                self._longest_key = 0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    entries = [(normalize_steno(k), v) for k, v in synthetic_entries(count)]
+    keys = sorted((k for k, v in entries), key=len, reverse=True)
+
+    def run(cls, batch):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+        d = cls(entries)
+        d.add_longest_key_listener(listener)
+        start = time.time()
+        if batch:
+            d.delete_many(keys)
+        else:
+            for key in keys:
+                del d[key]
+        return time.time() - start, len(notifications)
+
+    for name, cls, batch in (('rescan', _RescanDictionary, False),
+                             ('histogram', StenoDictionary, False),
+                             ('delete_many', StenoDictionary, True)):
+        seconds, notified = run(cls, batch)
+        report('%s (%d notifications)' % (name, notified), seconds,
+               len(keys), 'delete')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Memory used by StenoDictionary and CompactStenoDictionary.
+
+Sizes are the sum of sys.getsizeof over every object reachable from the
+dictionary, counting shared objects once. The compact dictionary's stroke
+table is shared by all compact dictionaries but is included in full.
+
+The synthetic dictionary draws its strokes from 30000 distinct strokes.
+
+Run with: python -m benchmarks.dictionary_memory [entries]
+
+"""
+
+import os
+import sys
+import time
+
+from benchmarks.common import report, synthetic_entries
+from plover import config as conf
+from plover.steno import normalize_steno
+from plover.steno_dictionary import (CompactStenoDictionary, StenoDictionary,
+                                     load_dictionary)
+
+
+def deep_getsizeof(*objects):
+    """Return the total size of the objects and everything they contain."""
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return total
+
+
+def measure(name, entries):
+    for cls in (StenoDictionary, CompactStenoDictionary):
+        start = time.time()
+        d = cls(entries)
+        elapsed = time.time() - start
+        if cls is CompactStenoDictionary:
+            size = deep_getsizeof(d, cls._stroke_numbers, cls._strokes)
+        else:
+            size = deep_getsizeof(d)
+        print '%s %s: %.1f MB, %d bytes/entry' % (
+            name, cls.__name__, size / 1048576.0, size / len(entries))
+        report('%s %s build' % (name, cls.__name__), elapsed, len(entries),
+               'entry')
+        del d
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    with open(os.path.join(conf.ASSETS_DIR, 'dict.json'), 'rb') as f:
+        entries = load_dictionary(f.read()).items()
+    measure('dict.json', entries)
+    entries = [(normalize_steno(k), v)
+               for k, v in synthetic_entries(count, stroke_pool=30000)]
+    measure('synthetic', entries)
+
+
+if __name__ == '__main__':
+    main()
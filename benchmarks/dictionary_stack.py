@@ -0,0 +1,87 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Latency from saving a dictionary to the translator seeing the change.
+
+Compares rebuilding one merged dictionary from every loaded dictionary, which
+the engine did on each save, with updating the edited layer of the dictionary
+stack. Writing the json file is the same for both and is not measured.
+
+Run with: python -m benchmarks.dictionary_stack [dictionaries] [entries]
+
+"""
+
+import collections
+import sys
+import time
+
+from benchmarks.common import report, synthetic_entries, timeit
+from dictionarymanager.store.Dictionary import Dictionary
+from dictionarymanager.store.Store import Store
+from plover.steno import normalize_steno
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translator
+
+
+class _Config(object):
+    """A config with no dictionaries so the store doesn't touch any files."""
+
+    def has_option(self, section, option):
+        return False
+
+
+def make_store(count, entries):
+    store = Store(_Config())
+    for i in xrange(count):
+        filename = 'bench%d' % i
+        dictionary = Dictionary()
+        dictionary.data = collections.OrderedDict(
+            synthetic_entries(entries, seed=i))
+        dictionary.applyChanges()
+        store.dictionaries[filename] = dictionary
+        store.dictionaryFilenames.append(filename)
+    return store
+
+
+def merged(store):
+    """The merged dictionary as the engine used to build it on each save."""
+    merged = StenoDictionary()
+    items = store.dictionaries.values()
+    for i in range(len(items)-1, -1, -1):
+        merged.update((normalize_steno(k), items[i][k]) for k in items[i])
+    return merged
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    print 'building %d dictionaries of %d entries' % (count, entries)
+    store = make_store(count, entries)
+    translator = Translator()
+
+    report('full merge + set_dictionary',
+           timeit(lambda: translator.set_dictionary(merged(store)), repeat=1))
+
+    start = time.time()
+    stack = store.getStack()
+    translator.set_dictionary(stack)
+    report('initial stack build', time.time() - start)
+
+    filename = store.dictionaryFilenames[0]
+    dictionary = store.dictionaries[filename]
+    stroke, translation = next(dictionary.iteritems())
+    dictionary.change(stroke, translation, stroke, translation + 'x')
+    dictionary.insert('STKPWHR/STKPWHR', 'new entry')
+    report('stack update after save', timeit(
+        lambda: store.updateLayer(filename)))
+    assert stack.get(normalize_steno(stroke)) == translation + 'x'
+
+    layers = stack.dicts
+    report('reorder stack', timeit(
+        lambda: stack.set_dicts(reversed(layers))))
+    report('remove and re-add a layer', timeit(
+        lambda: (stack.remove(layers[0]), stack.insert(0, layers[0]))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Formatting a realistic stream of translations.
+
+Words are drawn with a Zipf-like distribution from a vocabulary, like in real
+writing, mixed with suffixes, punctuation and the occasional capitalization.
+The stream is formatted with the atom parse cache disabled and enabled.
+
+Run with: python -m benchmarks.formatting [translations] [vocabulary]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import random_word, report, timeit
+from plover import formatting
+from plover.formatting import Formatter
+
+
+class _Translation(object):
+
+    def __init__(self, english):
+        self.rtfcre = ('S',)
+        self.english = english
+        self.formatting = None
+
+
+def word_stream(count, vocabulary, seed=5):
+    rng = random.Random(seed)
+    words = [random_word(rng) for i in xrange(vocabulary)]
+    extras = ['{^s}', '{^ing}', '{^ed}', '{.}', '{,}', '{-|}', '{^}',
+              'the {^}', '{&a}', '{#Return}']
+    weights = [1.0 / (rank + 1) for rank in xrange(vocabulary)]
+    total = sum(weights)
+    cumulative = []
+    running = 0
+    for w in weights:
+        running += w / total
+        cumulative.append(running)
+
+    def pick():
+        x = rng.random()
+        lo, hi = 0, len(cumulative) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cumulative[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return words[lo]
+
+    return [rng.choice(extras) if rng.random() < 0.15 else pick()
+            for i in xrange(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    vocabulary = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    stream = word_stream(count, vocabulary)
+    translations = [_Translation(english) for english in stream]
+    formatter = Formatter()
+
+    def run():
+        prev = None
+        for t in translations:
+            formatter.format([], [t], prev)
+            prev = t
+
+    cache = formatting.parse_cache
+    size = cache.size
+    cache.resize(0)
+    cache.clear()
+    report('no parse cache', timeit(run), count, 'translation')
+    cache.resize(size)
+    cache.clear()
+    run()
+    print 'parse cache of %d: %.1f%% hits' % (
+        size, 100.0 * cache.hits / (cache.hits + cache.misses))
+    report('parse cache', timeit(run), count, 'translation')
+
+
+if __name__ == '__main__':
+    main()
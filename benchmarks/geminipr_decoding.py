@@ -0,0 +1,97 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Decoding Gemini PR packets from clean and corrupted streams.
+
+Compares the table driven decoder with the bit loop it replaced, which read
+one packet at a time and checked every byte. The corrupted stream has bytes
+dropped, garbage bytes inserted and bytes with a flipped MSB, so the decoder
+has to resynchronize.
+
+Run with: python -m benchmarks.geminipr_decoding [packets]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import report, timeit
+from plover.machine.geminipr import (BYTES_PER_STROKE, STENO_KEY_CHART, decode,
+                                     mask_to_keys)
+
+
+def random_packet(rng):
+    packet = bytearray(BYTES_PER_STROKE)
+    packet[0] = 0x80
+    for i in rng.sample(xrange(len(STENO_KEY_CHART)), rng.randint(1, 6)):
+        packet[i // 7] |= 0x40 >> (i % 7)
+    return packet
+
+
+def corrupt(data, rng, rate):
+    """Return data with about rate of its bytes damaged."""
+    out = bytearray()
+    for b in data:
+        if rng.random() < rate:
+            damage = rng.randint(0, 2)
+            if damage == 0:
+                continue
+            elif damage == 1:
+                out.append(rng.randint(0, 255))
+            else:
+                b ^= 0x80
+        out.append(b)
+    return out
+
+
+def bit_loop(data):
+    """Decode packets the way the original decoder did."""
+    strokes = []
+    for start in xrange(0, len(data) - BYTES_PER_STROKE + 1,
+                        BYTES_PER_STROKE):
+        raw = data[start:start + BYTES_PER_STROKE]
+        if not ((raw[0] & 0x80) and
+                (len([b for b in raw if b & 0x80]) == 1)):
+            continue
+        steno_keys = []
+        for i, b in enumerate(raw):
+            for j in range(1, 8):
+                if (b & (0x80 >> j)):
+                    steno_keys.append(STENO_KEY_CHART[i * 7 + j - 1])
+        strokes.append(steno_keys)
+    return strokes
+
+
+def chunked_decode(data, chunk_size):
+    """Decode data read in chunks, as the machine thread does."""
+    buf = bytearray()
+    strokes = []
+    for start in xrange(0, len(data), chunk_size):
+        buf.extend(data[start:start + chunk_size])
+        masks, skipped, end = decode(buf)
+        del buf[:end]
+        strokes.extend(mask_to_keys(mask) for mask in masks)
+    return strokes
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(7)
+    chords = [random_packet(rng) for i in xrange(3000)]
+    clean = bytearray().join(rng.choice(chords) for i in xrange(count))
+    corrupted = corrupt(clean, rng, 0.01)
+
+    report('bit loop, clean', timeit(lambda: bit_loop(clean)), count,
+           'packet')
+    for name, data in (('clean', clean), ('1% corrupted', corrupted)):
+        for chunk_size in (BYTES_PER_STROKE, 4096):
+            report('tables, %s, %d byte reads' % (name, chunk_size),
+                   timeit(lambda: chunked_decode(data, chunk_size)), count,
+                   'packet')
+    masks, skipped, end = decode(corrupted)
+    print '1%% corrupted: %d of %d packets decoded, %d bytes skipped' % (
+        len(masks), count, skipped)
+
+
+if __name__ == '__main__':
+    main()
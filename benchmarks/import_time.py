@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Startup import time with lazily imported machine drivers.
+
+Each scenario runs in a fresh interpreter with __import__ wrapped to time
+every module imported for the first time, like python -X importtime on newer
+Pythons. Importing plover.config alone, as the tools do, and the Gemini PR
+setup, which imports the engine and only its driver, are compared with also
+importing all four drivers, as plover.config used to. The modules of the
+Gemini PR setup are listed with their own and cumulative import times.
+
+Run with: python -m benchmarks.import_time [runs] [modules listed]
+
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+_EAGER_DRIVERS = ('import plover.machine.geminipr, plover.machine.txbolt, '
+                  'plover.machine.sidewinder, plover.machine.stentura')
+
+SCENARIOS = (
+    ('plover.config', 'import plover.config'),
+    ('plover.config, eager drivers (before)',
+     'import plover.config; ' + _EAGER_DRIVERS),
+    ('Gemini PR setup',
+     'import plover.app, plover.machine; '
+     'plover.machine.import_machine("Gemini PR")'),
+    ('Gemini PR setup, eager drivers (before)',
+     'import plover.app; ' + _EAGER_DRIVERS),
+)
+
+# Runs in the child interpreter. Prints the (module, self seconds, cumulative
+# seconds) of each module imported by the statement, in import order.
+_CHILD = r'''
+import __builtin__, json, sys, time
+original_import = __builtin__.__import__
+times = []
+stack = [0.0]
+def timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    before = set(sys.modules)
+    stack.append(0.0)
+    start = time.time()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        nested = stack.pop()
+        stack[-1] += elapsed
+        new = [m for m in sys.modules
+               if m not in before and sys.modules[m] is not None]
+        if new:
+            times.append((name, elapsed - nested, elapsed, len(new)))
+__builtin__.__import__ = timed_import
+start = time.time()
+exec %r
+total = time.time() - start
+__builtin__.__import__ = original_import
+print json.dumps({'total': total, 'modules': len(sys.modules),
+                  'imports': times})
+'''
+
+
+def run(statement):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(
+        [sys.executable, '-c', _CHILD % statement], cwd=root)
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    listed = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    results = {}
+    for name, statement in SCENARIOS:
+        best = min((run(statement) for i in xrange(runs)),
+                   key=lambda r: r['total'])
+        results[name] = best
+        print '%-40s %10.3f ms  %4d modules' % (name, best['total'] * 1000,
+                                                best['modules'])
+    for name in ('plover.config', 'Gemini PR setup'):
+        saving = (results[name + ', eager drivers (before)']['total'] -
+                  results[name]['total'])
+        print '%-40s %10.3f ms' % ('saving, ' + name, saving * 1000)
+
+    print
+    print 'Gemini PR setup, slowest imports:'
+    print '%10s %10s  %s' % ('self ms', 'cumul. ms', 'import')
+    imports = sorted(results['Gemini PR setup']['imports'],
+                     key=lambda i: -i[2])
+    for name, own, cumulative, count in imports[:listed]:
+        print '%10.3f %10.3f  %s (%d modules)' % (own * 1000,
+                                                  cumulative * 1000, name,
+                                                  count)
+
+
+if __name__ == '__main__':
+    main()
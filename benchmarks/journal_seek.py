@@ -0,0 +1,94 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Size and access times of the stroke journal against the text log.
+
+Writes a text stroke log of a long session, converts it to a journal and
+compares the file sizes, the time to read all strokes, and the time to read
+the strokes of the last minute, which the text log can only find by parsing
+from the start.
+
+Run with: python -m benchmarks.journal_seek [strokes]
+
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import report, timeit
+from plover.journal import Journal, convert_log
+from plover.steno import STENO_KEY_MASKS
+from plover.transcript import format_time, parse_log, read_log
+
+
+def write_log(filename, count, seed=0):
+    rng = random.Random(seed)
+    keys = sorted(STENO_KEY_MASKS, key=STENO_KEY_MASKS.get)
+    seconds = 1367400000.0
+    with open(filename, 'wb') as f:
+        for i in xrange(count):
+            seconds += rng.choice((0.1, 0.2, 0.3, 0.5, 2.0))
+            stroke = [key for key in keys if rng.random() < 0.2]
+            f.write('%s Stroke(%s)\n' % (format_time(seconds),
+                                         ' '.join(stroke or keys[1:2])))
+    return seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    directory = tempfile.mkdtemp()
+    try:
+        log = os.path.join(directory, 'plover.log')
+        journal_file = os.path.join(directory, 'plover.journal')
+        last = write_log(log, count)
+
+        def convert():
+            if os.path.exists(journal_file):
+                os.remove(journal_file)
+            convert_log(read_log(log), journal_file)
+        report('convert text log', timeit(convert, 1), count, 'stroke')
+        text_size = os.path.getsize(log)
+        journal_size = os.path.getsize(journal_file)
+        print '%-40s %10d bytes %8.1f bytes/stroke' % (
+            'text log', text_size, float(text_size) / count)
+        print '%-40s %10d bytes %8.1f bytes/stroke' % (
+            'journal', journal_size, float(journal_size) / count)
+
+        def read_text():
+            with open(log, 'rb') as f:
+                for stroke in parse_log(f):
+                    pass
+        def read_journal():
+            with Journal(journal_file) as journal:
+                for stroke in journal.strokes():
+                    pass
+        report('read all, text log', timeit(read_text), count, 'stroke')
+        report('read all, journal', timeit(read_journal), count, 'stroke')
+
+        start = last - 60
+        def last_minute_text():
+            return list(read_log(log, start))
+        def last_minute_journal():
+            return list(read_log(journal_file, start))
+        assert len(last_minute_text()) == len(last_minute_journal())
+        report('last minute, text log', timeit(last_minute_text))
+        report('last minute, journal', timeit(last_minute_journal))
+
+        rng = random.Random(1)
+        with Journal(journal_file) as journal:
+            end = last - journal.start_time
+            targets = [rng.uniform(0, end) for i in xrange(10000)]
+            def seek():
+                for target in targets:
+                    journal.find(target)
+            report('journal find', timeit(seek), len(targets), 'seek')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
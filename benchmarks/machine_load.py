@@ -0,0 +1,116 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Drop rate and latency of strokes from simulated machines.
+
+Each protocol's simulator types random strokes on a pty at increasing speeds
+while the machine's Stenotype reads them and passes them through a translator
+and formatter, as the engine does, with an output that discards the text. A
+stroke counts as received when the formatter is done with it, and its latency
+is the time since the simulator typed it. Strokes are damaged at the given
+rate, which for the Stentura loses the response carrying them.
+
+Run with: python -m benchmarks.machine_load [strokes] [corruption]
+
+"""
+
+import collections
+import sys
+import time
+
+from benchmarks.common import synthetic_entries
+from plover.clock import monotonic
+from plover.formatting import Formatter
+from plover.machine import geminipr, simulator, stentura, txbolt
+from plover.steno import Stroke, normalize_steno
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translator
+
+PROTOCOLS = (
+    ('Gemini PR', simulator.GeminiPRSimulator, geminipr),
+    ('TX Bolt', simulator.TxBoltSimulator, txbolt),
+    ('Stentura', simulator.StenturaSimulator, stentura),
+)
+
+SPEEDS = (300, 600, 1200)
+
+
+class NullOutput(object):
+
+    def send_backspaces(self, count):
+        pass
+
+    def send_string(self, text):
+        pass
+
+    def send_key_combination(self, combo):
+        pass
+
+    def send_engine_command(self, command):
+        pass
+
+
+def run(simulator_class, module, dictionary, count, wpm, corruption):
+    strokes = list(simulator.random_strokes(count, seed=wpm))
+    sim = simulator_class(strokes, wpm=wpm, jitter=0.3,
+                          corruption=corruption)
+    machine = module.Stenotype(**sim.serial_params())
+    translator = Translator()
+    translator.set_dictionary(dictionary)
+    formatter = Formatter()
+    formatter.set_output(NullOutput())
+    translator.add_listener(formatter.format)
+    received = []
+    def callback(keys):
+        try:
+            translator.translate(Stroke.from_keys(keys))
+        except KeyError:
+            pass
+        received.append((monotonic(), tuple(keys)))
+    machine.add_callback(callback)
+    machine.start_capture()
+    sim.start()
+    sim.wait()
+    # Give the last strokes time to arrive, past a TX Bolt stroke timeout or
+    # a Stentura retry.
+    time.sleep(2)
+    machine.stop_capture()
+    machine.join(5)
+    sim.stop()
+
+    # Match each received stroke with the earliest stroke typed with the
+    # same keys.
+    typed = collections.defaultdict(collections.deque)
+    for sent_time, keys in sim.sent:
+        typed[tuple(keys)].append(sent_time)
+    latencies = []
+    for received_time, keys in received:
+        if typed[keys]:
+            latencies.append(received_time - typed[keys].popleft())
+    latencies.sort()
+    dropped = len(sim.sent) - len(latencies)
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    else:
+        p50 = p99 = 0.0
+    return dropped, p50, p99, latencies[-1] if latencies else 0.0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    corruption = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    dictionary = StenoDictionary((normalize_steno(k), v)
+                                 for k, v in synthetic_entries(10000))
+    for name, simulator_class, module in PROTOCOLS:
+        for wpm in SPEEDS:
+            dropped, p50, p99, worst = run(simulator_class, module,
+                                           dictionary, count, wpm, corruption)
+            print ('%-10s %5d wpm  %5.1f%% dropped  p50 %7.2f ms  '
+                   'p99 %7.2f ms  max %7.2f ms' %
+                   (name, wpm, 100.0 * dropped / count, p50 * 1000,
+                    p99 * 1000, worst * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Memory and allocations of Stroke, Translation and formatting actions.
+
+Each class is compared with a copy of itself without __slots__, which keeps
+its attributes in a __dict__ like the classes used to. Sizes count the
+instance and its __dict__, not the attribute values, and allocations count
+the objects tracked by the garbage collector. Action equality, which the
+formatter uses to diff old and new actions, is timed against the old
+__dict__ comparison.
+
+Run with: python -m benchmarks.object_memory [objects]
+
+"""
+
+import gc
+import sys
+
+from benchmarks.common import report, timeit
+from plover.formatting import _Action
+from plover.steno import Stroke
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translation
+
+
+def unslotted(cls):
+    """Return a copy of a slotted class that uses a __dict__."""
+    namespace = dict((k, v) for k, v in cls.__dict__.iteritems()
+                     if k not in cls.__slots__ and k != '__slots__')
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def measure(name, cls, count, make):
+    gc.collect()
+    before = len(gc.get_objects())
+    objects = [make(cls) for i in xrange(count)]
+    allocations = len(gc.get_objects()) - before - 1
+    size = sys.getsizeof(objects[0])
+    if hasattr(objects[0], '__dict__'):
+        size += sys.getsizeof(objects[0].__dict__)
+    print '%-24s %4d bytes, %.1f tracked objects each' % (
+        name, size, allocations / float(count))
+    return objects
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    d = StenoDictionary({('S',): 'is'})
+    stroke = Stroke(['S-'])
+    makers = (
+        (Stroke, lambda cls: cls(['S-', 'T-', '-P'])),
+        (Translation, lambda cls: cls([stroke], d)),
+        (_Action, lambda cls: cls(text=' word', word='word')),
+    )
+    for cls, make in makers:
+        for variant, name in ((unslotted(cls), 'with __dict__'),
+                              (cls, 'slotted')):
+            measure('%s %s' % (cls.__name__, name), variant, count, make)
+
+    dict_action = unslotted(_Action)
+    dict_action.__eq__ = lambda self, other: self.__dict__ == other.__dict__
+
+    def compare(cls, other):
+        pairs = [(cls(text=' word', word='word'), cls(text=other, word='word'))
+                 for i in xrange(count)]
+        def run():
+            for a, b in pairs:
+                a == b
+        return run
+
+    for other, name in ((' word', 'equal'), (' other', 'different')):
+        report('%s actions, __dict__ equality' % name,
+               timeit(compare(dict_action, other)), count, 'comparison')
+        report('%s actions, field equality' % name,
+               timeit(compare(_Action, other)), count, 'comparison')
+    state = _Action(text=' word', word='word', attach=True)
+    report('copy_state', timeit(lambda: [state.copy_state()
+                                         for i in xrange(count)]),
+           count, 'copy')
+
+
+if __name__ == '__main__':
+    main()
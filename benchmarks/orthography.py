@@ -0,0 +1,76 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Adding suffixes to words.
+
+A corpus of words with common English endings gets common suffixes added by
+trying every rule in turn, as add_suffix used to, by the rule index without a
+cache, and by add_suffix with its cache. Suffixed words are drawn with a
+Zipf-like distribution so common words repeat, as in real writing.
+
+Run with: python -m benchmarks.orthography [suffixings] [words]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import random_word, report, timeit
+from plover import orthography
+
+
+ENDINGS = ('', 'e', 'y', 'ch', 'sh', 'ic', 'er', 'et', 'ie', 'x', 'or', 'ate',
+           'ey', 'al')
+SUFFIXES = ('s', 'ing', 'ed', 'er', 'ly', 'ist', 'ful', 'ness', 'able',
+            'ment')
+
+
+def linear_add_suffix(word, suffix):
+    """add_suffix trying every rule in order."""
+    joined = word + " ^ " + suffix
+    for endings, starts, pattern, replacement in orthography.RULES:
+        m = pattern.match(joined)
+        if m:
+            return m.expand(replacement)
+    return word + suffix
+
+
+def corpus(count, words, seed=6):
+    rng = random.Random(seed)
+    vocabulary = [random_word(rng, rng.randint(2, 7)) + rng.choice(ENDINGS)
+                  for i in xrange(words)]
+    pairs = []
+    for i in xrange(count):
+        rank = min(int(rng.paretovariate(1.0)) - 1, words - 1)
+        pairs.append((vocabulary[rank if rng.random() < 0.5 else
+                                 rng.randrange(words)],
+                      rng.choice(SUFFIXES)))
+    return pairs
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    pairs = corpus(count, words)
+    for word, suffix in pairs:
+        assert (orthography.add_suffix(word, suffix) ==
+                linear_add_suffix(word, suffix)), (word, suffix)
+
+    def run(fn):
+        def bench():
+            for word, suffix in pairs:
+                fn(word, suffix)
+        return bench
+
+    def indexed(word, suffix):
+        return orthography._add_suffix((word, suffix))
+
+    report('linear rules', timeit(run(linear_add_suffix)), count, 'suffix')
+    report('indexed rules', timeit(run(indexed)), count, 'suffix')
+    orthography.cache.clear()
+    report('indexed rules + cache', timeit(run(orthography.add_suffix)),
+           count, 'suffix')
+
+
+if __name__ == '__main__':
+    main()
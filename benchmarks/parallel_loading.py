@@ -0,0 +1,76 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Store.loadDictionaries time against the number of dictionary files.
+
+Each file is loaded with a cold compiled cache, reading the files one after
+another in this process and in a pool of worker processes.
+
+Run with: python -m benchmarks.parallel_loading [max files] [entries]
+
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import (report, synthetic_entries, timeit,
+                               write_json_dictionary)
+from dictionarymanager.store.Store import Store
+from plover.dictionary_cache import cache_filename
+
+
+class _Config(object):
+    """A config without any dictionaries."""
+
+    def has_option(self, section, option):
+        return False
+
+
+class _Store(Store):
+    """A store that doesn't write the loaded files to the config."""
+
+    def addDictionaryToActives(self, filename):
+        pass
+
+
+def main():
+    max_files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    print '%d cores, %d entries per file' % (multiprocessing.cpu_count(),
+                                             count)
+    tmp = tempfile.mkdtemp()
+    paths = []
+    try:
+        for i in xrange(max_files):
+            path = os.path.join(tmp, 'dict%d.json' % i)
+            write_json_dictionary(path, synthetic_entries(count, seed=i))
+            paths.append(path)
+
+        def load(files, processes):
+            def run():
+                for path in files:
+                    cached = cache_filename(path)
+                    if os.path.exists(cached):
+                        os.remove(cached)
+                store = _Store(_Config())
+                store.getStack()
+                store.loadDictionaries(files, processes)
+            return run
+
+        for n in xrange(1, max_files + 1):
+            files = paths[:n]
+            report('%d files, one process' % n, timeit(load(files, 1), 1))
+            report('%d files, process pool' % n, timeit(load(files, None), 1))
+    finally:
+        for path in paths:
+            cached = cache_filename(path)
+            if os.path.exists(cached):
+                os.remove(cached)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Packet building and stroke decoding for the Stentura protocol.
+
+Compares the struct and table based stroke parser with the bit loop it
+replaced, request building with the cached header checksum against computing
+it for every packet, and copying response data into the stroke buffer.
+
+Run with: python -m benchmarks.stentura_decoding [strokes]
+
+"""
+
+import array
+import itertools
+import random
+import sys
+
+from benchmarks.common import report, timeit
+from plover.machine import stentura
+
+
+def bit_loop_parse(data):
+    """Parse strokes the way the original parser did."""
+    strokes = []
+    for b in data:
+        if (ord(b) & 0b11000000) != 0b11000000:
+            raise ValueError(b)
+    for a, b, c, d in itertools.izip(*([iter(data)] * 4)):
+        a, b, c, d = ord(a), ord(b), ord(c), ord(d)
+        fullstroke = (((a & 0x3f) << 18) | ((b & 0x3f) << 12) |
+                      ((c & 0x3f) << 6) | d & 0x3f)
+        strokes.append([stentura._STENO_KEY_CHART[i] for i in xrange(24)
+                        if (fullstroke & (1 << (23 - i)))])
+    return strokes
+
+
+def byte_loop_write(buf, offset, data):
+    """Copy data into buf the way the original _write_to_buffer did."""
+    if len(buf) < offset + len(data):
+        buf.extend([0] * (offset + len(data) - len(buf)))
+    for i, v in enumerate(data, offset):
+        if isinstance(v, str):
+            v = ord(v)
+        buf[i] = v
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(5)
+    chords = [''.join(chr(0xc0 | rng.randint(0, 63)) for i in xrange(4))
+              for j in xrange(3000)]
+    data = ''.join(rng.choice(chords) for i in xrange(count))
+
+    report('parse strokes, bit loop', timeit(lambda: bit_loop_parse(data)),
+           count, 'stroke')
+    report('parse strokes, tables',
+           timeit(lambda: stentura._parse_strokes(data)), count, 'stroke')
+
+    buf = array.array('B')
+    def make_reads(use_cache):
+        crc = stentura._header_crc
+        if not use_cache:
+            stentura._header_crc = stentura._crc
+        try:
+            for i in xrange(count):
+                stentura._make_read(buf, i % 256, 0, 0)
+        finally:
+            stentura._header_crc = crc
+    report('make READC, header crc', timeit(lambda: make_reads(False)),
+           count, 'packet')
+    report('make READC, cached crc', timeit(lambda: make_reads(True)),
+           count, 'packet')
+
+    # Responses carry up to 512 bytes of strokes.
+    blocks = [buffer(data, i, 512) for i in xrange(0, len(data), 512)]
+    stroke_buf = array.array('B')
+    def copy(write):
+        offset = 0
+        for block in blocks:
+            write(stroke_buf, offset, block)
+            offset += len(block)
+    report('copy data, byte loop', timeit(lambda: copy(byte_loop_write)),
+           count, 'stroke')
+    report('copy data, slice',
+           timeit(lambda: copy(stentura._write_to_buffer)), count, 'stroke')
+    report('response crc',
+           timeit(lambda: [stentura._crc(block) for block in blocks]),
+           count, 'stroke')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Cost of making a Stroke from the keys a machine reports.
+
+Compares building a new Stroke from a list of keys with the cached lookups by
+key list, by StenoKeys and by key mask.
+
+Run with: python -m benchmarks.stroke_construction [strokes]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import report, timeit
+from plover.steno import STENO_KEY_MASKS, StenoKeys, Stroke, keys_to_mask
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(3)
+    keys = STENO_KEY_MASKS.keys()
+    # A few thousand distinct chords, as in real use.
+    chords = [rng.sample(keys, rng.randint(1, 6)) for i in xrange(3000)]
+    strokes = [rng.choice(chords) for i in xrange(count)]
+    steno_keys = [StenoKeys(s) for s in strokes]
+    masks = [keys_to_mask(s) for s in strokes]
+
+    def construct(fn, inputs):
+        def run():
+            for i in inputs:
+                fn(i)
+        return run
+
+    report('Stroke(keys)', timeit(construct(Stroke, strokes)), count,
+           'stroke')
+    report('Stroke.from_keys(keys)',
+           timeit(construct(Stroke.from_keys, strokes)), count, 'stroke')
+    report('Stroke.from_keys(StenoKeys)',
+           timeit(construct(Stroke.from_keys, steno_keys)), count, 'stroke')
+    report('Stroke.from_keymask(mask)',
+           timeit(construct(Stroke.from_keymask, masks)), count, 'stroke')
+
+
+if __name__ == '__main__':
+    main()
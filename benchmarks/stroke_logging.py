@@ -0,0 +1,150 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Cost of logging strokes and the size of the stroke logs.
+
+Logs random strokes the way the engine does, with a rotating file handler
+called on the stroke thread and with a queued handler. A burst of strokes
+shows the throughput; strokes paced like fast writing show the time each
+logging call holds up the stroke thread, with the files synced to disk on
+every flush to stand in for a slow disk. Then compares the size of the text
+log with the binary stroke log and the stroke journal for the same strokes.
+
+Run with: python -m benchmarks.stroke_logging [strokes] [paced strokes]
+
+"""
+
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import report
+from plover import config as conf
+from plover.queued_logging import QueuedHandler
+from plover.steno import STENO_KEY_MASKS, StenoKeys
+from plover.stroke_log import (BinaryStrokeHandler, JournalHandler,
+                               StrokeMessage)
+
+
+def random_strokes(count, seed=0):
+    rng = random.Random(seed)
+    keys = sorted(STENO_KEY_MASKS)
+    strokes = []
+    for i in xrange(count):
+        stroke = [key for key in keys if rng.random() < 0.2]
+        strokes.append(StenoKeys(stroke or [rng.choice(keys)]))
+    return strokes
+
+
+class SyncedFileHandler(RotatingFileHandler):
+    """A text log synced to disk on every flush."""
+
+    def flush(self):
+        RotatingFileHandler.flush(self)
+        if self.stream is not None:
+            os.fsync(self.stream.fileno())
+
+
+def text_handler(filename, synced=False):
+    handler_class = SyncedFileHandler if synced else RotatingFileHandler
+    handler = handler_class(filename, maxBytes=conf.LOG_MAX_BYTES,
+                            backupCount=conf.LOG_COUNT)
+    handler.setFormatter(logging.Formatter(conf.LOG_FORMAT))
+    return handler
+
+
+def log_strokes(name, handlers, strokes, message, interval=0):
+    logger = logging.getLogger('benchmark.%s' % name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    for handler in handlers:
+        logger.addHandler(handler)
+    calls = []
+    start = time.time()
+    for steno_keys in strokes:
+        if interval:
+            time.sleep(interval)
+            call_start = time.time()
+            logger.info(message(steno_keys))
+            calls.append(time.time() - call_start)
+        else:
+            logger.info(message(steno_keys))
+    elapsed = time.time() - start
+    for handler in handlers:
+        handler.flush()
+    total = time.time() - start
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    if interval:
+        return sorted(calls)
+    return elapsed, total
+
+
+def report_calls(name, calls):
+    print '%-40s p50 %7.1f us  p99 %7.1f us  max %8.1f us' % (
+        name, calls[len(calls) // 2] * 1e6, calls[len(calls) * 99 // 100] * 1e6,
+        calls[-1] * 1e6)
+
+
+def text_message(steno_keys):
+    return 'Stroke(%s)' % ' '.join(steno_keys)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    paced = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    strokes = random_strokes(count)
+    directory = tempfile.mkdtemp()
+    try:
+        path = lambda name: os.path.join(directory, name)
+        elapsed, total = log_strokes('sync', [text_handler(path('sync.log'))],
+                                     strokes, text_message)
+        report('synchronous text log', elapsed, count, 'stroke')
+        elapsed, total = log_strokes(
+            'queued', [QueuedHandler([text_handler(path('queued.log'))],
+                                     maxsize=count)],
+            strokes, StrokeMessage)
+        report('queued text log (stroke thread)', elapsed, count, 'stroke')
+        report('queued text log (until written)', total, count, 'stroke')
+        elapsed, total = log_strokes(
+            'binary', [QueuedHandler([BinaryStrokeHandler(path('b.strokes'))],
+                                     maxsize=count)],
+            strokes, StrokeMessage)
+        report('queued binary log (stroke thread)', elapsed, count, 'stroke')
+        report('queued binary log (until written)', total, count, 'stroke')
+        elapsed, total = log_strokes(
+            'journal', [QueuedHandler([JournalHandler(path('j.journal'))],
+                                      maxsize=count)],
+            strokes, StrokeMessage)
+        report('queued journal (stroke thread)', elapsed, count, 'stroke')
+        report('queued journal (until written)', total, count, 'stroke')
+        # About 300 words per minute.
+        interval = 0.15
+        calls = log_strokes('paced sync',
+                            [text_handler(path('paced.log'), True)],
+                            strokes[:paced], text_message, interval)
+        report_calls('paced synced text log', calls)
+        calls = log_strokes(
+            'paced queued',
+            [QueuedHandler([text_handler(path('paced-queued.log'), True)])],
+            strokes[:paced], StrokeMessage, interval)
+        report_calls('paced synced queued text log', calls)
+        text_size = os.path.getsize(path('sync.log'))
+        for name, filename in (('text log', 'sync.log'),
+                               ('binary stroke log', 'b.strokes'),
+                               ('stroke journal', 'j.journal')):
+            size = os.path.getsize(path(filename))
+            print '%-40s %10d bytes %8.1f bytes/stroke' % (
+                name, size, float(size) / count)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Offline translation of a long stroke sequence to text.
+
+"one at a time" feeds every stroke to Translator.translate with a formatter
+listening, as the engine does. "translate_many" uses Translator.translate_many
+and formatting.render_text.
+
+Run with: python -m benchmarks.translate_many [strokes] [entries]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import report, synthetic_entries, timeit
+from plover.formatting import Formatter, render_text
+from plover.steno import normalize_steno
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translator
+
+
+class _Stroke(object):
+
+    def __init__(self, rtfcre):
+        self.rtfcre = rtfcre
+        self.is_correction = rtfcre == '*'
+
+
+class _TextOutput(object):
+
+    def __init__(self):
+        self.text = []
+
+    def send_backspaces(self, n):
+        del self.text[-n:]
+
+    def send_string(self, s):
+        self.text.extend(s)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    d = StenoDictionary((normalize_steno(k), v)
+                        for k, v in synthetic_entries(entries))
+    rng = random.Random(4)
+    keys = d.keys()
+    strokes = []
+    while len(strokes) < count:
+        if rng.random() < 0.02:
+            strokes.append(_Stroke('*'))
+        else:
+            strokes.extend(_Stroke(s) for s in rng.choice(keys))
+    translator = Translator()
+    translator.set_dictionary(d)
+    translator.set_min_undo_length(10)
+
+    def one_at_a_time():
+        output = _TextOutput()
+        formatter = Formatter()
+        formatter.set_output(output)
+        translator.add_listener(formatter.format)
+        translator.clear_state()
+        for stroke in strokes:
+            translator.translate(stroke)
+        translator.remove_listener(formatter.format)
+        return ''.join(output.text)
+
+    def many():
+        return ''.join(render_text(translator.translate_many(strokes)))
+
+    assert one_at_a_time() == many()
+    report('one at a time', timeit(one_at_a_time), len(strokes), 'stroke')
+    report('translate_many + render_text', timeit(many), len(strokes),
+           'stroke')
+
+
+if __name__ == '__main__':
+    main()
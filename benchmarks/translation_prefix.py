@@ -0,0 +1,79 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Dictionary lookups and latency per stroke in the translator.
+
+With one long entry in the dictionary the translator used to look up every
+window up to longest_key strokes on each stroke. The prefix index lets it skip
+windows that no entry starts with. "before" uses a dictionary whose has_prefix
+always answers True, which is the old behaviour.
+
+Run with: python -m benchmarks.translation_prefix [entries] [strokes]
+
+"""
+
+import random
+import sys
+
+from benchmarks.common import random_stroke, report, synthetic_entries, timeit
+from plover.steno import normalize_steno
+from plover.steno_dictionary import StenoDictionary
+from plover.translation import Translator
+
+
+class _Stroke(object):
+
+    def __init__(self, rtfcre):
+        self.rtfcre = rtfcre
+        self.is_correction = False
+
+
+class _CountingDictionary(StenoDictionary):
+    """Counts lookups, optionally without using the prefix index."""
+
+    def __init__(self, use_prefixes):
+        super(_CountingDictionary, self).__init__()
+        self.use_prefixes = use_prefixes
+        self.lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super(_CountingDictionary, self).get(key, default)
+
+    def lookup(self, key):
+        self.lookups += 1
+        return super(_CountingDictionary, self).lookup(key)
+
+    def has_prefix(self, strokes):
+        if not self.use_prefixes:
+            return True
+        return super(_CountingDictionary, self).has_prefix(strokes)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stroke_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    entries = [(normalize_steno(k), v) for k, v in synthetic_entries(count)]
+    entries.append((('S',) * 10, 'long entry'))
+    rng = random.Random(2)
+    strokes = [_Stroke(random_stroke(rng)) for i in xrange(stroke_count)]
+
+    for name, use_prefixes in (('before', False), ('after', True)):
+        d = _CountingDictionary(use_prefixes)
+        d.update(entries)
+
+        def run():
+            translator = Translator()
+            translator.set_dictionary(d)
+            for stroke in strokes:
+                translator.translate(stroke)
+
+        d.lookups = 0
+        run()
+        print '%s: longest_key %d, %.2f lookups/stroke' % (
+            name, d.longest_key, float(d.lookups) / len(strokes))
+        report('translate %s' % name, timeit(run), len(strokes), 'stroke')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""CPU use and decoding speed of the TX Bolt reader on a pty.
+
+Measures the CPU time the process uses while the reader waits for an idle
+machine, for the blocking reader and for the busy poll on inWaiting it
+replaced, then the time to decode a stream of strokes written to the pty.
+
+Run with: python -m benchmarks.txbolt_reader [idle seconds] [strokes]
+
+"""
+
+import os
+import pty
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import report
+from plover.machine import txbolt
+
+
+class BusyPoll(txbolt.Stenotype):
+    """The reader as it was, polling inWaiting without blocking."""
+
+    def run(self):
+        while not self.finished.isSet():
+            try:
+                raw = self.serial_port.read(self.serial_port.inWaiting())
+            except Exception:
+                break
+            for byte in bytearray(raw):
+                key_set = byte >> 6
+                if key_set <= self._last_key_set and self._pressed_mask:
+                    self._finish_stroke()
+                self._last_key_set = key_set
+                self._pressed_mask |= txbolt._BYTE_MASKS[byte]
+
+
+def open_machine(cls):
+    master, slave = pty.openpty()
+    machine = cls(port=os.ttyname(slave), timeout=2.0)
+    return master, slave, machine
+
+
+def close_machine(master, slave, machine):
+    machine.stop_capture()
+    machine.join()
+    os.close(master)
+    os.close(slave)
+
+
+def idle_cpu(cls, seconds):
+    master, slave, machine = open_machine(cls)
+    machine.start_capture()
+    before = os.times()
+    time.sleep(seconds)
+    after = os.times()
+    close_machine(master, slave, machine)
+    cpu = after[0] + after[1] - before[0] - before[1]
+    print '%-40s %10.1f%% CPU' % ('idle, %s' % cls.__name__,
+                                  100 * cpu / seconds)
+
+
+def random_stroke(rng):
+    """Return the bytes of a stroke, ending with a zero byte."""
+    data = bytearray()
+    while not data:
+        for key_set in xrange(4):
+            bits = rng.randint(0, 31) if rng.random() < 0.5 else 0
+            if bits:
+                data.append(key_set << 6 | bits)
+    data.append(0)
+    return data
+
+
+def decoding(count):
+    rng = random.Random(11)
+    data = bytearray().join(random_stroke(rng) for i in xrange(count))
+    master, slave, machine = open_machine(txbolt.Stenotype)
+    received = []
+    done = threading.Event()
+    def callback(keys):
+        received.append(keys)
+        if len(received) == count:
+            done.set()
+    machine.add_callback(callback)
+    machine.start_capture()
+    start = time.time()
+    for i in xrange(0, len(data), 4096):
+        os.write(master, str(data[i:i + 4096]))
+    if not done.wait(60):
+        print 'decoding: only %d of %d strokes received' % (len(received),
+                                                           count)
+    report('decoding, Stenotype', time.time() - start, count, 'stroke')
+    close_machine(master, slave, machine)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    idle_cpu(txbolt.Stenotype, seconds)
+    idle_cpu(BusyPoll, seconds)
+    decoding(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Typing text with KeyboardEmulation on a headless X server.
+
+Starts Xvfb on a free display, unless DISPLAY is already set, and measures
+characters per second for send_string and backspaces per second for
+send_backspaces. For comparison, the same key events are also sent one key
+at a time with a sync after each key, as the emulation used to. The
+benchmark is skipped when there is no X server to use.
+
+Run with: python -m benchmarks.x_output [characters]
+
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import report, timeit
+
+
+def start_xvfb():
+    """Start Xvfb and return the process, or None if it can't be run."""
+    for number in xrange(99, 120):
+        if os.path.exists('/tmp/.X%d-lock' % number):
+            continue
+        try:
+            process = subprocess.Popen(['Xvfb', ':%d' % number],
+                                       stdout=open(os.devnull, 'w'),
+                                       stderr=subprocess.STDOUT)
+        except OSError:
+            return None
+        os.environ['DISPLAY'] = ':%d' % number
+        for i in xrange(50):
+            if os.path.exists('/tmp/.X11-unix/X%d' % number):
+                return process
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        process.kill()
+    return None
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    xvfb = None
+    if not os.environ.get('DISPLAY'):
+        xvfb = start_xvfb()
+        if xvfb is None:
+            print 'skipped: no DISPLAY and Xvfb could not be started'
+            return
+    try:
+        try:
+            from Xlib.ext import xtest
+            from plover.oslayer.xkeyboardcontrol import KeyboardEmulation
+            emulation = KeyboardEmulation()
+        except Exception as e:
+            print 'skipped: %s' % e
+            return
+        text = ('The quick brown fox jumps over the lazy dog. ' *
+                (count // 45 + 1))[:count]
+
+        def key_at_a_time():
+            for char in text:
+                keycode, modifiers = \
+                    emulation._keysym_to_keycode_and_modifiers(ord(char))
+                if keycode is None:
+                    continue
+                events = []
+                emulation._add_key_events(events, keycode, modifiers)
+                for keycode, event_type in events:
+                    xtest.fake_input(emulation.display, event_type, keycode)
+                emulation.display.sync()
+
+        report('key at a time', timeit(key_at_a_time), count, 'char')
+        report('send_string', timeit(lambda: emulation.send_string(text)),
+               count, 'char')
+        report('send_backspaces',
+               timeit(lambda: emulation.send_backspaces(count)), count,
+               'backspace')
+    finally:
+        if xvfb is not None:
+            xvfb.kill()
+            xvfb.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,9 @@ class Dictionary(Mapping):
     def applyChanges(self):
         """ Apply changes to the dictionary and return the generated dictionary. """
         
+        if not self.hasChanges():
+            self.actual = collections.OrderedDict(self.data)
+            return self.actual
         data = collections.OrderedDict()
         for stroke, translation in self.data.iteritems():
             if self.createIdentifier(stroke, translation) in self.removed:
@@ -123,6 +126,14 @@ class Dictionary(Mapping):
                 self.changed[self.createIdentifier(originalStroke, originalTranslation)] = (stroke, translation)
         self.applyChanges()
         
+    def commitChanges(self):
+        """ Make the current content the new original, e.g. after it was saved. """
+        
+        self.data = collections.OrderedDict(self.actual)
+        self.inserted = collections.OrderedDict()
+        self.changed = collections.OrderedDict()
+        self.removed = collections.OrderedDict()
+        
     def hasChanges(self):
         return len(self.inserted) > 0 or len(self.changed) > 0 or len(self.removed) > 0
 
@@ -0,0 +1,93 @@
+"""
+
+Read several dictionary files in parallel worker processes
+
+"""
+
+from dictionarymanager.store.JsonLoader import JsonLoader
+from dictionarymanager.store.RtfLoader import RtfLoader
+from itertools import imap
+from plover.dictionary_cache import update_cache
+import multiprocessing
+import os
+
+# loader classes by file extension
+LOADERS = {
+           "json": JsonLoader,
+           "rtf": RtfLoader
+           }
+
+def getLoaderClass(filename):
+    """ Get the loader class based on the file extension """
+
+    return LOADERS.get(os.path.splitext(filename)[1][1:])
+
+def readDictionary(path):
+    """ Read a dictionary file.
+
+    Json dictionaries also get their compiled translation cache refreshed from
+    the parsed data, so the main process only has to map it.
+
+    Returns the strokes and the translations as two lists in file order and
+    the format configuration of the file, or None if the file couldn't be read.
+    """
+
+    loaderClass = getLoaderClass(path)
+    if loaderClass is None:
+        raise ValueError('Unknown dictionary format %s.' % path)
+    data, conf = loaderClass().load(path)
+    if data is None:
+        return None
+    if loaderClass is JsonLoader:
+        update_cache(path, data.iteritems())
+    return data.keys(), data.values(), conf
+
+# worker processes started by startPool
+_pool = None
+
+def startPool(processes = None):
+    """ Start the worker processes readDictionaries uses by default.
+
+    Forked workers get a copy of every open file and of the locks other threads
+    hold at that moment, so this should be called at startup, before any thread
+    is started or device opened. processes defaults to the number of cores.
+    """
+
+    global _pool
+    if _pool is None:
+        _pool = multiprocessing.Pool(processes)
+
+def stopPool():
+    """ Stop the worker processes started by startPool """
+
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+
+def readDictionaries(paths, processes = None):
+    """ Read dictionary files in worker processes.
+
+    Yields the result of readDictionary for each path in the given order,
+    as soon as it is ready. Without a number of processes, the workers started
+    by startPool are used, or the files are read in this process if there are
+    none. Otherwise a pool of that many processes is started for the call, so
+    the caller should be careful about its threads and open files.
+    """
+
+    pool = _pool
+    if processes is not None:
+        processes = min(processes, len(paths))
+        pool = multiprocessing.Pool(processes) if processes > 1 else None
+    if pool is None or len(paths) <= 1:
+        for result in imap(readDictionary, paths):
+            yield result
+        return
+    try:
+        for result in pool.imap(readDictionary, paths):
+            yield result
+    finally:
+        if pool is not _pool:
+            pool.terminate()
+            pool.join()
@@ -6,10 +6,12 @@ Store class can read and write dictionaries
 
 from dictionarymanager.store.Dictionary import Dictionary
 from dictionarymanager.store.JsonLoader import JsonLoader
-from dictionarymanager.store.RtfLoader import RtfLoader
+from dictionarymanager.store.ParallelLoader import LOADERS, readDictionaries
+from plover.dictionary_cache import CompiledDictionary, load_dictionary_file
 from plover.steno import normalize_steno
-from plover.steno_dictionary import StenoDictionary
+from plover.steno_dictionary import CompactStenoDictionary, StenoDictionaryCollection
 import collections
+import itertools
 import os
 import plover.config as conf
 
@@ -21,10 +23,7 @@ class Store():
     
     def __init__(self, config):
         self.config = config
-        self.loaders = {
-                        "json": JsonLoader(),
-                        "rtf": RtfLoader()
-                        }
+        self.loaders = dict((extension, loaderClass()) for extension, loaderClass in LOADERS.iteritems())
         self.dictionaries = collections.OrderedDict()
         self.dictionaryNames = []
         self.dictionaryFilenames = []
@@ -34,6 +33,10 @@ class Store():
         self.data = []
         self.filteredRows = []
         
+        # translation dictionaries, only built once the stack is requested
+        self.stack = None
+        self.layers = {}
+        
         # filtering
         self.filters = {}
         self.filterFnList = []
@@ -254,59 +257,104 @@ class Store():
         else:
             self.loadDictionary(filename)
     
-    def loadDictionaries(self):
-        """ Load all the dictionaries from config """
-        
-        dict_files = conf.get_option_as_list(self.config, conf.DICTIONARY_CONFIG_SECTION, conf.DICTIONARY_FILE_OPTION)
-        for dict_file in dict_files:
-            self.loadDictionary(dict_file)
+    def getDictionaryFilesFromConfig(self):
+        """ Get the filenames of the dictionaries to load from config """
+        
+        return conf.get_option_as_list(self.config, conf.DICTIONARY_CONFIG_SECTION, conf.DICTIONARY_FILE_OPTION)
+    
+    def loadDictionaries(self, dict_files = None, processes = None):
+        """ Load the given dictionaries or all the dictionaries from config.
+        
+        The files are read in worker processes, see 
+        ParallelLoader.readDictionaries for which ones, and the rows of all of 
+        them are merged in one pass at the end. A "progress" event is fired 
+        after each dictionary with the filename, the number of dictionaries 
+        loaded so far and the total number.
+        """
+        
+        if dict_files is None:
+            dict_files = self.getDictionaryFilesFromConfig()
+        paths = []
+        for filename in dict_files:
+            path = self._checkDictionary(filename)
+            if path in paths:
+                raise ValueError('Dictionary %s already loaded.' % filename)
+            paths.append(path)
+        total = len(dict_files)
+        loaded = []
+        try:
+            for index, result in enumerate(readDictionaries(paths, processes)):
+                filename = dict_files[index]
+                if result is not None:
+                    strokes, translations, dictConf = result
+                    self._addDictionary(filename, collections.OrderedDict(itertools.izip(strokes, translations)), dictConf)
+                    loaded.append(filename)
+                self.fireEvent("progress", filename, index + 1, total)
+        finally:
+            self._addRows(loaded)
+            for filename in loaded:
+                self.fireEvent("dictionaryLoaded", filename)
     
     def loadDictionary(self, filename):
         """ Load dictionary from file """
         
-        path = os.path.join(conf.CONFIG_DIR, filename) if filename[0] != os.pathsep else filename 
+        path = self._checkDictionary(filename)
+        data, dictConf = self.getLoader(path).load(path)
+        if data is None:
+            return None
+        self._addDictionary(filename, data, dictConf)
+        self._addRows([filename])
+        self.fireEvent("dictionaryLoaded", filename)
+        return True
+    
+    def _checkDictionary(self, filename):
+        """ Check that a dictionary can be loaded and return its path """
+        
+        path = self.getDictionaryPath(filename)
         
         # we already loaded this dictionary
         if filename in self.dictionaryFilenames or path in self.dictionaryFilenames:
             raise ValueError('Dictionary %s already loaded.' % filename)
-        
-        loader = self.getLoader(path)
-        if loader is not None:
-            dictionary = Dictionary()
-            if dictionary.load(path, loader):
-                self.addDictionaryToActives(filename)
-                self.dictionaries[filename] = dictionary
-                self.dictionaryFilenames.append(filename)
-                self.dictionaryNames.append(self.getDictionaryShortName(filename))
-                
-                # precache indexes for identifiers
-                indexes = {}
-                for index, row in enumerate(self.rows):
-                    indexes[self.getIdentifier(row[self.ATTR_STROKE], row[self.ATTR_TRANSLATION])] = index
-                
-                for stroke, translation in dictionary.iteritems():
-                    identifier = self.getIdentifier(stroke, translation)
-                    isNew = identifier not in self.strokes
-                    if isNew:
-                        item = {self.ATTR_STROKE: stroke, self.ATTR_TRANSLATION: translation, self.ATTR_DICTIONARIES: []}
-                        self.strokes[identifier] = item
-                    else:
-                        item = self.strokes[identifier]
-                        
-                    item[self.ATTR_DICTIONARIES].append(filename)
-                    
-                    # we don't handle the situation when this is an update 
-                    # and the row is filtered out with its new value
-                    if isNew:
-                        if self.filterFn(item):
-                            self.rows.append(item)
-                        self.data.append(item)
-                    
-                self.fireEvent("tableChange", self)
-                self.fireEvent("dictionaryLoaded", filename)
-                return True
-        else:
+        if self.getLoader(path) is None:
             raise ValueError('Unknown dictionary format %s.' % filename)
+        return path
+    
+    def _addDictionary(self, filename, data, dictConf):
+        """ Add the data of a dictionary file and put it in the stack """
+        
+        dictionary = Dictionary()
+        dictionary.data = data
+        dictionary.conf = dictConf
+        dictionary.applyChanges()
+        self.addDictionaryToActives(filename)
+        self.dictionaries[filename] = dictionary
+        self.dictionaryFilenames.append(filename)
+        self.dictionaryNames.append(self.getDictionaryShortName(filename))
+        self._updateStack()
+    
+    def _addRows(self, filenames):
+        """ Merge the entries of the given dictionaries into the rows in one pass """
+        
+        if not filenames:
+            return
+        for filename in filenames:
+            for stroke, translation in self.dictionaries[filename].iteritems():
+                identifier = self.getIdentifier(stroke, translation)
+                item = self.strokes.get(identifier)
+                isNew = item is None
+                if isNew:
+                    item = {self.ATTR_STROKE: stroke, self.ATTR_TRANSLATION: translation, self.ATTR_DICTIONARIES: []}
+                    self.strokes[identifier] = item
+                    
+                item[self.ATTR_DICTIONARIES].append(filename)
+                
+                # we don't handle the situation when this is an update 
+                # and the row is filtered out with its new value
+                if isNew:
+                    if self.filterFn(item):
+                        self.rows.append(item)
+                    self.data.append(item)
+        self.fireEvent("tableChange", self)
         
     def saveDictionaries(self):
         """ Save dictionaries to files """
@@ -319,12 +367,16 @@ class Store():
         
         if index < len(self.dictionaries):
             filename = self.dictionaryFilenames[index]
+            path = self.getDictionaryPath(filename)
             if dest is None:
-                dest = filename
+                dest = path
             loader = self.getLoader(dest)
             if loader is not None:
                 self.dictionaries[filename].write(dest, loader)
-                self.fireEvent("dictionaryChange")
+                # the change log is still there for listeners, see updateLayer
+                self.fireEvent("dictionaryChange", filename)
+                if dest == path:
+                    self.dictionaries[filename].commitChanges()
     
     def closeDictionary(self, index):
         """ Close dictionary """
@@ -344,6 +396,11 @@ class Store():
         self.dictionaries.pop(filename, None)
         self.dictionaryFilenames.remove(filename)
         self.dictionaryNames.remove(self.getDictionaryShortName(filename))
+        layer = self.layers.pop(filename, None)
+        self._updateStack()
+        # the stack no longer uses it, so the mapped cache can be released
+        if isinstance(layer, CompiledDictionary):
+            layer.close()
         if self.ATTR_DICTIONARIES in self.filters and filename in self.filters[self.ATTR_DICTIONARIES]:
             self.filters[self.ATTR_DICTIONARIES].remove(filename)
             self.filter(self.filters, True)
@@ -369,6 +426,11 @@ class Store():
         filters[self.ATTR_DICTIONARIES] = dictFilter
         self.filter(filters)
     
+    def getDictionaryPath(self, filename):
+        """ Get the full path of a dictionary, relative to the config directory """
+        
+        return os.path.join(conf.CONFIG_DIR, filename)
+    
     def getLoader(self, filename):
         """ Get the loader based on the file extension """
         
@@ -469,10 +531,70 @@ class Store():
             return self.dictionaryFilenames[index]
         return None
     
-    def getMerged(self):
-        """ Merge dictionaries into one """
-        merged = StenoDictionary()
-        items = self.dictionaries.values()
-        for i in range(len(items)-1, -1, -1):
-            merged.update((normalize_steno(k), items[i][k]) for k in items[i])
-        return merged
+    def getStenoDictionary(self, filename):
+        """ Get the dictionary used for translation for a loaded dictionary.
+        
+        Unmodified json dictionaries are read through the compiled cache so 
+        their keys don't have to be normalized again. Others are kept in a 
+        compact dictionary next to the store's own copy of the entries.
+        """
+        
+        dictionary = self.dictionaries[filename]
+        path = self.getDictionaryPath(filename)
+        if isinstance(self.getLoader(path), JsonLoader) and not dictionary.hasChanges():
+            return load_dictionary_file(path)
+        return CompactStenoDictionary((normalize_steno(k), v) for k, v in dictionary.iteritems())
+    
+    def getStack(self):
+        """ Get the dictionaries used for translation as one prioritized stack.
+        
+        The stack is kept up to date when dictionaries are loaded or closed, 
+        so it only has to be requested once. Saved changes are applied to it by 
+        updateLayer, which whoever translates with the stack subscribes to 
+        "dictionaryChange".
+        """
+        
+        if self.stack is None:
+            self.stack = StenoDictionaryCollection()
+            self._updateStack()
+        return self.stack
+    
+    def _updateStack(self):
+        """ Put the loaded dictionaries in the stack, in priority order. """
+        
+        if self.stack is None:
+            return
+        for filename in self.dictionaryFilenames:
+            if filename not in self.layers:
+                self.layers[filename] = self.getStenoDictionary(filename)
+        self.stack.set_dicts(self.layers[filename] for filename in self.dictionaryFilenames)
+    
+    def updateLayer(self, filename):
+        """ Apply the unsaved changes of a dictionary to its translation layer.
+        
+        Applying the same changes again has no effect, so this can be called 
+        for every "dictionaryChange", including saves to another file.
+        """
+        
+        layer = self.layers.get(filename)
+        if layer is None:
+            return
+        dictionary = self.dictionaries[filename]
+        strokes = set()
+        for changes in (dictionary.inserted, dictionary.removed):
+            strokes.update(stroke for stroke, translation in changes.itervalues())
+        for identifier, (stroke, translation) in dictionary.changed.iteritems():
+            strokes.add(stroke)
+            strokes.add(dictionary.parseIdentifier(identifier)[0])
+        entries = {}
+        removed = set()
+        for stroke in strokes:
+            key = normalize_steno(stroke)
+            translation = dictionary.get(stroke)
+            if translation is not None:
+                entries[key] = translation
+            elif key in layer:
+                removed.add(key)
+        # Batch the changes so the translator hears about the longest key once.
+        layer.delete_many(removed - set(entries))
+        layer.update(entries)
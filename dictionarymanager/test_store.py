@@ -1,8 +1,12 @@
 """Unit tests for DictionaryLoader.py ."""
 
+from dictionarymanager.store import ParallelLoader
 from dictionarymanager.store.Store import Store
+from plover.steno import normalize_steno
 import os
 import plover.config as conf
+import shutil
+import tempfile
 import unittest
 
 class LoaderTestCase(unittest.TestCase):
@@ -47,6 +51,84 @@ class LoaderTestCase(unittest.TestCase):
         store.filter({Store.ATTR_TRANSLATION: "c"})
         self.assertTrue(len(store.rows) > 0)
         self.assertEqual(store.rows[0].get(Store.ATTR_TRANSLATION)[0], "c")
+    
+    def test_progress(self):
+        filenames = [os.path.join(conf.ASSETS_DIR, "test.json"), 
+                     os.path.join(conf.ASSETS_DIR, "test.rtf")]
+        store = Store(conf.get_config())
+        events = []
+        store.subscribe("progress", lambda *args: events.append(args))
+        stack = store.getStack()
+        store.loadDictionaries(filenames, 2)
+        self.assertEqual(events, [(filenames[0], 1, 2), (filenames[1], 2, 2)])
+        self.assertEqual(store.dictionaryFilenames, filenames)
+        self.assertEqual(len(stack.dicts), 2)
+        
+        # the rows are the same as when loading the files one by one
+        other = Store(conf.get_config())
+        for filename in filenames:
+            other.loadDictionary(filename)
+        self.assertEqual(store.data, other.data)
+        self.assertEqual(store.rows, other.rows)
+        self.assertRaises(ValueError, store.loadDictionaries, filenames[:1])
+        for s in (store, other):
+            s.closeDictionary(1)
+            s.closeDictionary(0)
+    
+    def test_started_pool(self):
+        filenames = [os.path.join(conf.ASSETS_DIR, "test.json"), 
+                     os.path.join(conf.ASSETS_DIR, "test.rtf")]
+        ParallelLoader.startPool(2)
+        try:
+            store = Store(conf.get_config())
+            store.loadDictionaries(filenames)
+        finally:
+            ParallelLoader.stopPool()
+        other = Store(conf.get_config())
+        for filename in filenames:
+            other.loadDictionary(filename)
+        self.assertEqual(store.rows, other.rows)
+        for s in (store, other):
+            s.closeDictionary(1)
+            s.closeDictionary(0)
+    
+    def test_stack(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "test.json")
+            shutil.copy(os.path.join(conf.ASSETS_DIR, "test.json"), filename)
+            store = Store(conf.get_config())
+            store.loadDictionary(filename)
+            stack = store.getStack()
+            # as the engine does
+            store.subscribe("dictionaryChange", store.updateLayer)
+            
+            row = store.rows[0]
+            key = normalize_steno(row[Store.ATTR_STROKE])
+            self.assertEqual(stack.get(key), row[Store.ATTR_TRANSLATION])
+            otherRow = store.rows[1]
+            otherKey = normalize_steno(otherRow[Store.ATTR_STROKE])
+            self.assertEqual(stack.get(otherKey), otherRow[Store.ATTR_TRANSLATION])
+            
+            # saved changes are applied to the stack without reloading, also 
+            # when saved to another file
+            store.changeTranslation(0, "changed")
+            store.saveDictionary(0, os.path.join(directory, "other.json"))
+            self.assertEqual(stack.get(key), "changed")
+            self.assertTrue(store.dictionaries[filename].hasChanges())
+            store.changeTranslation(0, "changed again")
+            store.saveDictionary(0)
+            self.assertEqual(stack.get(key), "changed again")
+            self.assertFalse(store.dictionaries[filename].hasChanges())
+            
+            layer = store.layers[filename]
+            store.closeDictionary(store.getDictionaryIndexByName(filename))
+            self.assertIsNone(stack.get(key))
+            # the layer's mapped cache is released
+            self.assertIsNone(layer.get(otherKey))
+            self.assertEqual(stack.longest_key, 0)
+        finally:
+            shutil.rmtree(directory)
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
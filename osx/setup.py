@@ -32,5 +32,8 @@ setup(name='Plover',
       app=[launch_file],
       options = dict(py2app=dict(argv_emulation=True,
       iconfile='plover.icns',
-      resources=resources))
+      resources=resources,
+      # The machine drivers are imported by name when selected.
+      includes=['plover.machine.geminipr', 'plover.machine.txbolt',
+                'plover.machine.sidewinder', 'plover.machine.stentura']))
       )
\ No newline at end of file
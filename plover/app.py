@@ -18,14 +18,18 @@ interface.
 from os.path import join, isfile, splitext
 import logging
 from logging.handlers import RotatingFileHandler
+import threading
 
 # Import plover modules.
 import plover.config as conf
 import plover.formatting as formatting
 import plover.oslayer.keyboardcontrol as keyboardcontrol
-from plover.machine import SUPPORTED_DICT as SUPPORTED_MACHINES_DICT
-import plover.machine.base
-import plover.machine.sidewinder
+from plover.machine import MACHINES, import_machine, uses_serial_port
+import plover.journal as journal
+import plover.latency as latency
+import plover.pipeline as pipeline
+import plover.queued_logging as queued_logging
+import plover.stroke_log as stroke_log
 from dictionarymanager.store.Store import Store
 from plover.exception import InvalidConfigurationError
 import steno_dictionary
@@ -57,12 +61,18 @@ def check_steno_config(config_params):
     errors = []
     machine_type = config_params.get(conf.MACHINE_CONFIG_SECTION,
                                      conf.MACHINE_TYPE_OPTION)
-    if machine_type not in SUPPORTED_MACHINES_DICT:
+    if machine_type not in MACHINES:
         # The machine isn't supported
         error = InvalidConfigurationError(
             'Invalid configuration value for %s: %s' %
             (conf.MACHINE_TYPE_OPTION, machine_type))
         errors.append(error)
+    queue_full = config_params.get(conf.LOGGING_CONFIG_SECTION,
+                                   conf.LOG_QUEUE_FULL_OPTION)
+    if queue_full not in queued_logging.POLICIES:
+        errors.append(InvalidConfigurationError(
+            'Invalid configuration value for %s: %s' %
+            (conf.LOG_QUEUE_FULL_OPTION, queue_full)))
 
     return errors, machine_type
 
@@ -96,8 +106,16 @@ class StenoEngine:
     plover.oslayer.keyboardcontrol.KeyboardEmulation class. This object
     displays text on the screen.
 
+    All of these run on the machine's thread unless the queued_pipeline
+    option is set. Then strokes are translated and formatted on a translate
+    stage and output is sent on an output stage, see plover.pipeline, so a
+    slow display never delays reading the machine.
+
     In addition to the above pieces, a logger records timestamped
-    strokes and translations. Many of these pieces can be configured
+    strokes and translations. With the queued_logging option the log is
+    written on a writer thread, see plover.queued_logging, and with the
+    binary_stroke_log and stroke_journal options strokes go to compact
+    binary logs, see plover.stroke_log. Many of these pieces can be configured
     by the user via a configuration file, which is by default located
     at ~/.config/plover/plover.cfg and will be automatically generated
     with reasonable default values if it doesn't already exist.
@@ -116,6 +134,9 @@ class StenoEngine:
         self.translator = None
         self.formatter = None
         self.output = None
+        self.stages = []
+        self._latency_logging = None
+        self.log_queue = None
 
         # Check and use configuration
         self.config = conf.get_config()
@@ -124,26 +145,38 @@ class StenoEngine:
             # This will raise one of the configuration errors.
             raise error
             
-        # Set the machine module and any initialization variables.
-        self.machine_module = conf.import_named_module(
-                                                machine_type,
-                                                SUPPORTED_MACHINES_DICT)
+        # Set the machine module and any initialization variables. Only the
+        # configured machine's driver is imported.
+        self.machine_module = import_machine(machine_type)
         if self.machine_module is None:
             raise InvalidConfigurationError(
                 'Invalid configuration value for %s: %s' %
                 (conf.MACHINE_TYPE_OPTION, machine_type))
 
-        if issubclass(self.machine_module.Stenotype,
-                      plover.machine.base.SerialStenotypeBase):
+        if uses_serial_port(machine_type):
             serial_params = conf.get_serial_params(machine_type, self.config)
             self.machine_init.update(serial_params.__dict__)
 
-        # Load the dictionary. The dictionary path can be either
-        # absolute or relative to the configuration directory.
+        # The dictionaries are loaded in the background once the pipeline is
+        # running. The dictionary path can be either absolute or relative to
+        # the configuration directory. The store keeps the dictionary stack up
+        # to date when dictionaries are loaded or closed, and saved changes
+        # are applied to their layer. Unknown formats are reported right away.
         self.store = Store(self.config)
-        self.store.loadDictionaries()
-        user_dictionary = self.store.getMerged()
         self.store.subscribe("dictionaryChange", self._on_dictionary_change)
+        dict_files = self.store.getDictionaryFilesFromConfig()
+        for filename in dict_files:
+            if self.store.getLoader(self.store.getDictionaryPath(filename)) is None:
+                raise ValueError('Unknown dictionary format %s.' % filename)
+        user_dictionary = self.store.getStack()
+        # Translations are parsed for the formatter as dictionaries are loaded.
+        user_dictionary.set_value_compiler(formatting.compile_translation)
+        self.dictionaries_loaded = threading.Event()
+        # Guards the strokes counted while loading and the callbacks waiting
+        # for the dictionaries.
+        self._loading_lock = threading.Lock()
+        self._strokes_while_loading = 0
+        self._loaded_callbacks = []
         
         # Initialize the logger.
         log_file = join(conf.CONFIG_DIR,
@@ -154,7 +187,32 @@ class StenoEngine:
         handler = RotatingFileHandler(log_file, maxBytes=conf.LOG_MAX_BYTES,
                                       backupCount=conf.LOG_COUNT,)
         handler.setFormatter(logging.Formatter(conf.LOG_FORMAT))
-        self.logger.addHandler(handler)
+        handlers = [handler]
+        # Strokes can go to compact binary logs instead of the text log.
+        binary_logs = ((conf.BINARY_STROKE_LOG_OPTION,
+                        stroke_log.BinaryStrokeHandler, stroke_log.EXTENSION),
+                       (conf.STROKE_JOURNAL_OPTION, stroke_log.JournalHandler,
+                        journal.EXTENSION))
+        for option, handler_class, extension in binary_logs:
+            if self.config.getboolean(conf.LOGGING_CONFIG_SECTION, option):
+                handlers.append(handler_class(
+                    splitext(log_file)[0] + extension,
+                    maxBytes=conf.LOG_MAX_BYTES, backupCount=conf.LOG_COUNT))
+        if len(handlers) > 1:
+            handler.addFilter(stroke_log.TextFilter())
+        # With queued logging the records are written on a writer thread, see
+        # plover.queued_logging.
+        if self.config.getboolean(conf.LOGGING_CONFIG_SECTION,
+                                  conf.QUEUED_LOGGING_OPTION):
+            self.log_queue = queued_logging.QueuedHandler(
+                handlers,
+                maxsize=self.config.getint(conf.LOGGING_CONFIG_SECTION,
+                                           conf.LOG_QUEUE_SIZE_OPTION),
+                policy=self.config.get(conf.LOGGING_CONFIG_SECTION,
+                                       conf.LOG_QUEUE_FULL_OPTION))
+            handlers = [self.log_queue]
+        for handler in handlers:
+            self.logger.addHandler(handler)
 
         # Construct the stenography capture-translate-format-display pipeline.
         self.machine = self.machine_module.Stenotype(**self.machine_init)
@@ -169,9 +227,28 @@ class StenoEngine:
         if self.config.getboolean(conf.LOGGING_CONFIG_SECTION,
                                   conf.ENABLE_TRANSLATION_LOGGING_OPTION):
             self.translator.add_listener(self._log_translation)        
+        # Stroke latencies are measured and logged every so many seconds.
+        latency_log_interval = self.config.getfloat(
+            conf.LOGGING_CONFIG_SECTION, conf.LATENCY_LOG_INTERVAL_OPTION)
+        if latency_log_interval > 0:
+            latency.enable()
+            self._latency_logging = threading.Event()
+            logger = threading.Thread(target=self._log_latency,
+                                      args=(latency_log_interval,
+                                            self._latency_logging))
+            logger.daemon = True
+            logger.start()
         
-        self.machine.add_callback(
-            lambda x: self.translator.translate(steno.Stroke(x)))
+        if self.config.getboolean(conf.MACHINE_CONFIG_SECTION,
+                                  conf.QUEUED_PIPELINE_OPTION):
+            translate_stage = pipeline.Stage('translate')
+            output_stage = pipeline.Stage('output')
+            self.stages = [translate_stage, output_stage]
+            def queue_steno_keys(steno_keys):
+                translate_stage.put(self._translate_steno_keys, steno_keys)
+            self.machine.add_callback(queue_steno_keys)
+        else:
+            self.machine.add_callback(self._translate_steno_keys)
         self.translator.add_listener(self.formatter.format)
         # This seems like a reasonable number. If this becomes a problem it can
         # be parameterized.
@@ -182,9 +259,14 @@ class StenoEngine:
         bag.send_string = keyboard_control.send_string
         bag.send_key_combination = keyboard_control.send_key_combination
         bag.send_engine_command = engine_command_callback
-        self.full_output = bag
+        if self.stages:
+            bag = pipeline.QueuedOutput(bag, output_stage)
+        # Each stroke's changes are sent as one backspace count and one string.
+        self.full_output = formatting.CoalescingOutput(bag)
         bag = SimpleNamespace()
         bag.send_engine_command = engine_command_callback
+        if self.stages:
+            bag = pipeline.QueuedOutput(bag, output_stage)
         self.command_only_output = bag
         self.running_state = self.translator.get_state()
         
@@ -197,9 +279,60 @@ class StenoEngine:
         # Start the machine monitoring for steno strokes.
         self.machine.start_capture()
 
-    def _on_dictionary_change(self):
-        self.translator.set_dictionary(self.store.getMerged())
-        
+        loader = threading.Thread(target=self._load_dictionaries,
+                                  args=(dict_files,))
+        loader.daemon = True
+        loader.start()
+
+    def _load_dictionaries(self, dict_files):
+        """Load the dictionaries and retranslate the strokes made meanwhile.
+
+        Runs on a worker thread. Each dictionary is added to the translator's
+        dictionary stack as soon as it is loaded.
+
+        """
+        try:
+            self.store.loadDictionaries(dict_files)
+        except Exception:
+            self.logger.exception('Loading dictionaries failed')
+        finally:
+            with self._loading_lock:
+                self.translator.retranslate(self._strokes_while_loading)
+                self._strokes_while_loading = 0
+                # Strokes stop being counted only once they no longer need
+                # to be retranslated.
+                self.dictionaries_loaded.set()
+                callbacks = self._loaded_callbacks
+                self._loaded_callbacks = []
+            for callback in callbacks:
+                callback()
+
+    def call_when_dictionaries_loaded(self, callback):
+        """Call a function once the dictionaries are loaded.
+
+        The function is called right away if they already are, otherwise on
+        the thread loading them.
+
+        """
+        with self._loading_lock:
+            if not self.dictionaries_loaded.is_set():
+                self._loaded_callbacks.append(callback)
+                return
+        callback()
+
+    def _on_dictionary_change(self, filename):
+        self.store.updateLayer(filename)
+
+    def _translate_steno_keys(self, steno_keys):
+        stroke = steno.Stroke.from_keys(steno_keys)
+        if not self.dictionaries_loaded.is_set():
+            with self._loading_lock:
+                if not self.dictionaries_loaded.is_set():
+                    self._strokes_while_loading += 1
+                self.translator.translate(stroke)
+            return
+        self.translator.translate(stroke)
+
     def set_is_running(self, value):
         self.is_running = value
         if self.is_running:
@@ -208,7 +341,7 @@ class StenoEngine:
         else:
             self.translator.clear_state()
             self.formatter.set_output(self.command_only_output)
-        if isinstance(self.machine, plover.machine.sidewinder.Stenotype):
+        if hasattr(self.machine, 'suppress_keyboard'):
             self.machine.suppress_keyboard(self.is_running)
         for callback in self.subscribers:
             callback()
@@ -225,8 +358,49 @@ class StenoEngine:
         """
         if self.machine:
             self.machine.stop_capture()
+        for stage in self.stages:
+            stage.stop()
+        self.stages = []
+        if self._latency_logging is not None:
+            self._latency_logging.set()
+            self._latency_logging = None
+        if self.log_queue is not None:
+            self.log_queue.flush()
         self.is_running = False
 
+    def pipeline_stats(self):
+        """Return the queue depth and latency of each stage, by stage name.
+
+        The dictionary is empty unless the queued_pipeline option is set. See
+        plover.pipeline.Stage.stats.
+
+        """
+        return dict((stage.name, stage.stats()) for stage in self.stages)
+
+    def latency_stats(self):
+        """Return the stroke latencies of each stage, see plover.latency.
+
+        Latencies are only measured when the latency_log_interval option is
+        set, or after plover.latency.enable is called.
+
+        """
+        return latency.stats()
+
+    def log_queue_stats(self):
+        """Return the queue depth and record counts of the log queue.
+
+        The dictionary is empty unless the queued_logging option is set. See
+        plover.queued_logging.QueuedHandler.stats.
+
+        """
+        if self.log_queue is None:
+            return {}
+        return self.log_queue.stats()
+
+    def _log_latency(self, interval, stopped):
+        while not stopped.wait(interval):
+            latency.log_stats(self.logger)
+
     def add_callback(self, callback):
         """Subscribes a function to receive changes of the is_running  state.
 
@@ -238,7 +412,7 @@ class StenoEngine:
         self.subscribers.append(callback)
 
     def _log_stroke(self, steno_keys):
-        self.logger.info('Stroke(%s)' % ' '.join(steno_keys))
+        self.logger.info(stroke_log.StrokeMessage(steno_keys))
 
     def _log_translation(self, undo, do, prev):
         # TODO: Figure out what to actually log here.
@@ -0,0 +1,51 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A clock for measuring time intervals."""
+
+import os
+import sys
+import time
+
+def _monotonic_clock():
+    """Return a function giving seconds from a clock that never goes back.
+
+    Timeouts measured with time.time jump when the system clock is set, and
+    time.clock counts CPU time on Unix. Linux has clock_gettime with
+    CLOCK_MONOTONIC, other Unix systems fall back to the elapsed real time of
+    os.times and Windows to time.clock, which is wall time there.
+
+    """
+    # The clock ids differ between systems, CLOCK_MONOTONIC is 1 on Linux
+    # but 1 is CLOCK_VIRTUAL, a CPU time clock, on FreeBSD.
+    if not sys.platform.startswith('linux'):
+        return _fallback_clock()
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        CLOCK_MONOTONIC = 1
+        library = ctypes.util.find_library('rt') or ctypes.util.find_library('c')
+        clock_gettime = ctypes.CDLL(library).clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        t = timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) == 0:
+            def monotonic():
+                t = timespec()
+                clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t))
+                return t.tv_sec + t.tv_nsec * 1e-9
+            return monotonic
+    except (ImportError, OSError, AttributeError, TypeError):
+        pass
+    return _fallback_clock()
+
+def _fallback_clock():
+    if os.times()[4]:
+        return lambda: os.times()[4]
+    return time.clock
+
+# Seconds from an arbitrary point, for measuring timeouts.
+monotonic = _monotonic_clock()
@@ -7,26 +7,23 @@
 import os
 import oslayer.config
 import ConfigParser
-import serial
 import shutil
 
-# We need imports to be explicit for py2app.
-# There may be another way but by default it doesn't
-# understand the dynamic loading used here.
-import plover.machine.geminipr
-import plover.machine.txbolt
-import plover.machine.sidewinder
-import plover.machine.stentura
+# The machine modules are imported when a machine is used, see
+# plover.machine.import_machine. The app builders are told to include them,
+# see osx/setup.py and windows/pyinstaller.spec.
 
 # Configuration paths.
 ASSETS_DIR = oslayer.config.ASSETS_DIR
 CONFIG_DIR = oslayer.config.CONFIG_DIR
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'plover.cfg')
+DICTIONARY_CACHE_DIR = os.path.join(CONFIG_DIR, 'cache')
 
 # General configuration sections and options.
 MACHINE_CONFIG_SECTION = 'Machine Configuration'
 MACHINE_TYPE_OPTION = 'machine_type'
 MACHINE_AUTO_START_OPTION = 'auto_start'
+QUEUED_PIPELINE_OPTION = 'queued_pipeline'
 DICTIONARY_CONFIG_SECTION = 'Dictionary Configuration'
 DICTIONARY_FILE_OPTION = 'dictionary_file'
 DICTIONARY_LIST_OPTION = 'dictionary_list'
@@ -34,18 +31,32 @@ LOGGING_CONFIG_SECTION = 'Logging Configuration'
 LOG_FILE_OPTION = 'log_file'
 ENABLE_STROKE_LOGGING_OPTION = 'enable_stroke_logging'
 ENABLE_TRANSLATION_LOGGING_OPTION = 'enable_translation_logging'
+LATENCY_LOG_INTERVAL_OPTION = 'latency_log_interval'
+QUEUED_LOGGING_OPTION = 'queued_logging'
+LOG_QUEUE_SIZE_OPTION = 'log_queue_size'
+LOG_QUEUE_FULL_OPTION = 'log_queue_full'
+BINARY_STROKE_LOG_OPTION = 'binary_stroke_log'
+STROKE_JOURNAL_OPTION = 'stroke_journal'
 
 # Default values for configuration options.
 DEFAULT_MACHINE_TYPE = 'Microsoft Sidewinder X4'
 DEFAULT_MACHINE_AUTO_START = 'false'
+DEFAULT_QUEUED_PIPELINE = 'false'
 DEFAULT_DICTIONARY_FILE = 'dict.json'
 DEFAULT_LOG_FILE = 'plover.log'
 DEFAULT_ENABLE_STROKE_LOGGING = 'true'
 DEFAULT_ENABLE_TRANSLATION_LOGGING = 'true'
+DEFAULT_LATENCY_LOG_INTERVAL = '0'
+DEFAULT_QUEUED_LOGGING = 'false'
+DEFAULT_LOG_QUEUE_SIZE = '10000'
+DEFAULT_LOG_QUEUE_FULL = 'drop'
+DEFAULT_BINARY_STROKE_LOG = 'false'
+DEFAULT_STROKE_JOURNAL = 'false'
 
 # Dictionary constants.
 JSON_EXTENSION = '.json'
 ALTERNATIVE_ENCODING = 'latin-1'
+COMPILED_DICTIONARY_EXTENSION = '.plvc'
 
 # Logging constants.
 LOG_EXTENSION = '.log'
@@ -152,12 +163,26 @@ def verify_config(config):
                                DEFAULT_ENABLE_TRANSLATION_LOGGING),
       (LOGGING_CONFIG_SECTION, ENABLE_STROKE_LOGGING_OPTION,
                                DEFAULT_ENABLE_STROKE_LOGGING),
+      (LOGGING_CONFIG_SECTION, LATENCY_LOG_INTERVAL_OPTION,
+                               DEFAULT_LATENCY_LOG_INTERVAL),
+      (LOGGING_CONFIG_SECTION, QUEUED_LOGGING_OPTION,
+                               DEFAULT_QUEUED_LOGGING),
+      (LOGGING_CONFIG_SECTION, LOG_QUEUE_SIZE_OPTION,
+                               DEFAULT_LOG_QUEUE_SIZE),
+      (LOGGING_CONFIG_SECTION, LOG_QUEUE_FULL_OPTION,
+                               DEFAULT_LOG_QUEUE_FULL),
+      (LOGGING_CONFIG_SECTION, BINARY_STROKE_LOG_OPTION,
+                               DEFAULT_BINARY_STROKE_LOG),
+      (LOGGING_CONFIG_SECTION, STROKE_JOURNAL_OPTION,
+                               DEFAULT_STROKE_JOURNAL),
       (DICTIONARY_CONFIG_SECTION, DICTIONARY_FILE_OPTION,
                                   DEFAULT_DICTIONARY_FILE),
       (MACHINE_CONFIG_SECTION, MACHINE_TYPE_OPTION,
                                DEFAULT_MACHINE_TYPE),
       (MACHINE_CONFIG_SECTION, MACHINE_AUTO_START_OPTION,
                                DEFAULT_MACHINE_AUTO_START),
+      (MACHINE_CONFIG_SECTION, QUEUED_PIPELINE_OPTION,
+                               DEFAULT_QUEUED_PIPELINE),
       ):
         if not config.has_section(section):
             config.add_section(section)
@@ -189,6 +214,8 @@ def get_serial_params(section, config):
     parameters are used in their place.
 
     """
+    # Only serial machines need pyserial.
+    import serial
     serial_params = {}
     default_serial_port = serial.Serial()
     for opt in SERIAL_ALL_OPTIONS:
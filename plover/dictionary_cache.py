@@ -0,0 +1,602 @@
+# Copyright (c) 2013 Hesky Fisher.
+# See LICENSE.txt for details.
+
+"""Precompiled, memory-mapped steno dictionaries.
+
+Parsing a large json dictionary and normalizing every key takes seconds. This
+module compiles a loaded dictionary into a binary file that can be memory
+mapped and queried directly, without building any python dictionaries.
+
+A compiled file is laid out as follows (all fields little endian):
+
+- header: magic, format version, mtime and size of the source file, sha1 of
+  the source file contents, number of entries, length of the longest key and
+  number of hash table slots.
+- key lengths: for each key length from 1 to the longest, the number of keys
+  of that length (32 bits each).
+- hash table: one 32 bit file offset per slot, zero for an empty slot. Slots
+  are addressed with the crc32 of the encoded key and linear probing.
+- prefix hash table: the same, for the proper prefixes of the keys.
+- records: for each entry, the key length (16 bits) and the value length (32
+  bits) followed by the utf-8 encoded key, with strokes joined by '/', and the
+  utf-8 encoded value.
+- prefix records: for each prefix, its length (16 bits) and the encoded
+  prefix.
+
+A compiled file is valid for a source file if the mtime and size match or, when
+only the mtime differs, if the content hash matches.
+
+The mapped file itself is never written. Changes made to a CompiledDictionary
+are kept in memory on top of it, so editing an entry costs the same as editing
+a StenoDictionary.
+
+"""
+
+import array
+import collections
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import config as conf
+from lru_cache import LRUCache
+from steno import STROKE_DELIMITER, normalize_steno
+from steno_dictionary import load_dictionary
+
+_MAGIC = 'PLVC'
+_VERSION = 3
+
+_HEADER_STRUCT = struct.Struct('<4sIdQ20sIIIII')
+_RECORD_STRUCT = struct.Struct('<HI')
+_PREFIX_STRUCT = struct.Struct('<H')
+_SLOT_STRUCT = struct.Struct('<I')
+_COUNT_STRUCT = struct.Struct('<I')
+
+_MIN_SLOTS = 8
+
+# The number of compiled values a CompiledDictionary keeps. Like the
+# formatter's parse cache, a small cache covers the words written most.
+COMPILED_CACHE_SIZE = 4096
+
+
+def _encode_key(key):
+    """Encode a tuple of strokes into the on disk key format."""
+    key = STROKE_DELIMITER.join(key)
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return key
+
+
+def _decode_key(data):
+    """Decode an on disk key into a tuple of strokes."""
+    return tuple(data.decode('utf-8').split(STROKE_DELIMITER))
+
+
+def _encode_value(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _hash(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def _file_hash(filename):
+    """Return the sha1 digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), ''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def cache_filename(filename, cache_dir=None):
+    """Return the path of the compiled cache file for a dictionary file."""
+    if cache_dir is None:
+        cache_dir = conf.DICTIONARY_CACHE_DIR
+    name = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(cache_dir, name + conf.COMPILED_DICTIONARY_EXTENSION)
+
+
+def _table_size(count):
+    """Return the number of hash table slots to use for count items."""
+    slots = _MIN_SLOTS
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+
+def _insert_slot(table, encoded, offset):
+    """Put offset in the first free slot for encoded in table."""
+    mask = len(table) - 1
+    i = _hash(encoded) & mask
+    while table[i]:
+        i = (i + 1) & mask
+    table[i] = offset
+
+
+def compile_dictionary(dictionary, filename, source=None):
+    """Write a dictionary to filename in the compiled format.
+
+    Arguments:
+
+    dictionary -- A mapping of stroke tuples to translations.
+
+    filename -- The compiled file to write. The file is written to a temporary
+    file first and then renamed so readers never see a partial file.
+
+    source -- The dictionary file the entries came from, if any. Its mtime,
+    size and content hash are recorded to validate the cache later.
+
+    """
+    if source is not None:
+        st = os.stat(source)
+        mtime, size, digest = st.st_mtime, st.st_size, _file_hash(source)
+    else:
+        mtime, size, digest = 0.0, 0, '\0' * 20
+
+    entries = [(_encode_key(key), _encode_value(value))
+               for key, value in dictionary.iteritems()]
+    prefixes = set()
+    for key in dictionary.iterkeys():
+        for i in xrange(1, len(key)):
+            prefixes.add(key[:i])
+    prefixes = [_encode_key(prefix) for prefix in prefixes]
+    counts = collections.Counter(len(key) for key in dictionary.iterkeys())
+    longest_key = max(counts) if counts else 0
+    counts = array.array('I', [counts[i] for i in xrange(1, longest_key + 1)])
+    slots = _table_size(len(entries))
+    prefix_slots = _table_size(len(prefixes))
+
+    offset = (_HEADER_STRUCT.size + _COUNT_STRUCT.size * longest_key +
+              _SLOT_STRUCT.size * (slots + prefix_slots))
+    table = array.array('I', [0]) * slots
+    records = []
+    for encoded_key, encoded_value in entries:
+        _insert_slot(table, encoded_key, offset)
+        record = ''.join((_RECORD_STRUCT.pack(len(encoded_key),
+                                              len(encoded_value)),
+                          encoded_key, encoded_value))
+        records.append(record)
+        offset += len(record)
+    records_end = offset
+    prefix_table = array.array('I', [0]) * prefix_slots
+    for encoded_prefix in prefixes:
+        _insert_slot(prefix_table, encoded_prefix, offset)
+        record = _PREFIX_STRUCT.pack(len(encoded_prefix)) + encoded_prefix
+        records.append(record)
+        offset += len(record)
+
+    header = _HEADER_STRUCT.pack(_MAGIC, _VERSION, mtime, size, digest,
+                                 len(entries), longest_key, slots,
+                                 prefix_slots, records_end)
+    _write_file(filename, itertools.chain(
+        (header, counts.tostring(), table.tostring(),
+         prefix_table.tostring()), records))
+
+
+def _write_file(filename, chunks):
+    """Write chunks to a temporary file and rename it to filename.
+
+    A dictionary that has the old file mapped keeps reading the old contents.
+    On Windows a mapped file cannot be replaced; the error is raised and the
+    old file is kept.
+
+    """
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmp = tempfile.mkstemp(dir=dirname or None,
+                               prefix=os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.writelines(chunks)
+        if os.name == 'nt' and os.path.exists(filename):
+            # Windows cannot rename over an existing file.
+            os.remove(filename)
+        os.rename(tmp, filename)
+    except:
+        os.remove(tmp)
+        raise
+
+
+def _read_header(filename):
+    with open(filename, 'rb') as f:
+        data = f.read(_HEADER_STRUCT.size)
+    if len(data) != _HEADER_STRUCT.size:
+        return None
+    header = _HEADER_STRUCT.unpack(data)
+    if header[0] != _MAGIC or header[1] != _VERSION:
+        return None
+    return header
+
+
+def is_cache_valid(filename, source):
+    """Return True if the compiled file is up to date with source."""
+    try:
+        header = _read_header(filename)
+    except (IOError, OSError):
+        return False
+    if header is None:
+        return False
+    magic, version, mtime, size, digest = header[:5]
+    st = os.stat(source)
+    if st.st_size != size:
+        return False
+    if st.st_mtime == mtime:
+        return True
+    # The file was touched but might not have changed.
+    if _file_hash(source) != digest:
+        return False
+    # Remember the new mtime so the hash isn't computed on every load. The
+    # file may be mapped, so a copy with the new header replaces it.
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(_HEADER_STRUCT.size)
+            _write_file(filename, itertools.chain(
+                (_HEADER_STRUCT.pack(magic, version, st.st_mtime, size,
+                                     digest, *header[5:]),),
+                iter(lambda: f.read(1 << 16), '')))
+    except (IOError, OSError):
+        pass
+    return True
+
+
+class CompiledDictionary(collections.MutableMapping):
+    """A steno dictionary backed by a memory mapped compiled file.
+
+    This class provides the interface of StenoDictionary: mapping methods, the
+    longest_key property and longest key listeners. Entries are decoded from
+    the mapped file on access. Entries that are set or deleted are recorded in
+    memory and take precedence over the mapped file. With a value compiler set,
+    values are compiled when they are looked up and the compiled forms of the
+    most recently used values are kept, see set_value_compiler.
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER_STRUCT.unpack_from(self._map, 0)
+        if header[0] != _MAGIC or header[1] != _VERSION:
+            self._map.close()
+            raise ValueError('Not a compiled dictionary: %s' % filename)
+        self._len, longest_key, slots, prefix_slots, records_end = header[5:]
+        # Number of keys of each length, index 0 is for length 1.
+        self._counts = array.array('I')
+        self._counts.fromstring(self._map[
+            _HEADER_STRUCT.size:
+            _HEADER_STRUCT.size + _COUNT_STRUCT.size * longest_key])
+        self._mask = slots - 1
+        self._table_offset = (_HEADER_STRUCT.size +
+                              _COUNT_STRUCT.size * longest_key)
+        self._prefix_mask = prefix_slots - 1
+        self._prefix_table_offset = (self._table_offset +
+                                     _SLOT_STRUCT.size * slots)
+        self._data_offset = (self._prefix_table_offset +
+                             _SLOT_STRUCT.size * prefix_slots)
+        self._data_end = records_end
+        self._added = {}
+        # Number of added keys that each proper prefix is a prefix of.
+        self._added_prefixes = {}
+        self._deleted = set()
+        self._longest_key_length = longest_key
+        self._longest_listener_callbacks = set()
+        self._compiled = None
+
+    @property
+    def longest_key(self):
+        """The length of the longest key in the dict."""
+        return self._longest_key_length
+
+    def add_longest_key_listener(self, callback):
+        self._longest_listener_callbacks.add(callback)
+
+    def remove_longest_key_listener(self, callback):
+        self._longest_listener_callbacks.remove(callback)
+
+    def close(self):
+        """Unmap the compiled file.
+
+        A closed dictionary has no mapped entries, so a lookup made by another
+        thread while the dictionary is closed finds nothing instead of failing.
+
+        """
+        self._map.close()
+
+    def _find(self, key):
+        """Return the offset and length of the mapped value for key or None."""
+        try:
+            encoded = _encode_key(key)
+        except (TypeError, UnicodeError):
+            return None
+        data = self._map
+        table_offset = self._table_offset
+        mask = self._mask
+        i = _hash(encoded) & mask
+        while True:
+            offset = _SLOT_STRUCT.unpack_from(data, table_offset + 4 * i)[0]
+            if not offset:
+                return None
+            key_length, value_length = _RECORD_STRUCT.unpack_from(data, offset)
+            start = offset + _RECORD_STRUCT.size
+            if (key_length == len(encoded) and
+                data[start:start + key_length] == encoded):
+                return start + key_length, value_length
+            i = (i + 1) & mask
+
+    def has_prefix(self, strokes):
+        """Return True if strokes is the start of a longer key.
+
+        Prefixes of deleted keys may still be reported.
+
+        """
+        if strokes in self._added_prefixes:
+            return True
+        try:
+            encoded = _encode_key(strokes)
+        except (TypeError, UnicodeError):
+            return False
+        try:
+            return self._mapped_has_prefix(encoded)
+        except ValueError:
+            # The map was closed.
+            return False
+
+    def _mapped_has_prefix(self, encoded):
+        data = self._map
+        table_offset = self._prefix_table_offset
+        mask = self._prefix_mask
+        i = _hash(encoded) & mask
+        while True:
+            offset = _SLOT_STRUCT.unpack_from(data, table_offset + 4 * i)[0]
+            if not offset:
+                return False
+            length = _PREFIX_STRUCT.unpack_from(data, offset)[0]
+            start = offset + _PREFIX_STRUCT.size
+            if length == len(encoded) and data[start:start + length] == encoded:
+                return True
+            i = (i + 1) & mask
+
+    def _records(self):
+        """Yield (key offset, key length, value length) for every record."""
+        data = self._map
+        offset = self._data_offset
+        end = self._data_end
+        while offset < end:
+            key_length, value_length = _RECORD_STRUCT.unpack_from(data, offset)
+            offset += _RECORD_STRUCT.size
+            yield offset, key_length, value_length
+            offset += key_length + value_length
+
+    def _mapped_contains(self, key):
+        if key in self._deleted:
+            return False
+        try:
+            return self._find(key) is not None
+        except ValueError:
+            # The map was closed.
+            return False
+
+    def _count_key(self, length, delta):
+        """Update the number of keys of a length."""
+        counts = self._counts
+        while len(counts) < length:
+            counts.append(0)
+        counts[length - 1] += delta
+        while counts and not counts[-1]:
+            counts.pop()
+
+    def _update_longest_key(self):
+        longest_key = len(self._counts)
+        if longest_key != self._longest_key_length:
+            self._longest_key_length = longest_key
+            for callback in self._longest_listener_callbacks:
+                callback(longest_key)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if self._added:
+            value = self._added.get(key)
+            if value is not None:
+                return value
+        if self._deleted and key in self._deleted:
+            return default
+        try:
+            found = self._find(key)
+            if found is None:
+                return default
+            start, length = found
+            return self._map[start:start + length].decode('utf-8')
+        except ValueError:
+            # The map was closed.
+            return default
+
+    def set_value_compiler(self, compiler):
+        """Compile values as they are looked up.
+
+        Compiling every value up front would read the whole file, so the
+        compiled forms of the COMPILED_CACHE_SIZE most recently looked up
+        values are kept instead. See StenoDictionary.set_value_compiler.
+
+        Arguments:
+
+        compiler -- A function that takes a value and returns its compiled
+        form, or None to stop compiling values.
+
+        """
+        if compiler is None:
+            self._compiled = None
+        elif self._compiled is None or self._compiled.function is not compiler:
+            self._compiled = LRUCache(compiler, COMPILED_CACHE_SIZE)
+
+    def lookup(self, key):
+        """Return the value for key and its compiled form.
+
+        See StenoDictionary.lookup.
+
+        """
+        value = self.get(key)
+        if value is None or self._compiled is None:
+            return value, None
+        return value, self._compiled(value)
+
+    def __setitem__(self, key, value):
+        self._add(key, value)
+        self._update_longest_key()
+
+    def __delitem__(self, key):
+        self._remove(key)
+        self._update_longest_key()
+
+    def update(self, *args, **kw):
+        """Add entries like dict.update, notifying listeners at most once."""
+        if len(args) > 1:
+            raise TypeError('update expected at most 1 arguments, got %d' %
+                            len(args))
+        try:
+            if args:
+                other = args[0]
+                if isinstance(other, collections.Mapping):
+                    other = other.iteritems()
+                elif hasattr(other, 'keys'):
+                    other = ((key, other[key]) for key in other.keys())
+                for key, value in other:
+                    self._add(key, value)
+            for key, value in kw.iteritems():
+                self._add(key, value)
+        finally:
+            self._update_longest_key()
+
+    def delete_many(self, keys):
+        """Delete several keys, notifying listeners at most once."""
+        try:
+            for key in keys:
+                self._remove(key)
+        finally:
+            self._update_longest_key()
+
+    def clear(self):
+        self.delete_many(list(self.iterkeys()))
+
+    def _add(self, key, value):
+        if key not in self._added:
+            if not self._mapped_contains(key):
+                self._len += 1
+                self._count_key(len(key), 1)
+            prefixes = self._added_prefixes
+            for i in xrange(1, len(key)):
+                prefix = key[:i]
+                prefixes[prefix] = prefixes.get(prefix, 0) + 1
+        self._added[key] = value
+
+    def _remove(self, key):
+        if key in self._added:
+            del self._added[key]
+            prefixes = self._added_prefixes
+            for i in xrange(1, len(key)):
+                prefix = key[:i]
+                count = prefixes[prefix] - 1
+                if count:
+                    prefixes[prefix] = count
+                else:
+                    del prefixes[prefix]
+        elif not self._mapped_contains(key):
+            raise KeyError(key)
+        if self._mapped_contains(key):
+            self._deleted.add(key)
+        self._len -= 1
+        self._count_key(len(key), -1)
+
+    def __contains__(self, key):
+        return key in self._added or self._mapped_contains(key)
+
+    def iteritems(self):
+        data = self._map
+        added = self._added
+        deleted = self._deleted
+        for offset, key_length, value_length in self._records():
+            value_offset = offset + key_length
+            key = _decode_key(data[offset:value_offset])
+            if key in added or key in deleted:
+                continue
+            yield (key, data[value_offset:value_offset + value_length].decode(
+                       'utf-8'))
+        for item in added.items():
+            yield item
+
+    def iterkeys(self):
+        for key, value in self.iteritems():
+            yield key
+
+    def itervalues(self):
+        for key, value in self.iteritems():
+            yield value
+
+    def __iter__(self):
+        return self.iterkeys()
+
+
+def load_dictionary_file(filename, cache_dir=None):
+    """Load a json dictionary file through the compiled cache.
+
+    If a valid compiled file exists it is mapped and returned. Otherwise the
+    json file is parsed with load_dictionary, compiled for the next time and
+    the compiled version is returned. If the cache cannot be written the parsed
+    StenoDictionary is returned instead.
+
+    """
+    cached = cache_filename(filename, cache_dir)
+    if is_cache_valid(cached, filename):
+        try:
+            return CompiledDictionary(cached)
+        except (IOError, OSError, ValueError, struct.error):
+            pass
+    with open(filename, 'rb') as f:
+        dictionary = load_dictionary(f.read())
+    try:
+        compile_dictionary(dictionary, cached, filename)
+        return CompiledDictionary(cached)
+    except (IOError, OSError):
+        return dictionary
+
+
+def update_cache(filename, pairs, cache_dir=None):
+    """Compile a json dictionary file unless its compiled cache is valid.
+
+    Arguments:
+
+    filename -- The json dictionary file.
+
+    pairs -- The (stroke, translation) pairs already parsed from the file, so
+    the file doesn't have to be parsed again.
+
+    cache_dir -- The cache directory, see cache_filename.
+
+    Returns True if the cache is valid afterwards.
+
+    """
+    cached = cache_filename(filename, cache_dir)
+    if is_cache_valid(cached, filename):
+        return True
+    dictionary = dict((normalize_steno(stroke), translation)
+                      for stroke, translation in pairs)
+    try:
+        compile_dictionary(dictionary, cached, filename)
+    except (IOError, OSError):
+        return False
+    return True
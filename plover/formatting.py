@@ -9,8 +9,10 @@ This module defines and implements plover's custom dictionary language.
 
 from os.path import commonprefix
 from collections import namedtuple
+import latency
 import orthography
 import re
+from lru_cache import LRUCache
 
 class Formatter(object):
     """Convert translations into output.
@@ -32,18 +34,21 @@ class Formatter(object):
     send_engine_command -- Takes a string which names the special command to
     execute.
 
+    flush -- Takes no arguments and is called at the end of each call to
+    format, see CoalescingOutput.
+
     """
 
     output_type = namedtuple(
         'output', ['send_backspaces', 'send_string', 'send_key_combination', 
-                   'send_engine_command'])
+                   'send_engine_command', 'flush'])
 
     def __init__(self):
         self.set_output(None)
 
     def set_output(self, output):
         """Set the output class."""
-        noop = lambda x: None
+        noop = lambda *args: None
         output_type = type(self).output_type
         fields = output_type._fields
         self._output = output_type(*[getattr(output, f, noop) for f in fields])
@@ -68,7 +73,8 @@ class Formatter(object):
         for t in do:
             last_action = _get_last_action(prev.formatting if prev else None)
             if t.english:
-                t.formatting = _translation_to_actions(t.english, last_action)
+                t.formatting = _translation_to_actions(
+                    t.english, last_action, getattr(t, 'template', None))
             else:
                 t.formatting = _raw_to_actions(t.rtfcre[0], last_action)
             prev = t
@@ -85,7 +91,175 @@ class Formatter(object):
 
         _undo(old[i:], self._output)
         _render_actions(new[i:], self._output)
+        if latency.enabled:
+            latency.mark('format')
+        self._output.flush()
+        if latency.enabled:
+            latency.mark('output')
+
+
+# The number of characters CoalescingOutput remembers having typed.
+_TAIL_LENGTH = 256
+
+class CoalescingOutput(object):
+    """An output that sends the text changes of each format call at once.
+
+    Undoing and rendering actions sends backspaces and strings action by
+    action. This output collects them until it is flushed, which the
+    Formatter does at the end of each call to format, and then sends one
+    backspace count and one string. It also remembers the end of the text it
+    typed, so when the backspaces would delete text that is typed again right
+    away, like the start of a word that gets a suffix, only the part that
+    changes is deleted and typed.
+
+    Key combinations and engine commands are passed on in order, after the
+    text collected before them. A key combination may move the cursor, so the
+    remembered text is forgotten.
+
+    Attributes:
+    flushes -- The number of flushes that sent anything.
+    keystrokes_saved -- The number of backspaces and characters that were
+    requested but didn't need to be sent.
+
+    """
+
+    def __init__(self, output, tail_length=_TAIL_LENGTH):
+        """Wrap an output.
+
+        Arguments:
+
+        output -- The output to send to, with the functions described in
+        Formatter.
+
+        tail_length -- The number of typed characters to remember.
+
+        """
+        self._output = output
+        self._tail_length = tail_length
+        # The text typed before the cursor, as far as known.
+        self._tail = ''
+        # Pending backspaces, sent before the pending text.
+        self._backspaces = 0
+        self._text = ''
+        self._requested = 0
+        self.flushes = 0
+        self.keystrokes_saved = 0
+
+    def send_backspaces(self, n):
+        self._requested += n
+        if n <= len(self._text):
+            self._text = self._text[:len(self._text) - n]
+        else:
+            self._backspaces += n - len(self._text)
+            self._text = ''
+
+    def send_string(self, s):
+        self._requested += len(s)
+        self._text += s
+
+    def send_key_combination(self, combo):
+        self.flush()
+        self._tail = ''
+        self._output.send_key_combination(combo)
+
+    def send_engine_command(self, command):
+        self.flush()
+        self._output.send_engine_command(command)
+
+    def flush(self):
+        """Send the pending backspaces and text."""
+        backspaces, text, tail = self._backspaces, self._text, self._tail
+        if backspaces <= len(tail):
+            # Keep what would be deleted and typed again.
+            deleted = tail[len(tail) - backspaces:]
+            common = len(commonprefix([deleted, text]))
+            backspaces -= common
+            text = text[common:]
+            tail = tail[:len(tail) - backspaces]
+        else:
+            tail = ''
+        self._tail = (tail + text)[-self._tail_length:]
+        self.keystrokes_saved += self._requested - backspaces - len(text)
+        self._backspaces = self._requested = 0
+        self._text = ''
+        if backspaces or text:
+            self.flushes += 1
+        if backspaces:
+            self._output.send_backspaces(backspaces)
+        if text:
+            self._output.send_string(text)
+
+
+# Characters render_text holds back because later translations may delete them.
+_TEXT_HOLD = 1024
 
+def render_text(translations, hold=_TEXT_HOLD):
+    """Render committed translations as text without any OS output.
+
+    This is meant for translations that will not be undone, like the ones
+    yielded by Translator.translate_many. Key combinations and engine commands
+    are ignored.
+
+    Arguments:
+
+    translations -- An iterable of translations in order.
+
+    hold -- The number of trailing characters to hold back until more text
+    follows, so backspaces sent by later translations can still delete them.
+
+    Yields the text in chunks. Raises ValueError if a translation deletes
+    more than the held text, since text already yielded can't be changed.
+
+    """
+    output = _TextOutput()
+    formatter = Formatter()
+    formatter.set_output(output)
+    prev = None
+    for t in translations:
+        formatter.format([], [t], prev)
+        prev = t
+        text = output.take(hold)
+        if text:
+            yield text
+    if output.text:
+        yield output.text
+
+class _TextOutput(object):
+    """An output that collects the rendered text.
+
+    Attributes:
+    text -- The text not yet taken.
+    taken -- Whether some text has been taken.
+
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.taken = False
+
+    def send_backspaces(self, n):
+        if n > len(self.text) and self.taken:
+            raise ValueError('Cannot delete %d characters, only %d are held' %
+                             (n, len(self.text)))
+        self.text = self.text[:max(len(self.text) - n, 0)]
+
+    def send_string(self, s):
+        self.text += s
+
+    def take(self, hold):
+        """Take the text before the last hold characters.
+
+        Text is only taken once more than twice hold characters are held, so
+        it's taken in chunks. Returns the text taken, if any.
+
+        """
+        if len(self.text) <= 2 * hold:
+            return ''
+        split = len(self.text) - hold
+        text = self.text[:split]
+        self.text = self.text[split:]
+        self.taken = True
+        return text
 
 def _get_last_action(actions):
     """Return last action in actions if possibleor return a blank action."""
@@ -111,6 +285,9 @@ def _render_actions(actions, output):
         if a.command:
             output.send_engine_command(a.command)
 
+# Creates an action without running __init__.
+_new_action = object.__new__
+
 class _Action(object):
     """A hybrid class that stores instructions and resulting state.
 
@@ -118,7 +295,13 @@ class _Action(object):
     instructions are used to render the current action and the state is used as
     context to render future translations.
 
+    The formatter creates and compares actions for every stroke, so they keep
+    their fields in slots instead of a __dict__.
+
     """
+    __slots__ = ('attach', 'glue', 'word', 'capitalize',
+                 'text', 'replace', 'combo', 'command')
+
     def __init__(self, attach=False, glue=False, word='', capitalize=False,
                  text='', replace='', combo='', command=''):
         """Initialize a new action.
@@ -160,21 +343,31 @@ class _Action(object):
         
     def copy_state(self):
         """Clone this action but only clone the state variables."""
-        a = _Action()
+        a = _new_action(_Action)
         a.attach = self.attach
         a.glue = self.glue
         a.word = self.word
         a.capitalize = self.capitalize
+        a.text = a.replace = a.combo = a.command = ''
         return a
-        
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        # Field by field, the fields most likely to differ first.
+        return (self.text == other.text and
+                self.word == other.word and
+                self.replace == other.replace and
+                self.attach == other.attach and
+                self.glue == other.glue and
+                self.capitalize == other.capitalize and
+                self.combo == other.combo and
+                self.command == other.command)
 
     def __ne__(self, other):
-        return not self == other
+        return not self.__eq__(other)
 
     def __str__(self):
-        return 'Action(%s)' % str(self.__dict__)
+        return 'Action(%s)' % str(dict((name, getattr(self, name))
+                                       for name in self.__slots__))
 
     def __repr__(self):
         return str(self)
@@ -214,7 +407,7 @@ META_RE = re.compile(r"""(?:%s%s|%s%s|[^%s%s])+ # One or more of anything
 #                                   # doesn't contain unescaped { or }
 #             """, re.VERBOSE)
 
-def _translation_to_actions(translation, last_action):
+def _translation_to_actions(translation, last_action, template=None):
     """Create actions for a translation.
     
     Arguments:
@@ -223,10 +416,26 @@ def _translation_to_actions(translation, last_action):
 
     last_action -- The action in whose context this translation is formatted.
 
+    template -- The translation compiled by compile_translation, if known.
+
     Returns: A list of actions.
 
     """
     actions = []
+    atoms = template if template is not None else parse_cache(translation)
+
+    if not atoms:
+        return [last_action.copy_state()]
+
+    for atom in atoms:
+        action = _apply_atom(atom, last_action)
+        actions.append(action)
+        last_action = action
+
+    return actions
+
+def _parse_translation(translation):
+    """Parse a translation into a tuple of atoms, see _parse_atom."""
     # Reduce the translation to atoms. An atom is an irreducible string that is
     # either entirely a single meta command or entirely text containing no meta
     # commands.
@@ -235,16 +444,26 @@ def _translation_to_actions(translation, last_action):
         atoms = [_apply_glue(translation)]
     else:
         atoms = [x.strip() for x in META_RE.findall(translation) if x.strip()]
+    return tuple(_parse_atom(atom) for atom in atoms)
 
-    if not atoms:
-        return [last_action.copy_state()]
+def compile_translation(translation):
+    """Compile a translation into an action template.
 
-    for atom in atoms:
-        action = _atom_to_action(atom, last_action)
-        actions.append(action)
-        last_action = action
+    The template is a tuple of parsed atoms, which only need the context of
+    the previous action to become actions. This is meant to be set as the
+    value compiler of steno dictionaries, so translations are parsed when a
+    dictionary is loaded instead of when they are written.
 
-    return actions
+    """
+    return _parse_translation(translation)
+
+# The number of translations whose parsed atoms are kept. Common words make up
+# most of what is written so even a small cache answers most lookups.
+PARSE_CACHE_SIZE = 4096
+
+# Parsed atoms by translation. Use parse_cache.resize to change its size and
+# the hits and misses attributes to see how well it works.
+parse_cache = LRUCache(_parse_translation, PARSE_CACHE_SIZE)
 
 
 SPACE = ' '
@@ -278,6 +497,59 @@ def _raw_to_actions(stroke, last_action):
     else:
         return [_Action(text=(SPACE + stroke), word=stroke)]
 
+# Kinds of parsed atoms.
+(_TEXT, _COMMA, _STOP, _CAPITALIZE, _COMMAND, _GLUE, _ATTACH, _SUFFIX, _COMBO,
+ _UNKNOWN) = range(10)
+
+# A parsed atom. The kind says how the atom is rendered and text holds the
+# unescaped text, command or key combination with its meta markup removed.
+# begin and end tell whether an attach atom attaches to the previous and the
+# next word.
+_Atom = namedtuple('_Atom', ['kind', 'text', 'begin', 'end'])
+
+def _parse_atom(atom):
+    """Classify an atom.
+
+    This does the part of converting an atom into an action that doesn't
+    depend on the context, so it only has to be done once per translation.
+
+    Arguments:
+
+    atom -- A string holding an atom. An atom is an irreducible string that is
+    either entirely a single meta command or entirely text containing no meta
+    commands.
+
+    Returns: An _Atom.
+
+    """
+    meta = _get_meta(atom)
+    if meta is None:
+        return _Atom(_TEXT, _unescape_atom(atom), False, False)
+    meta = _unescape_atom(meta)
+    if meta in META_COMMAS:
+        return _Atom(_COMMA, meta, False, False)
+    if meta in META_STOPS:
+        return _Atom(_STOP, meta, False, False)
+    if meta == META_CAPITALIZE:
+        return _Atom(_CAPITALIZE, '', False, False)
+    if meta.startswith(META_COMMAND):
+        return _Atom(_COMMAND, meta[len(META_COMMAND):], False, False)
+    if meta.startswith(META_GLUE_FLAG):
+        return _Atom(_GLUE, meta[len(META_GLUE_FLAG):], False, False)
+    if meta.startswith(META_ATTACH_FLAG) or meta.endswith(META_ATTACH_FLAG):
+        begin = meta.startswith(META_ATTACH_FLAG)
+        end = meta.endswith(META_ATTACH_FLAG)
+        if begin:
+            meta = meta[len(META_ATTACH_FLAG):]
+        if end and len(meta) >= len(META_ATTACH_FLAG):
+            meta = meta[:-len(META_ATTACH_FLAG)]
+        if (begin and not end) or (begin and end and ' ' in meta):
+            return _Atom(_SUFFIX, meta, begin, end)
+        return _Atom(_ATTACH, meta, begin, end)
+    if meta.startswith(META_KEY_COMBINATION):
+        return _Atom(_COMBO, meta[len(META_KEY_COMBINATION):], False, False)
+    return _Atom(_UNKNOWN, meta, False, False)
+
 def _atom_to_action(atom, last_action):
     """Convert an atom into an action.
 
@@ -292,66 +564,59 @@ def _atom_to_action(atom, last_action):
     Returns: An action for the atom.
 
     """
-    action = _Action()
+    return _apply_atom(_parse_atom(atom), last_action)
+
+def _apply_atom(atom, last_action):
+    """Convert a parsed atom into an action in the context of last_action."""
+    kind = atom.kind
+    if kind == _TEXT:
+        text = atom.text
+        if last_action.capitalize:
+            text = _capitalize(text)
+        space = NO_SPACE if last_action.attach else SPACE
+        return _Action(text=space + text, word=_rightmost_word(text))
+    if kind == _COMMA:
+        return _Action(text=atom.text)
+    if kind == _STOP:
+        return _Action(text=atom.text, capitalize=True)
+    if kind == _CAPITALIZE:
+        action = last_action.copy_state()
+        action.capitalize = True
+        return action
+    if kind == _COMMAND:
+        action = last_action.copy_state()
+        action.command = atom.text
+        return action
+    if kind == _COMBO:
+        action = last_action.copy_state()
+        action.combo = atom.text
+        return action
     last_word = last_action.word
-    last_glue = last_action.glue
-    last_attach = last_action.attach
-    last_capitalize = last_action.capitalize
-    meta = _get_meta(atom)
-    if meta is not None:
-        meta = _unescape_atom(meta)
-        if meta in META_COMMAS:
-            action.text = meta
-        elif meta in META_STOPS:
-            action.text = meta
-            action.capitalize = True
-        elif meta == META_CAPITALIZE:
-            action = last_action.copy_state()
-            action.capitalize = True
-        elif meta.startswith(META_COMMAND):
-            action = last_action.copy_state()
-            action.command = meta[len(META_COMMAND):]
-        elif meta.startswith(META_GLUE_FLAG):
-            action.glue = True
-            glue = last_glue or last_attach
-            space = NO_SPACE if glue else SPACE
-            text = meta[len(META_GLUE_FLAG):]
-            if last_capitalize:
-                text = _capitalize(text)
-            action.text = space + text
-            action.word = _rightmost_word(last_word + action.text)
-        elif (meta.startswith(META_ATTACH_FLAG) or 
-              meta.endswith(META_ATTACH_FLAG)):
-            begin = meta.startswith(META_ATTACH_FLAG)
-            end = meta.endswith(META_ATTACH_FLAG)
-            if begin:
-                meta = meta[len(META_ATTACH_FLAG):]
-            if end and len(meta) >= len(META_ATTACH_FLAG):
-                meta = meta[:-len(META_ATTACH_FLAG)]
-            space = NO_SPACE if begin or last_attach else SPACE
-            if end:
-                action.attach = True
-            if (begin and not end) or (begin and end and ' ' in meta):
-                new = orthography.add_suffix(last_word.lower(), meta)
-                common = commonprefix([last_word.lower(), new])
-                action.replace = last_word[len(common):]
-                meta = new[len(common):]
-            if last_capitalize:
-                meta = _capitalize(meta)
-            action.text = space + meta
-            action.word = _rightmost_word(
-                last_word[:len(last_word)-len(action.replace)] + action.text)
-        elif meta.startswith(META_KEY_COMBINATION):
-            action = last_action.copy_state()
-            action.combo = meta[len(META_KEY_COMBINATION):]
-    else:
-        text = _unescape_atom(atom)
-        if last_capitalize:
+    if kind == _GLUE:
+        glue = last_action.glue or last_action.attach
+        space = NO_SPACE if glue else SPACE
+        text = atom.text
+        if last_action.capitalize:
             text = _capitalize(text)
-        space = NO_SPACE if last_attach else SPACE
-        action.text = space + text
-        action.word = _rightmost_word(text)
-    return action
+        text = space + text
+        return _Action(glue=True, text=text,
+                       word=_rightmost_word(last_word + text))
+    if kind == _ATTACH or kind == _SUFFIX:
+        action = _Action(attach=atom.end)
+        meta = atom.text
+        space = NO_SPACE if atom.begin or last_action.attach else SPACE
+        if kind == _SUFFIX:
+            new = orthography.add_suffix(last_word.lower(), meta)
+            common = commonprefix([last_word.lower(), new])
+            action.replace = last_word[len(common):]
+            meta = new[len(common):]
+        if last_action.capitalize:
+            meta = _capitalize(meta)
+        action.text = space + meta
+        action.word = _rightmost_word(
+            last_word[:len(last_word)-len(action.replace)] + action.text)
+        return action
+    return _Action()
 
 def _get_meta(atom):
     """Return the meta command, if any, without surrounding meta markups."""
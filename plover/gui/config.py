@@ -7,8 +7,7 @@ import os
 import wx
 import wx.lib.filebrowsebutton as filebrowse
 import ConfigParser
-from serial import Serial
-from plover.machine import SUPPORTED_DICT as SUPPORTED_MACHINES_DICT
+from plover.machine import MACHINES, uses_serial_port
 import plover.config as conf
 import plover.gui.serial_config as serial_config
 from plover.app import check_steno_config
@@ -153,14 +152,14 @@ class MachineConfig(wx.Panel):
         """
         wx.Panel.__init__(self, parent, size=CONFIG_PANEL_SIZE)
         self.config = config
-        self.config_class = None
+        self.serial_machine = False
         self.config_instance = None
         sizer = wx.BoxSizer(wx.VERTICAL)
         box = wx.BoxSizer(wx.HORIZONTAL)
         box.Add(wx.StaticText(self, label=MACHINE_LABEL),
                 border=COMPONENT_SPACE,
                 flag=wx.ALIGN_RIGHT | wx.ALIGN_CENTER_VERTICAL | wx.RIGHT)
-        machines = SUPPORTED_MACHINES_DICT.keys()
+        machines = MACHINES.keys()
         value = self.config.get(conf.MACHINE_CONFIG_SECTION,
                                 conf.MACHINE_TYPE_OPTION)
         self.choice = wx.Choice(self, choices=machines)
@@ -197,35 +196,28 @@ class MachineConfig(wx.Panel):
                         conf.MACHINE_AUTO_START_OPTION,
                         auto_start)
         if self.config_instance is not None:
-            if self.config_class is Serial:
+            if self.serial_machine:
                 conf.set_serial_params(self.config_instance,
                                        machine_type,
                                        self.config)
 
     def _advanced_config(self, event=None):
         # Brings up a more detailed configuration UI, if available.
-        if self.config_class:
+        if self.serial_machine:
             machine_type = self.choice.GetStringSelection()
-            if self.config_class is Serial:
-                if self.config_instance is None:
-                    self.config_instance = conf.get_serial_params(machine_type,
-                                                                  self.config)
-                scd = serial_config.SerialConfigDialog(self.config_instance,
-                                                       self)
-                scd.ShowModal()
-                scd.Destroy()
+            if self.config_instance is None:
+                self.config_instance = conf.get_serial_params(machine_type,
+                                                              self.config)
+            scd = serial_config.SerialConfigDialog(self.config_instance,
+                                                   self)
+            scd.ShowModal()
+            scd.Destroy()
 
     def _update(self, event=None):
-        # Refreshes the UI to reflect current data.
-        mod = conf.import_named_module(self.choice.GetStringSelection(),
-                                       SUPPORTED_MACHINES_DICT)
-        if ((mod is not None) and
-            hasattr(mod, 'Stenotype') and
-            hasattr(mod.Stenotype, 'CONFIG_CLASS')):
-            self.config_class = mod.Stenotype.CONFIG_CLASS
-        else:
-            self.config_class = None
-        self.config_button.Enable(self.config_class is not None)
+        # Refreshes the UI to reflect current data. The registry says which
+        # machines have settings, without importing their drivers.
+        self.serial_machine = uses_serial_port(self.choice.GetStringSelection())
+        self.config_button.Enable(self.serial_machine)
 
 
 class DictionaryConfig(wx.Panel):
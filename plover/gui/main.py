@@ -215,18 +215,40 @@ class Frame(wx.Frame):
         dialog.Show()
         return dialog
 
+    def _after_dictionaries(self, action):
+        """Call action on the GUI thread once the dictionaries are loaded.
+
+        The engine loads them in the background. Until it is done a busy
+        cursor is shown, but the GUI keeps responding.
+
+        """
+        if self.steno_engine.dictionaries_loaded.is_set():
+            action()
+            return
+        wx.BeginBusyCursor()
+        def loaded():
+            wx.EndBusyCursor()
+            action()
+        self.steno_engine.call_when_dictionaries_loaded(
+            lambda: wx.CallAfter(loaded))
+
     def _show_quickloader(self, event=None):
         """ Open Dictionary Quick Loader. """
+        self._after_dictionaries(self._toggle_quickloader)
+
+    def _toggle_quickloader(self):
         if self.quickLoader is None:
             self.quickLoader = QuickLoader(self.steno_engine, self)
         if self.quickLoader.IsShown():
             self.quickLoader.Hide()
         else:
             self.quickLoader.Show()
-        return self.quickLoader
     
     def _show_dictionary_manager(self, event=None):
         """ Open Dictionary Manager. """
+        self._after_dictionaries(self._open_dictionary_manager)
+
+    def _open_dictionary_manager(self):
         if self.dm is None:
             self.dm = dictionarymanager.dmFrame(self.steno_engine.store, self)
         self.dm.Show()
@@ -236,13 +258,13 @@ class Frame(wx.Frame):
     
     def _focus_on_dm_filter_stroke(self, event=None):
         """ Open Dictionary Manager and put focus on stroke filter. """
-        self._show_dictionary_manager()
-        self.dm.focusOnFilterStroke()
+        self._after_dictionaries(
+            lambda: self._open_dictionary_manager().focusOnFilterStroke())
 
     def _focus_on_dm_filter_translation(self, event=None):
         """ Open Dictionary Manager and put focus on translation filter. """
-        self._show_dictionary_manager()
-        self.dm.focusOnFilterTranslation()
+        self._after_dictionaries(
+            lambda: self._open_dictionary_manager().focusOnFilterTranslation())
 
     def _show_about_dialog(self, event=None):
         """Called when the About... button is clicked."""
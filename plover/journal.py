@@ -0,0 +1,473 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""An append-only binary journal of strokes with random access by time.
+
+The journal keeps the time and key mask of every stroke in fixed-size records,
+so the n-th stroke is at a known offset and readers can map the file and jump
+to any time without parsing what comes before it.
+
+The file starts with a header holding MAGIC, the format version, the number
+of strokes per segment, the stride of the segment index and the time of the
+journal's time 0 in seconds since the epoch. The strokes follow in segments.
+Each segment has up to SEGMENT_STROKES records of a stroke time, in
+milliseconds since time 0, and a key mask, see steno.STENO_KEY_MASKS, as
+little-endian 32-bit unsigned integers. A full segment ends with an index
+block holding the time of every INDEX_STRIDE-th stroke in it. A time seek
+bisects the first entries of the index blocks, then the index block of one
+segment and then at most INDEX_STRIDE records, so it only touches a few pages
+of even a very large journal.
+
+Stroke times are taken from the system clock, so time 0 plus a stroke time is
+the wall-clock time of the stroke, including across a suspend. Times never go
+back within a journal: a stroke made after the clock was set back gets the
+time of the stroke before it.
+
+Run with: python -m plover.journal convert plover.log... plover.journal
+          python -m plover.journal dump [--start S] [--end S] plover.journal
+
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+from steno import STENO_KEY_MASKS, StenoKeys, Stroke
+
+MAGIC = 'PLVJ'
+VERSION = 1
+
+# The extension of journal files.
+EXTENSION = '.journal'
+
+# The strokes in a segment and the strokes per entry of its index block.
+SEGMENT_STROKES = 4096
+INDEX_STRIDE = 64
+
+# The latest stroke time, in milliseconds since time 0. About 49 days.
+MAX_TIME = 2 ** 32 - 1
+
+_HEADER = struct.Struct('<4sHHHxxd')
+_RECORD = struct.Struct('<II')
+_INDEX_ENTRY = struct.Struct('<I')
+
+class _Layout(object):
+    """The offsets of the parts of a journal."""
+
+    def __init__(self, segment_strokes, index_stride):
+        if (not segment_strokes or not index_stride or
+            segment_strokes % index_stride):
+            raise ValueError('Invalid journal segment size')
+        self.segment_strokes = segment_strokes
+        self.index_stride = index_stride
+        self.index_entries = segment_strokes // index_stride
+        self.strokes_size = segment_strokes * _RECORD.size
+        self.segment_size = (self.strokes_size +
+                             self.index_entries * _INDEX_ENTRY.size)
+
+    def record_offset(self, index):
+        segment, stroke = divmod(index, self.segment_strokes)
+        return (_HEADER.size + segment * self.segment_size +
+                stroke * _RECORD.size)
+
+    def index_offset(self, segment):
+        return _HEADER.size + segment * self.segment_size + self.strokes_size
+
+    def counts(self, size):
+        """Return the strokes and the indexed segments in size bytes.
+
+        A partly written record is not counted. The strokes of a full segment
+        whose index block is incomplete are counted but not indexed.
+
+        """
+        segments, rest = divmod(max(size - _HEADER.size, 0),
+                                self.segment_size)
+        strokes = min(rest // _RECORD.size, self.segment_strokes)
+        return segments * self.segment_strokes + strokes, segments
+
+def stroke_mask(steno_keys):
+    """Return the key mask of some steno keys, ignoring unknown keys."""
+    mask = getattr(steno_keys, 'keymask', None)
+    if mask is None:
+        mask = 0
+        for key in steno_keys:
+            mask |= STENO_KEY_MASKS.get(key, 0)
+    return mask
+
+def _read_header(data):
+    if len(data) < _HEADER.size:
+        raise ValueError('Not a stroke journal')
+    magic, version, segment_strokes, index_stride, start_time = \
+        _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a stroke journal')
+    if version != VERSION:
+        raise ValueError('Unsupported stroke journal version: %d' % version)
+    return _Layout(segment_strokes, index_stride), start_time
+
+def _bisect(key, target, lo, hi):
+    """Return the first position in [lo, hi) whose key is at least target."""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key(mid) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class Journal(object):
+    """A memory mapped journal for reading.
+
+    A journal that is still being written can be read, refresh maps the
+    strokes appended since.
+
+    Attributes:
+    start_time -- The time of time 0 in seconds since the epoch.
+
+    """
+
+    def __init__(self, filename):
+        """Open a journal.
+
+        Raises ValueError if the file is not a stroke journal.
+
+        """
+        self._file = open(filename, 'rb')
+        self._map = None
+        self._size = 0
+        self._count = 0
+        self._segments = 0
+        try:
+            self._layout, self.start_time = _read_header(
+                self._file.read(_HEADER.size))
+            self.refresh()
+        except:
+            self._file.close()
+            raise
+
+    def refresh(self):
+        """Map the strokes written since the journal was opened."""
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self._size:
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), size,
+                              access=mmap.ACCESS_READ)
+        self._size = size
+        self._count, self._segments = self._layout.counts(size)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, index):
+        """Return the time in milliseconds and the key mask of a stroke."""
+        if not 0 <= index < self._count:
+            raise IndexError('Stroke index out of range')
+        return _RECORD.unpack_from(self._map,
+                                   self._layout.record_offset(index))
+
+    def _time(self, index):
+        return _RECORD.unpack_from(self._map,
+                                   self._layout.record_offset(index))[0]
+
+    def _index_entry(self, segment, entry):
+        return _INDEX_ENTRY.unpack_from(
+            self._map, self._layout.index_offset(segment) +
+            entry * _INDEX_ENTRY.size)[0]
+
+    def find(self, seconds):
+        """Return the index of the first stroke at or after a time.
+
+        Arguments:
+
+        seconds -- The time in seconds since time 0.
+
+        Returns len(self) if all strokes are earlier.
+
+        """
+        target = int(math.ceil(round(seconds * 1000, 6)))
+        layout = self._layout
+        lo, hi = 0, self._count
+        if self._segments:
+            # The number of indexed segments starting before the target.
+            segment = _bisect(lambda s: self._index_entry(s, 0), target, 0,
+                              self._segments)
+            if not segment:
+                return 0
+            segment -= 1
+            lo = segment * layout.segment_strokes
+            if segment + 1 < self._segments:
+                hi = lo + layout.segment_strokes
+            entry = _bisect(lambda e: self._index_entry(segment, e), target,
+                            1, layout.index_entries)
+            if entry < layout.index_entries:
+                hi = lo + entry * layout.index_stride
+            lo += (entry - 1) * layout.index_stride
+        return _bisect(self._time, target, lo, hi)
+
+    def strokes(self, start=0, end=None):
+        """Yield the strokes in a range of indexes.
+
+        Yields (time, steno keys) tuples where time is in seconds since time
+        0.
+
+        """
+        if end is None or end > self._count:
+            end = self._count
+        layout = self._layout
+        from_mask = StenoKeys.from_mask
+        # The records are unpacked a segment at a time.
+        while start < end:
+            count = min(layout.segment_strokes -
+                        start % layout.segment_strokes, end - start)
+            values = struct.unpack_from('<%dI' % (2 * count), self._map,
+                                        layout.record_offset(start))
+            for i in xrange(0, 2 * count, 2):
+                yield values[i] / 1000.0, from_mask(values[i + 1])
+            start += count
+
+    def strokes_between(self, start=0.0, end=None):
+        """Yield the strokes in a time range, see strokes.
+
+        Arguments:
+
+        start -- The time of the first stroke in seconds since time 0.
+
+        end -- The time in seconds since time 0 before which the strokes end,
+        or None for all strokes after start.
+
+        """
+        return self.strokes(self.find(start),
+                            None if end is None else self.find(end))
+
+def replay(journal, translator, start=0.0, end=None):
+    """Translate the strokes in a time range of a journal.
+
+    The strokes are translated one at a time, like strokes from a machine, so
+    the translator's listeners receive the translations.
+
+    Arguments:
+
+    journal -- A Journal.
+
+    translator -- A translation.Translator.
+
+    start, end -- The time range, see Journal.strokes_between.
+
+    Returns the number of strokes translated.
+
+    """
+    count = 0
+    for seconds, steno_keys in journal.strokes_between(start, end):
+        translator.translate(Stroke.from_keys(steno_keys))
+        count += 1
+    return count
+
+class JournalWriter(object):
+    """Appends strokes to a journal.
+
+    Attributes:
+    start_time -- The time of time 0 in seconds since the epoch.
+    count -- The number of strokes in the journal.
+
+    """
+
+    def __init__(self, filename, segment_strokes=SEGMENT_STROKES,
+                 index_stride=INDEX_STRIDE, start_time=None):
+        """Open a journal for appending, creating it if needed.
+
+        Arguments:
+
+        filename -- The journal file.
+
+        segment_strokes, index_stride -- The segment size and index stride of
+        a new journal. An existing journal keeps its own.
+
+        start_time -- The time 0 of a new journal in seconds since the epoch,
+        by default now.
+
+        Raises ValueError if an existing file is not a stroke journal.
+
+        """
+        self._file = open(filename, 'ab+')
+        try:
+            self._open(segment_strokes, index_stride, start_time)
+        except:
+            self._file.close()
+            raise
+
+    def _open(self, segment_strokes, index_stride, start_time):
+        f = self._file
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            if start_time is None:
+                start_time = time.time()
+            self._layout = _Layout(segment_strokes, index_stride)
+            self.start_time = start_time
+            f.write(_HEADER.pack(MAGIC, VERSION, segment_strokes,
+                                 index_stride, start_time))
+            self.count = 0
+            self._last_time = 0
+            self._index = []
+            return
+        f.seek(0)
+        layout, self.start_time = _read_header(f.read(_HEADER.size))
+        self._layout = layout
+        self.count, segments = layout.counts(size)
+        # Read the strokes after the last index block, and the last stroke.
+        first = max(min(segments * layout.segment_strokes, self.count - 1), 0)
+        f.seek(layout.record_offset(first))
+        data = f.read((self.count - first) * _RECORD.size)
+        times = [_RECORD.unpack_from(data, i * _RECORD.size)[0]
+                 for i in xrange(self.count - first)]
+        self._last_time = times[-1] if times else 0
+        if first < segments * layout.segment_strokes:
+            times = []
+        self._index = times[::layout.index_stride]
+        # Drop a partly written record or index block.
+        end = (_HEADER.size + segments * layout.segment_size +
+               len(times) * _RECORD.size)
+        if end != size:
+            f.truncate(end)
+        f.seek(0, os.SEEK_END)
+        if len(times) == layout.segment_strokes:
+            self._write_index()
+
+    def _write_index(self):
+        self._file.write(struct.pack('<%dI' % len(self._index),
+                                     *self._index))
+        self._index = []
+
+    def time(self, seconds=None):
+        """Return the journal time of a system time, in milliseconds.
+
+        Arguments:
+
+        seconds -- A time in seconds since the epoch, by default now.
+
+        Times before the last stroke give the time of the last stroke.
+
+        """
+        if seconds is None:
+            seconds = time.time()
+        return max(int((seconds - self.start_time) * 1000), self._last_time)
+
+    def size(self):
+        """Return the size of the journal in bytes."""
+        return self._file.tell()
+
+    def append(self, mask, millis=None):
+        """Add a stroke.
+
+        Arguments:
+
+        mask -- The key mask of the stroke.
+
+        millis -- The time of the stroke in milliseconds since time 0, by
+        default now. Times before the previous stroke are moved up to it.
+
+        Raises OverflowError if the time is after MAX_TIME.
+
+        """
+        if millis is None:
+            millis = self.time()
+        millis = max(millis, self._last_time)
+        if millis > MAX_TIME:
+            raise OverflowError('Stroke time after the end of the journal')
+        layout = self._layout
+        write = self._file.write
+        write(_RECORD.pack(millis, mask))
+        if not self.count % layout.index_stride:
+            self._index.append(millis)
+        self.count += 1
+        self._last_time = millis
+        if not self.count % layout.segment_strokes:
+            self._write_index()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def convert_log(strokes, filename, **kwargs):
+    """Write logged strokes to a new journal.
+
+    Arguments:
+
+    strokes -- An iterable of (time, steno keys) tuples where time is in
+    seconds since the epoch, see transcript.parse_log.
+
+    filename -- The journal file, which must not exist.
+
+    The other arguments are passed to JournalWriter. Time 0 of the journal is
+    the time of the first stroke. Keys that aren't steno keys are left out.
+
+    Returns the number of strokes written.
+
+    """
+    if os.path.exists(filename):
+        raise ValueError('%s already exists' % filename)
+    writer = None
+    try:
+        for seconds, steno_keys in strokes:
+            if writer is None:
+                writer = JournalWriter(filename, start_time=seconds, **kwargs)
+            writer.append(stroke_mask(steno_keys),
+                          int(round((seconds - writer.start_time) * 1000)))
+    finally:
+        if writer is not None:
+            writer.close()
+    return writer.count if writer is not None else 0
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Plover stroke journals.')
+    commands = parser.add_subparsers(dest='command')
+    convert = commands.add_parser(
+        'convert', help='convert stroke logs to a new journal')
+    convert.add_argument('logs', metavar='LOG', nargs='+',
+                         help='plover.log files, oldest first')
+    convert.add_argument('journal', metavar='JOURNAL', help='new journal')
+    dump = commands.add_parser('dump', help='print the strokes of a journal')
+    dump.add_argument('journal', metavar='JOURNAL', help='journal file')
+    dump.add_argument('--start', type=float, default=0.0,
+                      help='seconds since the start of the journal to start at')
+    dump.add_argument('--end', type=float,
+                      help='seconds since the start of the journal to end at')
+    options = parser.parse_args(args)
+
+    if options.command == 'convert':
+        from transcript import parse_log
+        def strokes():
+            for filename in options.logs:
+                with open(filename, 'rb') as f:
+                    for stroke in parse_log(f):
+                        yield stroke
+        count = convert_log(strokes(), options.journal)
+        sys.stderr.write('Wrote %d strokes to %s\n' % (count, options.journal))
+    else:
+        with Journal(options.journal) as journal:
+            for seconds, steno_keys in journal.strokes_between(options.start,
+                                                               options.end):
+                sys.stdout.write('%.3f\t%s\n' % (
+                    seconds, Stroke.from_keys(steno_keys).rtfcre))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Stroke latency measurements across the steno pipeline.
+
+When enabled, the machine marks the time each stroke is captured and later
+stages of the pipeline record the time elapsed since then:
+
+translate -- The translator has the new translations.
+
+format -- The formatter has rendered them to the output.
+
+output -- The output calls have returned. With the queued pipeline, the
+output has only been queued.
+
+<name> stage -- A call on a queued pipeline stage has returned, see
+plover.pipeline.
+
+The durations are collected in a histogram per stage, read with stats or
+written to a log with log_stats.
+
+Checking the enabled flag is all the instrumentation costs when disabled:
+
+    if latency.enabled:
+        latency.mark('translate')
+
+"""
+
+import math
+import threading
+
+from clock import monotonic
+
+# True when latencies are being recorded, see enable.
+enabled = False
+
+# The capture time of the stroke handled by each thread.
+_current = threading.local()
+
+_lock = threading.Lock()
+_histograms = {}
+
+# The order in which stages are reported.
+STAGES = ('translate', 'format', 'output')
+
+class Histogram(object):
+    """Counts of durations in logarithmic buckets.
+
+    Buckets grow by a factor of 2 ** (1 / RESOLUTION), so percentiles are
+    accurate to about 9%.
+
+    Attributes:
+    count -- The number of durations added.
+    max -- The longest duration added, in seconds.
+
+    """
+    # Buckets per doubling of the duration.
+    RESOLUTION = 8
+    # Durations up to this many seconds share the first bucket.
+    SMALLEST = 1e-6
+
+    def __init__(self):
+        self._counts = {}
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add a duration in seconds."""
+        if seconds <= self.SMALLEST:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(seconds / self.SMALLEST, 2) *
+                                  self.RESOLUTION))
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """Return the duration below which percent of the durations fall.
+
+        The result is the upper bound of the bucket holding the percentile,
+        but never more than the longest duration.
+
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100.0
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= target:
+                break
+        return min(self.SMALLEST * 2 ** (float(index) / self.RESOLUTION),
+                   self.max)
+
+def enable():
+    """Start recording latencies."""
+    global enabled
+    enabled = True
+
+def disable():
+    """Stop recording latencies. Recorded latencies are kept."""
+    global enabled
+    enabled = False
+
+def reset():
+    """Forget the recorded latencies."""
+    with _lock:
+        _histograms.clear()
+
+def capture():
+    """Mark the capture of a stroke by the current thread."""
+    _current.start = monotonic()
+
+def current():
+    """Return the capture time of the current thread's stroke, or None.
+
+    Times are from plover.clock.monotonic, whose resolution is finer than
+    that of time.time on Windows.
+
+    """
+    return getattr(_current, 'start', None)
+
+def set_current(start):
+    """Continue measuring a stroke captured on another thread."""
+    _current.start = start
+
+def mark(stage):
+    """Record the time since the current stroke was captured for a stage."""
+    start = getattr(_current, 'start', None)
+    if start is None:
+        return
+    elapsed = monotonic() - start
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.add(elapsed)
+
+def stats():
+    """Return the latency statistics of each stage, by stage name.
+
+    Each stage has a dictionary with the count of strokes measured and the
+    p50, p99 and max latencies in seconds.
+
+    """
+    with _lock:
+        return dict((stage, {'count': h.count,
+                             'p50': h.percentile(50),
+                             'p99': h.percentile(99),
+                             'max': h.max})
+                    for stage, h in _histograms.iteritems())
+
+def format_stats():
+    """Return the statistics as lines of text, in pipeline order."""
+    all_stats = stats()
+    order = dict((stage, i) for i, stage in enumerate(STAGES))
+    lines = []
+    for stage in sorted(all_stats, key=lambda s: (order.get(s, len(order)),
+                                                 s)):
+        s = all_stats[stage]
+        lines.append('%s: %d strokes, p50 %.2f ms, p99 %.2f ms, max %.2f ms' %
+                     (stage, s['count'], s['p50'] * 1000, s['p99'] * 1000,
+                      s['max'] * 1000))
+    return lines
+
+def log_stats(logger):
+    """Write the statistics to a logger."""
+    for line in format_stats():
+        logger.info('Latency %s', line)
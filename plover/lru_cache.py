@@ -0,0 +1,100 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A bounded cache of the results of a function."""
+
+import threading
+
+# Fields of a link in the recently used list.
+_PREV, _NEXT, _KEY, _VALUE = range(4)
+
+class LRUCache(object):
+    """Remember the results of a function for the most recently used arguments.
+
+    The function must take a single hashable argument. Calling the cache
+    returns the function's result for the argument, computing it only when
+    it's not already cached. When the cache is full the least recently used
+    result is dropped.
+
+    The hits and misses attributes count the calls that were and weren't
+    answered from the cache.
+
+    """
+
+    def __init__(self, function, size):
+        """Create a cache.
+
+        Arguments:
+
+        function -- The function whose results are cached.
+
+        size -- The maximum number of results to keep. With a size of 0
+        nothing is cached.
+
+        """
+        self.function = function
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._links = {}
+        # A circular doubly linked list from the least to the most recently
+        # used link.
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def __call__(self, key):
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                self.hits += 1
+                # Move the link to the most recently used end.
+                prev, next = link[_PREV], link[_NEXT]
+                prev[_NEXT] = next
+                next[_PREV] = prev
+                root = self._root
+                last = root[_PREV]
+                last[_NEXT] = root[_PREV] = link
+                link[_PREV] = last
+                link[_NEXT] = root
+                return link[_VALUE]
+            self.misses += 1
+        value = self.function(key)
+        with self._lock:
+            if self.size > 0 and key not in self._links:
+                if len(self._links) >= self.size:
+                    self._drop_oldest()
+                root = self._root
+                last = root[_PREV]
+                link = [last, root, key, value]
+                last[_NEXT] = root[_PREV] = self._links[key] = link
+        return value
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def resize(self, size):
+        """Change the maximum number of results kept."""
+        with self._lock:
+            self.size = size
+            while len(self._links) > max(size, 0):
+                self._drop_oldest()
+
+    def clear(self):
+        """Drop all results and reset the counters."""
+        with self._lock:
+            self._links.clear()
+            root = self._root
+            root[:] = [root, root, None, None]
+            self.hits = 0
+            self.misses = 0
+
+    def _drop_oldest(self):
+        root = self._root
+        oldest = root[_NEXT]
+        root[_NEXT] = oldest[_NEXT]
+        oldest[_NEXT][_PREV] = root
+        del self._links[oldest[_KEY]]
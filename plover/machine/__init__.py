@@ -6,10 +6,50 @@
 Each stenotype machine description must define a Stenotype class that
 has start_capture, stop_capture, and add_callback methods.
 
+The machine modules are only imported when a machine is used, see
+import_machine. What the configuration needs to know about each machine is
+in the MACHINES registry, so listing the machines doesn't import their
+drivers or the libraries they depend on.
+
 """
+import collections
+import sys
+
 __all__ = ['geminipr', 'sidewinder', 'txbolt', 'stentura']
 
-SUPPORTED_DICT = {'Microsoft Sidewinder X4': 'plover.machine.sidewinder',
-                  'Gemini PR': 'plover.machine.geminipr',
-                  'TX Bolt': 'plover.machine.txbolt',
-                  'Stentura': 'plover.machine.stentura'}
+# What the configuration needs to know about a machine.
+#
+# module -- The name of the module with the machine's Stenotype class.
+#
+# serial -- True if the machine connects through a serial port and takes
+# serial port parameters.
+MachineInfo = collections.namedtuple('MachineInfo', 'module serial')
+
+MACHINES = {
+    'Microsoft Sidewinder X4': MachineInfo('plover.machine.sidewinder',
+                                           False),
+    'Gemini PR': MachineInfo('plover.machine.geminipr', True),
+    'TX Bolt': MachineInfo('plover.machine.txbolt', True),
+    'Stentura': MachineInfo('plover.machine.stentura', True),
+}
+
+SUPPORTED_DICT = dict((name, info.module) for name, info in MACHINES.items())
+
+
+def uses_serial_port(name):
+    """Return True if the named machine takes serial port parameters."""
+    info = MACHINES.get(name)
+    return info is not None and info.serial
+
+
+def import_machine(name):
+    """Import and return the module of the named machine.
+
+    Returns None if the name isn't a supported machine.
+
+    """
+    info = MACHINES.get(name)
+    if info is None:
+        return None
+    __import__(info.module)
+    return sys.modules[info.module]
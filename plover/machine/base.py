@@ -3,9 +3,28 @@
 
 """Base classes for machine types. Do not use directly."""
 
+import io
+import os
 import serial
 import threading
 from plover.exception import SerialPortException
+import plover.latency as latency
+
+
+def can_select(port):
+    """Return whether select can wait for data on a serial port.
+
+    Only Unix can select on serial ports. pyserial ports always have a fileno
+    method, which raises when the port has no file descriptor.
+
+    """
+    if os.name != 'posix':
+        return False
+    try:
+        port.fileno()
+    except (AttributeError, io.UnsupportedOperation, ValueError):
+        return False
+    return True
 
 
 class StenotypeBase:
@@ -40,6 +59,8 @@ class StenotypeBase:
 
     def _notify(self, steno_keys):
         """Invoke the callback of each subscriber with the given argument."""
+        if latency.enabled:
+            latency.capture()
         for callback in self.subscribers:
             callback(steno_keys)
 
@@ -4,6 +4,7 @@
 """Thread-based monitoring of a Gemini PR stenotype machine."""
 
 import plover.machine.base
+from plover.steno import STENO_KEY_MASKS, StenoKeys
 
 # In the Gemini PR protocol, each packet consists of exactly six bytes
 # and the most significant bit (MSB) of every byte is used exclusively
@@ -21,6 +22,112 @@ STENO_KEY_CHART = ("Fn", "#", "#", "#", "#", "#", "#",
 
 BYTES_PER_STROKE = 6
 
+# Keys on the machine that aren't steno keys get bits above the steno keys in
+# a key mask.
+_EXTRA_KEYS = ('Fn', 'res', 'pwr')
+_KEY_MASKS = dict(STENO_KEY_MASKS)
+_STENO_MASK = sum(STENO_KEY_MASKS.values())
+for _key in _EXTRA_KEYS:
+    _KEY_MASKS[_key] = (_STENO_MASK + 1) << _EXTRA_KEYS.index(_key)
+del _key
+
+
+def _byte_tables():
+    """Return the key mask of each byte value at each position of a packet.
+
+    Each table has 256 entries so bytes can be looked up without masking the
+    MSB.
+
+    """
+    tables = []
+    for i in xrange(BYTES_PER_STROKE):
+        row = STENO_KEY_CHART[i * 7:i * 7 + 7]
+        table = []
+        for b in xrange(256):
+            mask = 0
+            for j, key in enumerate(row):
+                if b & (0x40 >> j):
+                    mask |= _KEY_MASKS[key]
+            table.append(mask)
+        tables.append(tuple(table))
+    return tuple(tables)
+
+_BYTE_TABLES = _byte_tables()
+
+# Key tuples for key masks with keys that aren't steno keys, see
+# mask_to_keys.
+_CACHE_LIMIT = 4096
+_EXTRA_KEY_TUPLES = {}
+
+
+def decode(data):
+    """Decode the packets at the start of a buffer.
+
+    Bytes before the first byte with the MSB set are skipped. A packet cut
+    short by the start of another packet is skipped up to that byte, so a
+    lost or corrupted byte costs only the packet it's in.
+
+    Arguments:
+
+    data -- A bytearray of data from the machine.
+
+    Returns a tuple of the key masks of the packets, the number of bytes
+    skipped and the offset of the first byte not decoded yet: the start of a
+    partial packet at the end of the buffer, or its length.
+
+    """
+    t0, t1, t2, t3, t4, t5 = _BYTE_TABLES
+    masks = []
+    skipped = 0
+    end = len(data)
+    i = 0
+    while i < end:
+        if not data[i] & 0x80:
+            i += 1
+            skipped += 1
+            continue
+        if i + BYTES_PER_STROKE > end:
+            # Wait for the rest of the packet unless another one starts.
+            j = i + 1
+            while j < end and not data[j] & 0x80:
+                j += 1
+            if j == end:
+                break
+            skipped += j - i
+            i = j
+            continue
+        b1, b2, b3, b4, b5 = data[i + 1:i + BYTES_PER_STROKE]
+        if (b1 | b2 | b3 | b4 | b5) & 0x80:
+            # Resynchronize on the next packet start.
+            j = i + 1
+            while not data[j] & 0x80:
+                j += 1
+            skipped += j - i
+            i = j
+            continue
+        masks.append(t0[data[i]] | t1[b1] | t2[b2] | t3[b3] | t4[b4] |
+                     t5[b5])
+        i += BYTES_PER_STROKE
+    return masks, skipped, i
+
+
+def mask_to_keys(mask):
+    """Return the shared key tuple for a key mask from decode.
+
+    Masks of steno keys only give the StenoKeys for the mask. Otherwise the
+    steno keys are followed by the other keys of the machine.
+
+    """
+    if not mask & ~_STENO_MASK:
+        return StenoKeys.from_mask(mask)
+    keys = _EXTRA_KEY_TUPLES.get(mask)
+    if keys is None:
+        keys = (tuple(StenoKeys.from_mask(mask & _STENO_MASK)) +
+                tuple(key for key in _EXTRA_KEYS if mask & _KEY_MASKS[key]))
+        if len(_EXTRA_KEY_TUPLES) < _CACHE_LIMIT:
+            _EXTRA_KEY_TUPLES[mask] = keys
+    return keys
+
 
 class Stenotype(plover.machine.base.SerialStenotypeBase):
     """Standard stenotype interface for a Gemini PR machine.
@@ -29,34 +136,40 @@ class Stenotype(plover.machine.base.SerialStenotypeBase):
     stenotype interface: start_capture, stop_capture, and
     add_callback.
 
+    Attributes:
+    packets -- The number of packets decoded.
+    bytes_skipped -- The number of bytes dropped to resynchronize.
+
     """
 
+    def __init__(self, **kwargs):
+        plover.machine.base.SerialStenotypeBase.__init__(self, **kwargs)
+        self.packets = 0
+        self.bytes_skipped = 0
+
     def run(self):
         """Overrides base class run method. Do not call directly."""
+        buf = bytearray()
         while not self.finished.isSet():
 
-            # Grab data from the serial port.
-            raw = self.serial_port.read(BYTES_PER_STROKE)
+            # Grab whatever data is waiting on the serial port, or wait for
+            # the next byte.
+            try:
+                raw = self.serial_port.read(self.serial_port.inWaiting() or 1)
+            except Exception:
+                # Reading fails once stop_capture has closed the port.
+                if self.finished.isSet():
+                    break
+                raise
             if not raw:
                 continue
+            buf.extend(raw)
 
-            # XXX : work around for python 3.1 and python 2.6 differences
-            if isinstance(raw, str):
-                raw = [ord(x) for x in raw]
-
-            # Make sure this is a valid steno stroke.
-            if not ((len(raw) == BYTES_PER_STROKE) and
-                    (raw[0] & 0x80) and
-                    (len([b for b in raw if b & 0x80]) == 1)):
-                serial_port.flushInput()
-                continue
-
-            # Convert the raw to a list of steno keys.
-            steno_keys = []
-            for i, b in enumerate(raw):
-                for j in range(1, 8):
-                    if (b & (0x80 >> j)):
-                        steno_keys.append(STENO_KEY_CHART[i * 7 + j - 1])
+            masks, skipped, end = decode(buf)
+            del buf[:end]
+            self.packets += len(masks)
+            self.bytes_skipped += skipped
 
             # Notify all subscribers.
-            self._notify(steno_keys)
+            for mask in masks:
+                self._notify(mask_to_keys(mask))
@@ -0,0 +1,423 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Simulated stenotype machines on pseudo-terminals.
+
+A simulator opens a pty and plays a machine on its master end, so the
+Stenotype of a serial machine can open the slave end as its port:
+
+    simulator = GeminiPRSimulator(random_strokes(1000), wpm=300)
+    machine = geminipr.Stenotype(**simulator.serial_params())
+    machine.add_callback(...)
+    machine.start_capture()
+    simulator.start()
+    simulator.wait()
+
+Strokes are typed at a steady rate, optionally with jitter, and can be damaged
+on the way to test how the machine recovers. The Gemini PR and TX Bolt
+simulators write each stroke as it's typed. The Stentura simulator appends it
+to the realtime file and answers OPEN and READC requests like the machine,
+holding a READC until there are strokes or the hold-off passes.
+
+Only works on Unix.
+
+Run with: python -m plover.machine.simulator [options] protocol
+
+"""
+
+import argparse
+import os
+import pty
+import random
+import select
+import struct
+import threading
+import tty
+
+from plover.clock import monotonic
+from plover.machine import geminipr, stentura, txbolt
+from plover.steno import STENO_KEY_MASKS
+from plover.transcript import read_log
+
+DEFAULT_WPM = 200
+
+# The seconds a Stentura holds a READC request when there are no strokes.
+STENTURA_HOLD_OFF = 0.5
+
+# Keys in steno order, for random strokes.
+_KEYS = sorted(STENO_KEY_MASKS, key=STENO_KEY_MASKS.get)
+
+
+def random_strokes(count, seed=0, chords=3000):
+    """Yield random strokes as tuples of steno keys.
+
+    Arguments:
+
+    count -- The number of strokes.
+
+    seed -- The seed of the random number generator.
+
+    chords -- The number of different strokes to draw from, a few thousand
+    like in real writing.
+
+    """
+    rng = random.Random(seed)
+    pool = [tuple(sorted(rng.sample(_KEYS, rng.randint(1, 6)),
+                         key=STENO_KEY_MASKS.get))
+            for i in xrange(chords)]
+    for i in xrange(count):
+        yield rng.choice(pool)
+
+
+def log_strokes(filename):
+    """Yield the strokes in a stroke log or journal as steno keys."""
+    for seconds, keys in read_log(filename):
+        yield keys
+
+
+def gemini_packet(keys):
+    """Return the Gemini PR packet for a stroke."""
+    packet = bytearray(geminipr.BYTES_PER_STROKE)
+    packet[0] = 0x80
+    for key in keys:
+        # Each key goes in its first position of the chart.
+        i = geminipr.STENO_KEY_CHART.index(key)
+        packet[i // 7] |= 0x40 >> (i % 7)
+    return str(packet)
+
+
+def txbolt_bytes(keys):
+    """Return the TX Bolt bytes for a stroke, ending with a zero byte."""
+    sets = [0, 0, 0, 0]
+    for key in keys:
+        i = txbolt.STENO_KEY_CHART.index(key)
+        sets[i // 6] |= 1 << (i % 6)
+    data = bytearray((i << 6) | bits for i, bits in enumerate(sets) if bits)
+    # A zero byte ends the stroke right away, instead of after the timeout.
+    data.append(0)
+    return str(data)
+
+
+def stentura_bytes(keys):
+    """Return the four bytes of a stroke in a Stentura realtime file."""
+    bits = 0
+    for key in keys:
+        bits |= 1 << (23 - stentura._STENO_KEY_CHART.index(key))
+    return struct.pack('>I', 0xc0c0c0c0 | ((bits & 0xfc0000) << 6) |
+                       ((bits & 0x3f000) << 4) | ((bits & 0xfc0) << 2) |
+                       (bits & 0x3f))
+
+
+def corrupt(data, rng):
+    """Return data with one byte dropped, inserted or with a bit flipped."""
+    data = bytearray(data)
+    i = rng.randrange(len(data))
+    damage = rng.randint(0, 2)
+    if damage == 0:
+        del data[i]
+    elif damage == 1:
+        data.insert(i, rng.randint(0, 255))
+    else:
+        data[i] ^= 1 << rng.randint(0, 7)
+    return str(data)
+
+
+class Simulator(object):
+    """A machine on a pty typing a stream of strokes.
+
+    Subclasses implement _type to send a stroke.
+
+    Attributes:
+    port -- The path of the pty for the machine's serial port.
+    sent -- A list of (time, keys) for each stroke typed, with times from
+    plover.clock.monotonic.
+    corrupted -- The number of strokes that were damaged.
+
+    """
+
+    def __init__(self, strokes, wpm=DEFAULT_WPM, jitter=0.0, corruption=0.0,
+                 seed=0, delay=0.0):
+        """Open the pty.
+
+        Arguments:
+
+        strokes -- An iterable of strokes, each a sequence of steno keys.
+
+        wpm -- The typing speed, in words per minute of one stroke each.
+
+        jitter -- How much the time between strokes varies, as a fraction of
+        the average. With 0.2, strokes come between 0.8 and 1.2 times the
+        average apart.
+
+        corruption -- The fraction of strokes to damage.
+
+        seed -- The seed for the jitter and the damage.
+
+        delay -- The seconds to wait after start before typing, while the
+        machine connects.
+
+        """
+        self.strokes = strokes
+        self.interval = 60.0 / wpm
+        self.jitter = jitter
+        self.corruption = corruption
+        self.delay = delay
+        self.sent = []
+        self.corrupted = 0
+        self._rng = random.Random(seed)
+        self._master, self._slave = pty.openpty()
+        # Keep the slave raw even before the machine opens it, so nothing
+        # written is echoed or translated.
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._finished = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name=self.__class__.__name__)
+        self._thread.daemon = True
+
+    def serial_params(self):
+        """Return the keyword arguments for the machine's Stenotype."""
+        return {'port': self.port, 'timeout': 1.0}
+
+    def start(self):
+        """Start typing."""
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Wait until every stroke has been typed. Returns True if it was."""
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def stop(self):
+        """Stop typing and close the pty."""
+        self._finished.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _write(self, data):
+        while data and not self._finished.is_set():
+            data = data[os.write(self._master, data):]
+
+    def _should_damage(self):
+        """Return True for the strokes to damage, at the configured rate."""
+        if self.corruption and self._rng.random() < self.corruption:
+            self.corrupted += 1
+            return True
+        return False
+
+    def _damage(self, data):
+        """Return data, damaged at the configured rate."""
+        if self._should_damage():
+            return corrupt(data, self._rng)
+        return data
+
+    def _run(self):
+        if not self._wait_until(monotonic() + self.delay):
+            return
+        while not self._ready():
+            if not self._wait_until(monotonic() + 0.01):
+                return
+        next_time = monotonic()
+        for keys in self.strokes:
+            if self.jitter:
+                next_time += self.interval * self._rng.uniform(
+                    1 - self.jitter, 1 + self.jitter)
+            else:
+                next_time += self.interval
+            if not self._wait_until(next_time):
+                return
+            self.sent.append((monotonic(), keys))
+            self._type(keys)
+        self._done.set()
+        # Answer requests until stopped.
+        while self._wait_until(monotonic() + 1):
+            pass
+
+    def _wait_until(self, when):
+        """Wait for a time, returning False if stopped first."""
+        while not self._finished.is_set():
+            remaining = when - monotonic()
+            if remaining <= 0:
+                return True
+            self._idle(min(remaining, 0.1))
+        return False
+
+    def _idle(self, timeout):
+        """Wait up to timeout seconds between strokes."""
+        self._finished.wait(timeout)
+
+    def _ready(self):
+        """Return True when the machine is ready for strokes."""
+        return True
+
+
+class GeminiPRSimulator(Simulator):
+    """A Gemini PR machine."""
+
+    def _type(self, keys):
+        self._write(self._damage(gemini_packet(keys)))
+
+
+class TxBoltSimulator(Simulator):
+    """A TX Bolt machine."""
+
+    def _type(self, keys):
+        self._write(self._damage(txbolt_bytes(keys)))
+
+
+class StenturaSimulator(Simulator):
+    """A Stentura machine.
+
+    Typing starts once the machine has read to the end of the realtime file,
+    since the strokes it finds there are skipped. Damaged strokes are typed
+    correctly, but the response carrying them is lost and the machine has to
+    ask again. A request repeating the sequence number of the last one gets
+    the same response again.
+
+    Attributes:
+    requests -- The number of requests received.
+
+    """
+
+    def __init__(self, strokes, hold_off=STENTURA_HOLD_OFF, **kwargs):
+        """Open the pty.
+
+        Takes the same arguments as Simulator, and:
+
+        hold_off -- The longest time to hold a READC without strokes, in
+        seconds.
+
+        """
+        Simulator.__init__(self, strokes, **kwargs)
+        self.hold_off = hold_off
+        self.requests = 0
+        self._input = bytearray()
+        self._file = bytearray()
+        self._read_position = 0
+        self._last_response = (None, None)
+        self._lose_response = False
+        self._read_to_end = False
+        # The sequence number and deadline of a READC being held.
+        self._held = None
+
+    def _ready(self):
+        return self._read_to_end
+
+    def _type(self, keys):
+        self._file.extend(stentura_bytes(keys))
+        if self._should_damage():
+            self._lose_response = True
+        if self._held is not None:
+            self._answer_read(self._held[0])
+
+    def _idle(self, timeout):
+        if self._held is not None:
+            timeout = max(min(timeout, self._held[1] - monotonic()), 0)
+        if select.select([self._master], [], [], timeout)[0]:
+            try:
+                self._input.extend(os.read(self._master, 4096))
+            except OSError:
+                # The machine closed the port.
+                self._finished.wait(timeout)
+            self._handle_requests()
+        if self._held is not None and monotonic() >= self._held[1]:
+            self._answer_read(self._held[0])
+
+    def _handle_requests(self):
+        while len(self._input) >= 18:
+            length = struct.unpack_from('<H', buffer(self._input), 2)[0]
+            if len(self._input) < length:
+                return
+            request = str(self._input[:length])
+            del self._input[:length]
+            self.requests += 1
+            (soh, seq, length, action,
+             p1, p2, p3, p4, p5) = struct.unpack_from('<2B7H', request)
+            if seq == self._last_response[0]:
+                self._write(self._last_response[1])
+            elif action == stentura._OPEN:
+                self._held = None
+                self._read_position = 0
+                self._respond(seq, action)
+            elif action == stentura._READC:
+                if self._read_position < len(self._file):
+                    self._answer_read(seq, p3)
+                else:
+                    self._held = (seq, monotonic() + self.hold_off)
+            else:
+                self._respond(seq, action)
+
+    def _answer_read(self, seq, length=512):
+        self._held = None
+        start = self._read_position
+        data = str(self._file[start:start + length])
+        self._read_position += len(data)
+        if not data:
+            self._read_to_end = True
+        self._respond(seq, stentura._READC, p1=len(data), data=data)
+
+    def _respond(self, seq, action, p1=0, data=''):
+        length = 14
+        if data:
+            length += len(data) + 2
+        response = struct.pack('<2B5H', 1, seq, length, action, 0, p1, 0)
+        response += struct.pack('<H', stentura._crc(buffer(response, 1, 11)))
+        if data:
+            response += data + struct.pack('<H', stentura._crc(data))
+        self._last_response = (seq, response)
+        if self._lose_response:
+            self._lose_response = False
+            return
+        self._write(response)
+
+
+SIMULATORS = {
+    'geminipr': GeminiPRSimulator,
+    'txbolt': TxBoltSimulator,
+    'stentura': StenturaSimulator,
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Simulate a stenotype machine on a pty.')
+    parser.add_argument('protocol', choices=sorted(SIMULATORS))
+    parser.add_argument('-l', '--log',
+                        help='stroke log to replay (default: random strokes)')
+    parser.add_argument('-n', '--strokes', type=int, default=1000,
+                        help='number of random strokes')
+    parser.add_argument('-w', '--wpm', type=float, default=DEFAULT_WPM,
+                        help='words per minute, one stroke each')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='variation of the time between strokes, as a '
+                             'fraction of the average')
+    parser.add_argument('--corruption', type=float, default=0.0,
+                        help='fraction of strokes to damage')
+    parser.add_argument('--delay', type=float, default=5.0,
+                        help='seconds to wait before typing, to connect')
+    options = parser.parse_args(args)
+
+    if options.log:
+        strokes = log_strokes(options.log)
+    else:
+        strokes = random_strokes(options.strokes)
+    simulator = SIMULATORS[options.protocol](
+        strokes, wpm=options.wpm, jitter=options.jitter,
+        corruption=options.corruption, delay=options.delay)
+    print 'Serial port: %s' % simulator.port
+    try:
+        simulator.start()
+        while not simulator.wait(1):
+            pass
+        print '%d strokes typed, %d damaged' % (len(simulator.sent),
+                                                simulator.corrupted)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+if __name__ == '__main__':
+    main()
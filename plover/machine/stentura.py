@@ -147,11 +147,12 @@ Unknown.
 """
 
 import array
-import itertools
+import select
 import struct
-import time
 
 import plover.machine.base
+from plover.clock import monotonic
+from plover.lru_cache import LRUCache
 
 
 class _ProtocolViolationException(Exception):
@@ -226,20 +227,25 @@ def _crc(data):
     Check  : BB3D
 
     Args:
-    - data: The data to checksum. The data should be an iterable that returns
-            bytes
+    - data: The data to checksum. The data should be a string, buffer or array
+            of bytes, or an iterable of byte values.
 
     Returns: The computed crc for the data.
 
     """
+    if isinstance(data, (str, buffer, array.array)):
+        data = bytearray(data)
+    table = _CRC_TABLE
     checksum = 0
     for b in data:
-        if isinstance(b, str):
-            b = ord(b)
-        checksum = (_CRC_TABLE[(checksum ^ b) & 0xff] ^
-                    ((checksum >> 8) & 0xff))
+        checksum = table[(checksum ^ b) & 0xff] ^ (checksum >> 8)
     return checksum
 
+# The checksums of recently made request headers. The headers of the READC
+# requests made while waiting for strokes only differ in their sequence
+# number, so this holds all of them.
+_header_crc = LRUCache(_crc, 1024)
+
 
 def _write_to_buffer(buf, offset, data):
     """Write data to buf at offset.
@@ -249,14 +255,16 @@ def _write_to_buffer(buf, offset, data):
     Args:
     - buf: The buffer. Should be of type array('B')
     - offset. The offset at which to start writing.
-    - data: An iterable containing the data to write.
+    - data: A string, buffer or sequence of byte values to write.
     """
-    if len(buf) < offset + len(data):
-        buf.extend([0] * (offset + len(data) - len(buf)))
-    for i, v in enumerate(data, offset):
-        if isinstance(v, str):
-            v = ord(v)
-        buf[i] = v
+    if isinstance(data, buffer):
+        data = str(data)
+    if not isinstance(data, array.array):
+        data = array.array('B', data)
+    end = offset + len(data)
+    if len(buf) < end:
+        buf.extend([0] * (end - len(buf)))
+    buf[offset:end] = data
 
 # Helper table for parsing strokes of the form:
 # 11^#STKP 11WHRAO* 11EUFRPB 11LGTSDZ
@@ -266,6 +274,32 @@ _STENO_KEY_CHART = ('^', '#', 'S-', 'T-', 'K-', 'P-',    # Byte #1
                     '-L', '-G', '-T', '-S', '-D', '-Z')  # Byte #4
 
 
+# The keys of each byte value, for each byte of a stroke.
+_BYTE_KEYS = tuple(tuple(tuple(_STENO_KEY_CHART[i * 6 + j] for j in xrange(6)
+                               if b & (0x20 >> j))
+                         for b in xrange(256))
+                   for i in xrange(4))
+
+# Key tuples by the four bytes of a stroke as a big endian integer. Only a few
+# thousand different strokes are used in practice, the limit guards against
+# garbage input.
+_STROKE_KEYS = {}
+_STROKE_CACHE_LIMIT = 65536
+
+
+def _stroke_keys(word):
+    """Return the tuple of keys for a stroke read as a big endian integer."""
+    keys = _STROKE_KEYS.get(word)
+    if keys is None:
+        keys = (_BYTE_KEYS[0][word >> 24] +
+                _BYTE_KEYS[1][(word >> 16) & 0xff] +
+                _BYTE_KEYS[2][(word >> 8) & 0xff] +
+                _BYTE_KEYS[3][word & 0xff])
+        if len(_STROKE_KEYS) < _STROKE_CACHE_LIMIT:
+            _STROKE_KEYS[word] = keys
+    return keys
+
+
 def _parse_stroke(a, b, c, d):
     """Parse a stroke and return a list of keys pressed.
 
@@ -279,10 +313,7 @@ def _parse_stroke(a, b, c, d):
              e.g. ['S-', 'A-', '-T']
 
     """
-    fullstroke = (((a & 0x3f) << 18) | ((b & 0x3f) << 12) |
-                  ((c & 0x3f) << 6) | d & 0x3f)
-    return [_STENO_KEY_CHART[i] for i in xrange(24)
-            if (fullstroke & (1 << (23 - i)))]
+    return list(_stroke_keys((a << 24) | (b << 16) | (c << 8) | d))
 
 
 def _parse_strokes(data):
@@ -297,15 +328,15 @@ def _parse_strokes(data):
     - _ProtocolViolationException if the data doesn't follow the protocol.
 
     """
-    strokes = []
     if (len(data) % 4 != 0):
         raise _ProtocolViolationException(
             "Data size is not divisible by 4: %d" % (len(data)))
-    for b in data:
-        if (ord(b) & 0b11000000) != 0b11000000:
-            raise _ProtocolViolationException("Data is not stroke: 0x%X" % (b))
-    for a, b, c, d in itertools.izip(*([iter(data)] * 4)):
-        strokes.append(_parse_stroke(ord(a), ord(b), ord(c), ord(d)))
+    strokes = []
+    for word in struct.unpack('>%dI' % (len(data) // 4), data):
+        if word & 0xc0c0c0c0 != 0xc0c0c0c0:
+            raise _ProtocolViolationException(
+                "Data is not stroke: 0x%08X" % (word))
+        strokes.append(list(_stroke_keys(word)))
     return strokes
 
 # Actions
@@ -346,7 +377,7 @@ def _make_request(buf, action, seq, p1=0, p2=0, p3=0, p4=0, p5=0, data=None):
         buf.extend([0] * (length - len(buf)))
     _REQUEST_STRUCT.pack_into(buf, 0, 1, seq, length, action,
                               p1, p2, p3, p4, p5)
-    crc = _crc(buffer(buf, 1, 15))
+    crc = _header_crc(buffer(buf, 1, 15)[:])
     _SHORT_STRUCT.pack_into(buf, 16, crc)
     if data:
         _write_to_buffer(buf, 18, data)
@@ -426,6 +457,54 @@ def _validate_response(packet):
     return True
 
 
+class Counters(object):
+    """Counts of the requests made to the machine and their round trips.
+
+    Attributes:
+    requests -- Requests sent, including retries.
+    retries -- Requests sent again after no or the wrong response.
+    timeouts -- Responses that didn't arrive in time.
+    round_trips -- Responses received to requests.
+    total_round_trip, max_round_trip -- Seconds from sending requests to
+    receiving their responses.
+    reads -- READC responses received.
+    empty_reads -- READC responses without data.
+    read_delay -- The current delay in seconds before sending a READC, see
+    _loop.
+
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.round_trips = 0
+        self.total_round_trip = 0.0
+        self.max_round_trip = 0.0
+        self.reads = 0
+        self.empty_reads = 0
+        self.read_delay = 0.0
+
+    def add_round_trip(self, seconds):
+        self.round_trips += 1
+        self.total_round_trip += seconds
+        if seconds > self.max_round_trip:
+            self.max_round_trip = seconds
+
+    def stats(self):
+        """Return the counters as a dictionary, with the mean round trip."""
+        stats = dict(self.__dict__)
+        stats['mean_round_trip'] = (self.total_round_trip / self.round_trips
+                                    if self.round_trips else 0.0)
+        return stats
+
+
+# The longest time to wait for data between checks of the stop event, in
+# seconds. Ports that can't be waited on are polled this often.
+_STOP_CHECK_INTERVAL = 0.1
+_POLL_INTERVAL = 0.001
+
+
 # Timeout is in seconds, can be a float.
 def _read_data(port, stop, buf, offset, timeout):
     """Read data off the serial port and into port at offset.
@@ -444,14 +523,28 @@ def _read_data(port, stop, buf, offset, timeout):
     _TimeoutException: If the timeout is reached with no data read.
 
     """
-    start_time = time.clock()
-    end_time = start_time + timeout
-    while not stop.is_set() and time.clock() < end_time:
-        num_bytes = port.inWaiting()
-        if num_bytes > 0:
-            bytes = port.read(num_bytes)
-            _write_to_buffer(buf, offset, bytes)
-            return num_bytes
+    end_time = monotonic() + timeout
+    can_wait = plover.machine.base.can_select(port)
+    while not stop.is_set():
+        try:
+            num_bytes = port.inWaiting()
+            if num_bytes > 0:
+                bytes = port.read(num_bytes)
+                _write_to_buffer(buf, offset, bytes)
+                return num_bytes
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                break
+            if can_wait:
+                select.select([port], [], [], min(remaining,
+                                                  _STOP_CHECK_INTERVAL))
+            else:
+                stop.wait(min(remaining, _POLL_INTERVAL))
+        except Exception:
+            # Reading fails once the port is closed to stop.
+            if stop.is_set():
+                break
+            raise
     if stop.is_set():
         raise _StopException()
     else:
@@ -478,16 +571,15 @@ def _read_packet(port, stop, buf, timeout):
     _StopException: If a stop was requested.
 
     """
-    start_time = time.clock()
-    end_time = start_time + timeout
+    end_time = monotonic() + timeout
     bytes_read = 0
     while bytes_read < 4:
         bytes_read += _read_data(port, stop, buf, bytes_read,
-                                 end_time - time.clock())
+                                 end_time - monotonic())
     packet_length = _SHORT_STRUCT.unpack_from(buf, 2)[0]
     while bytes_read < packet_length:
         bytes_read += _read_data(port, stop, buf, bytes_read,
-                                 end_time - time.clock())
+                                 end_time - monotonic())
     packet = buffer(buf, 0, bytes_read)
     if not _validate_response(packet):
         raise _ProtocolViolationException()
@@ -506,7 +598,8 @@ def _write_to_port(port, data):
         data = buffer(data, port.write(data))
 
 
-def _send_receive(port, stop, packet, buf, max_tries=3, timeout=1):
+def _send_receive(port, stop, packet, buf, max_tries=3, timeout=1,
+                  counters=None):
     """Send a packet and return the response.
 
     Send a packet and make sure there is a response and it is for the correct
@@ -522,6 +615,7 @@ def _send_receive(port, stop, packet, buf, max_tries=3, timeout=1):
     reading the response before giving up (default: 3).
     - timeout: The timeout to give on each retry. Should be one second when
     dealing with a real machine. (default: 1)
+    - counters: A Counters instance to update, if any (default: None).
 
     Returns: A buffer as a slice of buf holding the response packet.
 
@@ -531,8 +625,14 @@ def _send_receive(port, stop, packet, buf, max_tries=3, timeout=1):
     _ProtocolViolationException: If the responses packet violates the protocol.
 
     """
+    if counters is None:
+        counters = Counters()
     request_action = _SHORT_STRUCT.unpack(buffer(packet, 4, 2))[0]
     for attempt in xrange(max_tries):
+        if attempt:
+            counters.retries += 1
+        counters.requests += 1
+        start_time = monotonic()
         _write_to_port(port, packet)
         try:
             response = _read_packet(port, stop, buf, timeout)
@@ -541,8 +641,10 @@ def _send_receive(port, stop, packet, buf, max_tries=3, timeout=1):
             response_action = _SHORT_STRUCT.unpack(buffer(response, 4, 2))[0]
             if request_action != response_action:
                 raise _ProtocolViolationException()
+            counters.add_round_trip(monotonic() - start_time)
             return response
         except _TimeoutException:
+            counters.timeouts += 1
             continue
     raise _ConnectionLostException()
 
@@ -559,7 +661,8 @@ class _SequenceCounter(object):
         return cur
 
 
-def _read(port, stop, seq, request_buf, response_buf, stroke_buf, timeout=1):
+def _read(port, stop, seq, request_buf, response_buf, stroke_buf, timeout=1,
+          counters=None):
     """Read the full contents of the current file from beginning to end.
 
     The file should be opened first.
@@ -573,6 +676,7 @@ def _read(port, stop, seq, request_buf, response_buf, stroke_buf, timeout=1):
     - stroke_buf: Buffer to use for strokes read from the file.
     - timeout: Timeout to use when waiting for a response in seconds. Should be
     1 when talking to a real machine. (default: 1)
+    - counters: A Counters instance to update, if any (default: None).
 
     Raises:
     _ProtocolViolationException: If the protocol is violated.
@@ -582,25 +686,69 @@ def _read(port, stop, seq, request_buf, response_buf, stroke_buf, timeout=1):
     """
     bytes_read, block, byte = 0, 0, 0
     while True:
-        packet = _make_read(request_buf, seq(), block, byte, length=512)
-        response = _send_receive(port, stop, packet, response_buf,
-                   timeout=timeout)
-        p1 = _SHORT_STRUCT.unpack(buffer(response, 8, 2))[0]
-        if not ((p1 == 0 and len(response) == 14) or  # No data.
-                (p1 == len(response) - 16)):          # Data.
-            raise _ProtocolViolationException()
-        if p1 == 0:
+        data = _read_block(port, stop, seq, request_buf, response_buf, block,
+                           byte, timeout, counters)
+        if not data:
             return buffer(stroke_buf, 0, bytes_read)
-        data = buffer(response, 14, p1)
         _write_to_buffer(stroke_buf, bytes_read, data)
         bytes_read += len(data)
-        byte += p1
+        byte += len(data)
         if byte >= 512:
             block += 1
             byte -= 512
 
 
-def _loop(port, stop, callback, timeout=1):
+def _read_block(port, stop, seq, request_buf, response_buf, block, byte,
+                timeout=1, counters=None):
+    """Read up to 512 bytes of the current file with one READC request.
+
+    Args:
+    - port: The port to use.
+    - stop: The event used to request stopping.
+    - seq: A _SequenceCounter instance to use to track packets.
+    - request_buf: Buffer to use for request packet.
+    - response_buf: Buffer to use for response packet.
+    - block: The index of the file block to read.
+    - byte: The byte offset within the block at which to start reading.
+    - timeout: Timeout to use when waiting for a response in seconds. Should be
+    1 when talking to a real machine. (default: 1)
+    - counters: A Counters instance to update, if any (default: None).
+
+    Returns: A buffer as a slice of response_buf holding the data read, empty
+    at the end of the file.
+
+    Raises:
+    _ProtocolViolationException: If the protocol is violated.
+    _StopException: If a stop is requested.
+    _ConnectionLostException: If we can't seem to talk to the machine.
+
+    """
+    if counters is None:
+        counters = Counters()
+    packet = _make_read(request_buf, seq(), block, byte, length=512)
+    response = _send_receive(port, stop, packet, response_buf,
+                             timeout=timeout, counters=counters)
+    counters.reads += 1
+    p1 = _SHORT_STRUCT.unpack(buffer(response, 8, 2))[0]
+    if not ((p1 == 0 and len(response) == 14) or  # No data.
+            (p1 == len(response) - 16)):          # Data.
+        raise _ProtocolViolationException()
+    if p1 == 0:
+        counters.empty_reads += 1
+    return buffer(response, 14, p1)
+
+
+# READC pacing, in fractions of the response timeout, which is one second for
+# a real machine. A machine may hold a READC for up to 500ms until there are
+# new strokes. One that answers without strokes sooner than _HELD_READ doesn't
+# hold requests, so the next READC is delayed instead, doubling the delay from
+# _MIN_READ_DELAY up to _MAX_READ_DELAY while no strokes come in.
+_HELD_READ = 0.25
+_MIN_READ_DELAY = 0.005
+_MAX_READ_DELAY = 0.05
+
+
+def _loop(port, stop, callback, timeout=1, counters=None):
     """Enter into a loop talking to the machine and returning strokes.
 
     Args:
@@ -610,6 +758,7 @@ def _loop(port, stop, callback, timeout=1):
     stroke.
     - timeout: Timeout to use when waiting for a response in seconds. Should be
     1 when talking to a real machine. (default: 1)
+    - counters: A Counters instance to update, if any (default: None).
 
     Raises:
     _ProtocolViolationException: If the protocol is violated.
@@ -617,6 +766,8 @@ def _loop(port, stop, callback, timeout=1):
     _ConnectionLostException: If we can't seem to talk to the machine.
 
     """
+    if counters is None:
+        counters = Counters()
     # We want to give the machine a standard timeout to finish whatever it's
     # doing but we also want to stop if asked to so this is the safe way to
     # wait.
@@ -629,15 +780,30 @@ def _loop(port, stop, callback, timeout=1):
     seq = _SequenceCounter()
     request = _make_open(request_buf, seq(), 'A', 'REALTIME.000')
     # Any checking needed on the response packet?
-    _send_receive(port, stop, request, response_buf)
+    _send_receive(port, stop, request, response_buf, counters=counters)
     # Do a full read to get to the current position in the realtime file.
-    _read(port, stop, seq, request_buf, response_buf, stroke_buf)
+    _read(port, stop, seq, request_buf, response_buf, stroke_buf,
+          counters=counters)
     print "Ready."  # TODO: Communicate readiness back to engine.
     while True:
-        data = _read(port, stop, seq, request_buf, response_buf, stroke_buf)
-        strokes = _parse_strokes(data)
-        for stroke in strokes:
-            callback(stroke)
+        # The machine answers a held READC as soon as there is a stroke, so
+        # pass on the strokes of each response instead of reading to the end
+        # of the file, which would wait for a pause in writing.
+        start_time = monotonic()
+        data = _read_block(port, stop, seq, request_buf, response_buf, 0, 0,
+                           timeout, counters)
+        if data:
+            counters.read_delay = 0.0
+            for stroke in _parse_strokes(data):
+                callback(stroke)
+        elif monotonic() - start_time < _HELD_READ * timeout:
+            counters.read_delay = min(max(counters.read_delay * 2,
+                                          _MIN_READ_DELAY * timeout),
+                                      _MAX_READ_DELAY * timeout)
+        else:
+            counters.read_delay = 0.0
+        if counters.read_delay and stop.wait(counters.read_delay):
+            raise _StopException()
 
 
 class Stenotype(plover.machine.base.SerialStenotypeBase):
@@ -646,15 +812,21 @@ class Stenotype(plover.machine.base.SerialStenotypeBase):
     This class implements the three methods necessary for a standard
     stenotype interface: start_capture, stop_capture, and
     add_callback.
+
+    Attributes:
+    counters -- The Counters of the requests made to the machine.
+
     """
 
     def __init__(self, **kwargs):
         plover.machine.base.SerialStenotypeBase.__init__(self, **kwargs)
+        self.counters = Counters()
 
     def run(self):
         """Overrides base class run method. Do not call directly."""
         try:
-            _loop(self.serial_port, self.finished, self._notify)
+            _loop(self.serial_port, self.finished, self._notify,
+                  counters=self.counters)
         except _StopException:
             pass  # Close serial port
         except _ConnectionLostException, _ProtocolViolationException:
@@ -0,0 +1,129 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for geminipr.py."""
+
+import threading
+import unittest
+
+import geminipr
+from plover.steno import StenoKeys
+
+
+def make_packet(keys):
+    """Return the packet for a set of keys of the key chart."""
+    packet = bytearray(geminipr.BYTES_PER_STROKE)
+    packet[0] = 0x80
+    for i, key in enumerate(geminipr.STENO_KEY_CHART):
+        if key in keys:
+            packet[i // 7] |= 0x40 >> (i % 7)
+    return packet
+
+
+def reference_decode(packet):
+    """Decode a packet with the original bit loop."""
+    steno_keys = []
+    for i, b in enumerate(packet):
+        for j in range(1, 8):
+            if (b & (0x80 >> j)):
+                steno_keys.append(geminipr.STENO_KEY_CHART[i * 7 + j - 1])
+    return steno_keys
+
+
+class FakeSerial(object):
+    """A serial port that returns chunks of data and then stops the machine."""
+
+    def __init__(self, chunks, finished):
+        self.chunks = list(chunks)
+        self.finished = finished
+
+    def isOpen(self):
+        return True
+
+    def inWaiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size):
+        if not self.chunks:
+            self.finished.set()
+            return ''
+        chunk = self.chunks.pop(0)
+        assert len(chunk) <= size
+        return str(chunk)
+
+    def close(self):
+        pass
+
+
+class GeminiPRTestCase(unittest.TestCase):
+
+    def test_tables_match_bit_loop(self):
+        for i in xrange(geminipr.BYTES_PER_STROKE):
+            for b in xrange(128):
+                packet = bytearray(geminipr.BYTES_PER_STROKE)
+                packet[0] = 0x80
+                packet[i] |= b
+                masks, skipped, end = geminipr.decode(packet)
+                self.assertEqual((len(masks), skipped, end), (1, 0, 6))
+                self.assertEqual(set(geminipr.mask_to_keys(masks[0])),
+                                 set(reference_decode(packet)))
+
+    def test_mask_to_keys(self):
+        masks, skipped, end = geminipr.decode(
+            make_packet(['S-', 'T-', '*', '-T']))
+        keys = geminipr.mask_to_keys(masks[0])
+        self.assertIsInstance(keys, StenoKeys)
+        self.assertEqual(keys, ('S-', 'T-', '*', '-T'))
+        self.assertIs(geminipr.mask_to_keys(masks[0]), keys)
+        masks, skipped, end = geminipr.decode(make_packet(['Fn', 'H-', 'pwr']))
+        keys = geminipr.mask_to_keys(masks[0])
+        self.assertEqual(keys, ('H-', 'Fn', 'pwr'))
+        self.assertIs(geminipr.mask_to_keys(masks[0]), keys)
+
+    def test_decode_resynchronizes(self):
+        a = make_packet(['S-'])
+        b = make_packet(['-Z'])
+        c = make_packet(['A-', 'O-'])
+        masks, skipped, end = geminipr.decode(a + b + c)
+        expected = [geminipr.decode(p)[0][0] for p in (a, b, c)]
+        self.assertEqual((masks, skipped, end), (expected, 0, 18))
+        # Garbage before a packet.
+        data = bytearray('\x01\x02') + a
+        self.assertEqual(geminipr.decode(data), (expected[:1], 2, 8))
+        # A packet missing a byte is dropped up to the next one.
+        data = a[:4] + b + c
+        self.assertEqual(geminipr.decode(data), (expected[1:], 4, 16))
+        # A packet with a corrupted byte is dropped too.
+        data = a[:3] + bytearray('\x81') + a[4:] + c
+        self.assertEqual(geminipr.decode(data), (expected[2:], 6, 12))
+        # A partial packet at the end is kept for later.
+        data = a + c[:3]
+        self.assertEqual(geminipr.decode(data), (expected[:1], 0, 6))
+        # Unless another packet starts before its end.
+        data = a + c[:3] + b[:1]
+        self.assertEqual(geminipr.decode(data), (expected[:1], 3, 9))
+        self.assertEqual(geminipr.decode(bytearray()), ([], 0, 0))
+
+    def test_run(self):
+        packets = [make_packet(['S-']), make_packet(['T-', '-E']),
+                   make_packet(['#', '-Z']), make_packet(['K-'])]
+        data = bytearray('\x00').join(packets[:2]) + packets[2] + packets[3]
+        # Split packets across reads.
+        chunks = [data[:4], data[4:9], data[9:20], data[20:]]
+        finished = threading.Event()
+
+        class Machine(geminipr.Stenotype):
+            CONFIG_CLASS = lambda self: FakeSerial(chunks, finished)
+
+        machine = Machine()
+        machine.finished = finished
+        strokes = []
+        machine.add_callback(strokes.append)
+        machine.run()
+        self.assertEqual(strokes, [('S-',), ('T-', '-E'), ('#', '-Z'),
+                                   ('K-',)])
+        self.assertEqual((machine.packets, machine.bytes_skipped), (4, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
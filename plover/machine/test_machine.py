@@ -0,0 +1,38 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for the machine registry in __init__.py."""
+
+import os
+import subprocess
+import sys
+import unittest
+
+import plover.machine
+from plover.machine.base import SerialStenotypeBase
+
+
+class MachineRegistryTestCase(unittest.TestCase):
+
+    def test_registry_matches_drivers(self):
+        for name, info in plover.machine.MACHINES.items():
+            module = plover.machine.import_machine(name)
+            self.assertEqual(module.__name__, info.module)
+            self.assertEqual(plover.machine.uses_serial_port(name),
+                             issubclass(module.Stenotype, SerialStenotypeBase))
+        self.assertIsNone(plover.machine.import_machine('Typewriter'))
+        self.assertFalse(plover.machine.uses_serial_port('Typewriter'))
+
+    def test_config_imports_no_drivers(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        code = ('import sys, plover.config, plover.machine; '
+                'print sorted(m for m in sys.modules if sys.modules[m] and '
+                '(m.startswith("plover.machine.") or m == "serial"))')
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        self.assertEqual(output.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for simulator.py."""
+
+import Queue
+import unittest
+
+import geminipr
+import simulator
+import stentura
+import txbolt
+from plover.clock import monotonic
+
+# The longest a test waits for its strokes, in seconds. A test only takes
+# this long when strokes are missing.
+DEADLINE = 30
+
+
+class SimulatorTestCase(unittest.TestCase):
+
+    def run_machine(self, simulator_class, machine_module, strokes,
+                    done=None, **kwargs):
+        """Type strokes on a simulator and return what the machine read.
+
+        Strokes are read until done(keys) returns True, by default once as
+        many strokes as were typed are read, or until the deadline.
+
+        """
+        if done is None:
+            done = lambda keys: len(keys) >= len(strokes)
+        sim = simulator_class(strokes, **kwargs)
+        self.addCleanup(sim.stop)
+        machine = machine_module.Stenotype(**sim.serial_params())
+        received = Queue.Queue()
+        machine.add_callback(received.put)
+        machine.start_capture()
+        sim.start()
+        deadline = monotonic() + DEADLINE
+        keys = []
+        while not done(keys):
+            try:
+                keys.append(tuple(received.get(
+                    timeout=max(deadline - monotonic(), 0))))
+            except Queue.Empty:
+                break
+        self.assertTrue(sim.wait(max(deadline - monotonic(), 0)))
+        machine.stop_capture()
+        machine.join(5)
+        return sim, keys
+
+    def test_encodings(self):
+        keys = ('#', 'S-', 'K-', 'A-', '*', '-E', '-R', '-Z')
+        masks, skipped, end = geminipr.decode(
+            bytearray(simulator.gemini_packet(keys)))
+        self.assertEqual(geminipr.mask_to_keys(masks[0]), keys)
+        self.assertEqual(simulator.txbolt_bytes(('S-', '-D', '#')),
+                         '\x01\xd4\x00')
+        self.assertEqual(stentura._parse_strokes(
+                             simulator.stentura_bytes(keys)),
+                         [list(keys)])
+
+    def test_geminipr(self):
+        strokes = list(simulator.random_strokes(50, seed=1))
+        sim, keys = self.run_machine(simulator.GeminiPRSimulator, geminipr,
+                                     strokes, wpm=2000, jitter=0.5)
+        self.assertEqual(keys, strokes)
+
+    def test_geminipr_corruption(self):
+        strokes = list(simulator.random_strokes(100, seed=2))
+        # Damaged strokes may be lost or read as others, so read until the
+        # last stroke, which this seed leaves alone.
+        sim, keys = self.run_machine(
+            simulator.GeminiPRSimulator, geminipr, strokes,
+            done=lambda keys: keys[-1:] == strokes[-1:], wpm=2000,
+            corruption=0.2)
+        self.assertEqual(keys[-1], strokes[-1])
+        self.assertGreater(sim.corrupted, 0)
+        self.assertLess(len(keys), len(strokes))
+        # Most strokes get through.
+        self.assertGreater(len(set(keys) & set(strokes)), len(strokes) / 2)
+
+    def test_txbolt(self):
+        strokes = list(simulator.random_strokes(50, seed=3))
+        sim, keys = self.run_machine(simulator.TxBoltSimulator, txbolt,
+                                     strokes, wpm=2000)
+        self.assertEqual(keys, strokes)
+
+    def test_stentura(self):
+        strokes = list(simulator.random_strokes(30, seed=4))
+        sim, keys = self.run_machine(simulator.StenturaSimulator, stentura,
+                                     strokes, wpm=1200, hold_off=0.05)
+        self.assertEqual(keys, strokes)
+        self.assertGreater(sim.requests, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
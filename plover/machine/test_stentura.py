@@ -4,6 +4,7 @@
 """Unit tests for stentura.py."""
 
 import array
+import io
 import struct
 import threading
 import unittest
@@ -252,6 +253,27 @@ class TestCase(unittest.TestCase):
         self.assertEqual(count, 4)
         self.assertSequenceEqual([chr(b) for b in buf], "1234")
 
+    def test_read_data_unselectable_port(self):
+        # Like pyserial's ports on Windows, fileno raises.
+        class MockPort(io.RawIOBase):
+            def __init__(self):
+                io.RawIOBase.__init__(self)
+                self.polls = 0
+
+            def inWaiting(self):
+                self.polls += 1
+                return 2 if self.polls == 3 else 0
+
+            def read(self, count):
+                return "12"
+
+        port = MockPort()
+        buf = array.array('B')
+        count = stentura._read_data(port, threading.Event(), buf, 0, 1)
+        self.assertEqual(count, 2)
+        self.assertEqual(port.polls, 3)
+        self.assertSequenceEqual([chr(b) for b in buf], "12")
+
     def test_read_data_stop_immediately(self):
         class MockPort(object):
             def inWaiting(self):
@@ -480,6 +502,29 @@ class TestCase(unittest.TestCase):
         with self.assertRaises(stentura._StopException):
             stentura._send_receive(port, event, request, buf)
 
+    def test_send_receive_counters(self):
+        event = threading.Event()
+        buf, seq, action = array.array('B'), 5, stentura._OPEN
+        request = stentura._make_request(array.array('B'), stentura._OPEN, seq)
+        correct_response = make_response(seq, action)
+        wrong_seq = make_response(seq - 1, action)
+
+        counters = stentura.Counters()
+        port = MockPacketPort(['', wrong_seq, correct_response])
+        stentura._send_receive(port, event, request, buf, timeout=0.001,
+                               counters=counters)
+        stats = counters.stats()
+        self.assertEqual((stats['requests'], stats['retries'],
+                          stats['timeouts'], stats['round_trips']),
+                         (3, 2, 1, 1))
+        self.assertEqual(stats['mean_round_trip'], stats['max_round_trip'])
+
+    def test_parse_strokes_invalid(self):
+        with self.assertRaises(stentura._ProtocolViolationException):
+            stentura._parse_strokes('\xc1\xc1\xc1')
+        with self.assertRaises(stentura._ProtocolViolationException):
+            stentura._parse_strokes('\xc1\xc1\x41\xc1')
+
     def test_sequence_counter(self):
         seq = stentura._SequenceCounter()
         actual = [seq() for x in xrange(512)]
@@ -0,0 +1,128 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for txbolt.py."""
+
+import io
+import os
+import pty
+import Queue
+import threading
+import time
+import unittest
+
+import txbolt
+
+
+class TxBoltTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # The machine reads from the slave end of a pty like from a serial
+        # port, and the test writes to the master end.
+        self.master, slave = pty.openpty()
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+        self.machine = txbolt.Stenotype(port=os.ttyname(slave), timeout=2.0)
+        self.strokes = Queue.Queue()
+        self.machine.add_callback(self.strokes.put)
+        self.machine.start_capture()
+        self.addCleanup(self.machine.join, 5)
+        self.addCleanup(self.machine.stop_capture)
+
+    def send(self, data):
+        os.write(self.master, data)
+
+    def next_stroke(self):
+        return self.strokes.get(timeout=5)
+
+    def test_set_boundaries(self):
+        # S- T- / -Z # / -E / *
+        self.send('\x03\x00\xd8\x50\x48\x00')
+        self.assertEqual(self.next_stroke(), ('S-', 'T-'))
+        self.assertEqual(self.next_stroke(), ('#', '-Z'))
+        self.assertEqual(self.next_stroke(), ('-E',))
+        self.assertEqual(self.next_stroke(), ('*',))
+        self.assertTrue(self.strokes.empty())
+
+    def test_stroke_timeout(self):
+        self.send('\x01\x42')
+        start = time.time()
+        self.assertEqual(self.next_stroke(), ('S-', 'A-'))
+        self.assertGreaterEqual(time.time() - start,
+                                txbolt.STROKE_TIMEOUT * 0.9)
+        # A stroke split across reads.
+        self.send('\x02')
+        time.sleep(txbolt.STROKE_TIMEOUT / 4)
+        self.send('\x81')
+        self.assertEqual(self.next_stroke(), ('T-', '-F'))
+
+    def test_idle_reader_blocks(self):
+        before = os.times()
+        time.sleep(0.3)
+        after = os.times()
+        # A busy poll would use the whole time.
+        self.assertLess(after[0] + after[1] - before[0] - before[1], 0.1)
+        self.assertTrue(self.strokes.empty())
+
+
+class UnselectablePort(io.RawIOBase):
+    """A serial port that can't be selected, like pyserial's on Windows.
+
+    Its fileno raises io.UnsupportedOperation and read blocks for up to the
+    port timeout.
+
+    """
+
+    def __init__(self):
+        io.RawIOBase.__init__(self)
+        self.timeout = None
+        self.timeouts = set()
+        self.data = Queue.Queue()
+        self.pending = ''
+
+    def isOpen(self):
+        return True
+
+    def inWaiting(self):
+        while not self.data.empty():
+            self.pending += self.data.get()
+        return len(self.pending)
+
+    def read(self, size=1):
+        self.timeouts.add(self.timeout)
+        if not self.inWaiting():
+            try:
+                self.pending = self.data.get(timeout=self.timeout)
+            except Queue.Empty:
+                return ''
+        raw, self.pending = self.pending[:size], self.pending[size:]
+        return raw
+
+
+class UnselectablePortTestCase(unittest.TestCase):
+
+    def test_blocking_read(self):
+        port = UnselectablePort()
+        class Machine(txbolt.Stenotype):
+            CONFIG_CLASS = lambda self: port
+        machine = Machine()
+        strokes = Queue.Queue()
+        machine.add_callback(strokes.put)
+        # Stop without closing the fake port.
+        machine.finished.clear()
+        reader = threading.Thread(target=machine.run)
+        reader.start()
+        try:
+            port.data.put('\x03\x00\xd8')
+            self.assertEqual(strokes.get(timeout=5), ('S-', 'T-'))
+            # The last stroke ends when no more data comes.
+            self.assertEqual(strokes.get(timeout=5), ('#', '-Z'))
+        finally:
+            machine.finished.set()
+            reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertIn(txbolt.IDLE_TIMEOUT, port.timeouts)
+
+
+if __name__ == '__main__':
+    unittest.main()
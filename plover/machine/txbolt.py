@@ -3,8 +3,11 @@
 
 "Thread-based monitoring of a stenotype machine using the TX Bolt protocol."
 
+import select
+
 import plover.machine.base
-import time
+from plover.clock import monotonic
+from plover.steno import STENO_KEY_MASKS, StenoKeys
 
 # In the TX Bolt protocol, there are four sets of keys grouped in
 # order from left to right. Each byte represents all the keys that
@@ -31,6 +34,21 @@ STENO_KEY_CHART = ("S-", "T-", "K-", "P-", "W-", "H-",  # 00
                    "-T", "-S", "-D", "-Z", "#")         # 11
 
 
+# The key mask of the keys in each byte value. The set bits of the fourth set
+# are 110XXXXX so its sixth bit isn't a key.
+_BYTE_MASKS = tuple(sum(STENO_KEY_MASKS[STENO_KEY_CHART[(b >> 6) * 6 + i]]
+                        for i in xrange(6)
+                        if b & (1 << i) and (b >> 6) * 6 + i < 23)
+                    for b in xrange(256))
+
+# Seconds without data after which a stroke is finished.
+STROKE_TIMEOUT = 0.1
+
+# Seconds to wait for data between checks for stop_capture when no stroke is
+# in progress.
+IDLE_TIMEOUT = 0.5
+
+
 class Stenotype(plover.machine.base.SerialStenotypeBase):
     """TX Bolt interface.
 
@@ -45,40 +63,62 @@ class Stenotype(plover.machine.base.SerialStenotypeBase):
         self._reset_stroke_state()
 
     def _reset_stroke_state(self):
-        self._pressed_keys = []
+        self._pressed_mask = 0
         self._last_key_set = 0
 
     def _finish_stroke(self):
-        self._notify(self._pressed_keys)
+        self._notify(StenoKeys.from_mask(self._pressed_mask))
         self._reset_stroke_state()
 
+    def _read(self, timeout):
+        """Return the data waiting on the serial port.
+
+        Blocks for up to timeout seconds when there is none, returning an
+        empty string if nothing arrives.
+
+        """
+        port = self.serial_port
+        if self._can_select:
+            if not select.select([port], [], [], timeout)[0]:
+                return ''
+            return port.read(port.inWaiting() or 1)
+        # Ports that can't be selected, like on Windows, block in read.
+        if port.timeout != timeout:
+            port.timeout = timeout
+        raw = port.read(1)
+        if raw:
+            raw += port.read(port.inWaiting())
+        return raw
+
     def run(self):
         """Overrides base class run method. Do not call directly."""
-        last_read_time_s = 0
-        timeout_s = 0.1
+        last_read_time = 0
+        self._can_select = plover.machine.base.can_select(self.serial_port)
         while not self.finished.isSet():
+            if self._pressed_mask:
+                timeout = max(STROKE_TIMEOUT - (monotonic() - last_read_time),
+                              0)
+            else:
+                timeout = IDLE_TIMEOUT
             # Grab data from the serial port.
-            raw = self.serial_port.read(self.serial_port.inWaiting())
-
-            # XXX : work around for python 3.1 and python 2.6 differences
-            if isinstance(raw, str):
-                raw = [ord(x) for x in raw]
-
-            if raw:
-                last_read_time_s = time.clock()
-
-            if (not raw and len(self._pressed_keys) > 0
-                and time.clock() - last_read_time_s > timeout_s):
-                self._finish_stroke()
+            try:
+                raw = self._read(timeout)
+            except Exception:
+                # Reading fails once stop_capture has closed the port.
+                if self.finished.isSet():
+                    break
+                raise
+
+            if not raw:
+                if (self._pressed_mask and
+                    monotonic() - last_read_time >= STROKE_TIMEOUT):
+                    self._finish_stroke()
                 continue
+            last_read_time = monotonic()
 
-            for byte in raw:
+            for byte in bytearray(raw):
                 key_set = byte >> 6
-                if (key_set <= self._last_key_set
-                    and len(self._pressed_keys) > 0):
+                if key_set <= self._last_key_set and self._pressed_mask:
                     self._finish_stroke()
                 self._last_key_set = key_set
-                for i in xrange(6):
-                    if (byte >> i) & 1:
-                        self._pressed_keys.append(
-                            STENO_KEY_CHART[(key_set * 6) + i])
+                self._pressed_mask |= _BYTE_MASKS[byte]
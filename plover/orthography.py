@@ -4,46 +4,136 @@
 """Functions that implement some English orthographic rules."""
 
 import re
+import string
+from lru_cache import LRUCache
 
+# Each rule is a tuple of the letters the word may end with, the letters the
+# suffix may start with, a pattern matched against "word ^ suffix" and its
+# replacement. The letters are only used to find the rules worth trying.
 RULES = [
     # == +ly ==
     # artistic + ly = artistically
-    (re.compile(r'^(.*[aeiou]c) \^ ly$', re.I),
-        r'\1ally'),
+    ('c', 'l',
+     re.compile(r'^(.*[aeiou]c) \^ ly$', re.I),
+     r'\1ally'),
 
     # == +s ==
     # establish + s = establishes (sibilant pluralization)
-    (re.compile(r'^(.*(?:s|sh|x|z|zh)) \^ s$', re.I),
-        r'\1es'),
+    ('shxz', 's',
+     re.compile(r'^(.*(?:s|sh|x|z|zh)) \^ s$', re.I),
+     r'\1es'),
     # speech + s = speeches (soft ch pluralization)
-    (re.compile(r'^(.*(?:oa|ea|i|ee|oo|au|ou|l|n|(?<![gin]a)r|t)ch) \^ s$', re.I),
-        r'\1es'),
+    ('h', 's',
+     re.compile(r'^(.*(?:oa|ea|i|ee|oo|au|ou|l|n|(?<![gin]a)r|t)ch) \^ s$', re.I),
+     r'\1es'),
     # cherry + s = cherries (consonant + y pluralization)
-    (re.compile(r'^(.+[bcdfghjklmnpqrstvwxz])y \^ s$', re.I),
-        r'\1ies'),
+    ('y', 's',
+     re.compile(r'^(.+[bcdfghjklmnpqrstvwxz])y \^ s$', re.I),
+     r'\1ies'),
 
     # == y ==
     # die+ing = dying
-    (re.compile(r'^(.+)ie \^ ing$', re.I),
-        r'\1ying'),
+    ('e', 'i',
+     re.compile(r'^(.+)ie \^ ing$', re.I),
+     r'\1ying'),
     # metallurgy + ist = metallurgist
-    (re.compile(r'^(.+[cdfghlmnpr])y \^ ist$', re.I),
-        r'\1ist'),
+    ('y', 'i',
+     re.compile(r'^(.+[cdfghlmnpr])y \^ ist$', re.I),
+     r'\1ist'),
     # beauty + ful = beautiful (y -> i)
-    (re.compile(r'^(.+[bcdfghjklmnpqrstvwxz])y \^ ([a-hj-xz].*)$', re.I),
-        r'\1i\2'),
+    ('y', 'abcdefghjklmnopqrstuvwxz',
+     re.compile(r'^(.+[bcdfghjklmnpqrstvwxz])y \^ ([a-hj-xz].*)$', re.I),
+     r'\1i\2'),
 
     # == e ==
     # narrate + ing = narrating (silent e)
-    (re.compile(r'^(.+[bcdfghjklmnpqrstuvwxz])e \^ ([aeiouy].*)$', re.I),
-        r'\1\2'),
+    ('e', 'aeiouy',
+     re.compile(r'^(.+[bcdfghjklmnpqrstuvwxz])e \^ ([aeiouy].*)$', re.I),
+     r'\1\2'),
 
     # == misc ==
     # defer + ed = deferred (consonant doubling)   XXX monitor(stress not on last syllable)
-    (re.compile(r'^(.*(?:[bcdfghjklmnprstvwxyz]|qu)[aeiou])([bcdfgklmnprtvz]) \^ ([aeiouy].*)$', re.I),
-        r'\1\2\2\3'),
+    ('bcdfgklmnprtvz', 'aeiouy',
+     re.compile(r'^(.*(?:[bcdfghjklmnprstvwxyz]|qu)[aeiou])([bcdfgklmnprtvz]) \^ ([aeiouy].*)$', re.I),
+     r'\1\2\2\3'),
 ]
 
+def _index_rules(rules):
+    """Map (last letter of word, first letter of suffix) to matching rules."""
+    index = {}
+    for last in string.ascii_lowercase:
+        for first in string.ascii_lowercase:
+            candidates = tuple((pattern, replacement)
+                               for endings, starts, pattern, replacement
+                               in rules
+                               if last in endings and first in starts)
+            if candidates:
+                index[last, first] = candidates
+    return index
+
+_RULE_INDEX = _index_rules(RULES)
+
+# The number of (word, suffix) results kept.
+CACHE_SIZE = 4096
+
+# Words that spellings are checked against, see set_word_list.
+_word_list = None
+
+def set_word_list(words):
+    """Choose spellings with a word list.
+
+    When a word list is set, add_suffix tries every rule that matches, and
+    simply appending the suffix, and returns the first spelling found in the
+    list. When none is, the result is the same as without a word list.
+
+    Arguments:
+
+    words -- An iterable of words, or None to stop using a word list.
+
+    """
+    global _word_list
+    _word_list = (None if words is None else
+                  frozenset(w.strip().lower() for w in words if w.strip()))
+    cache.clear()
+
+def load_word_list(filename):
+    """Use the words in a file, one per line, see set_word_list."""
+    with open(filename, 'rb') as f:
+        set_word_list(line.decode('utf-8') for line in f)
+
+def _candidates(word, suffix):
+    """Yield the spellings of word + suffix by the rules, in rule order."""
+    if not word or not suffix:
+        return
+    rules = _RULE_INDEX.get((word[-1].lower(), suffix[0].lower()))
+    if rules is None:
+        return
+    joined = word + " ^ " + suffix
+    for pattern, replacement in rules:
+        m = pattern.match(joined)
+        if m:
+            yield m.expand(replacement)
+
+def _add_suffix(args):
+    word, suffix = args
+    words = _word_list
+    if words is None:
+        for candidate in _candidates(word, suffix):
+            return candidate
+        return word + suffix
+    first = None
+    for candidate in _candidates(word, suffix):
+        if candidate.lower() in words:
+            return candidate
+        if first is None:
+            first = candidate
+    if (word + suffix).lower() in words or first is None:
+        return word + suffix
+    return first
+
+# Results of _add_suffix by (word, suffix).
+cache = LRUCache(_add_suffix, CACHE_SIZE)
+
 def add_suffix(word, suffix):
     """Add a suffix to a word by applying the rules above
     
@@ -54,9 +144,4 @@ def add_suffix(word, suffix):
     
     """
     suffix, sep, rest = suffix.partition(' ')
-    for r in RULES:
-        m = r[0].match(word + " ^ " + suffix)
-        if m:   
-            expanded = m.expand(r[1])
-            return expanded + sep + rest
-    return word + suffix + sep + rest
+    return cache((word, suffix)) + sep + rest
@@ -0,0 +1,177 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for xkeyboardcontrol.py."""
+
+import unittest
+from Xlib import X, XK
+import xkeyboardcontrol
+
+SHIFT, CAPS_LOCK, CONTROL, BACKSPACE, NUM_LOCK = 50, 66, 37, 22, 77
+
+# keycode -> keysyms without and with Shift.
+KEYS = {
+    10: (ord('a'), ord('A')),
+    11: (ord('1'), ord('!')),
+    SHIFT: (XK.XK_Shift_L,),
+    CAPS_LOCK: (XK.XK_Caps_Lock,),
+    CONTROL: (XK.XK_Control_L,),
+    BACKSPACE: (XK.XK_BackSpace,),
+    NUM_LOCK: (XK.XK_Num_Lock,),
+}
+
+class FakeDisplay(object):
+    """A display that types like an X server with XTEST."""
+
+    def __init__(self):
+        self.keys = dict(KEYS)
+        self.pressed = set()
+        self.lock = False
+        self.num_lock = False
+        self.typed = []
+        self.events = []
+        self.keymap_queries = 0
+
+    def get_modifier_mapping(self):
+        return [[SHIFT], [CAPS_LOCK], [CONTROL], [], [NUM_LOCK], [], [], []]
+
+    def keysym_to_keycodes(self, keysym):
+        return [(keycode, index)
+                for keycode, keysyms in sorted(self.keys.items())
+                for index, k in enumerate(keysyms) if k == keysym]
+
+    def keycode_to_keysym(self, keycode, index):
+        return self.keys[keycode][index]
+
+    def remap(self, keycode, keysyms):
+        """Change the keysyms of a keycode, and tell the clients."""
+        self.keys[keycode] = keysyms
+        self.events.append(MappingNotify())
+
+    def pending_events(self):
+        return len(self.events)
+
+    def next_event(self):
+        return self.events.pop(0)
+
+    def refresh_keyboard_mapping(self, event):
+        pass
+
+    def sync(self):
+        pass
+
+    def screen(self):
+        return self
+
+    @property
+    def root(self):
+        return self
+
+    def query_pointer(self):
+        return self
+
+    @property
+    def mask(self):
+        mask = 0
+        if SHIFT in self.pressed:
+            mask |= X.ShiftMask
+        if self.lock:
+            mask |= X.LockMask
+        if CONTROL in self.pressed:
+            mask |= X.ControlMask
+        if self.num_lock:
+            mask |= X.Mod2Mask
+        return mask
+
+    def query_keymap(self):
+        self.keymap_queries += 1
+        keymap = [0] * 32
+        for keycode in self.pressed:
+            keymap[keycode >> 3] |= 1 << (keycode & 7)
+        return keymap
+
+    def fake_input(self, event_type, keycode):
+        if event_type == X.KeyRelease:
+            self.pressed.discard(keycode)
+            return
+        self.pressed.add(keycode)
+        if keycode == CAPS_LOCK:
+            self.lock = not self.lock
+        elif keycode == NUM_LOCK:
+            self.num_lock = not self.num_lock
+        elif keycode not in (SHIFT, CONTROL):
+            keysyms = self.keys[keycode]
+            shift = SHIFT in self.pressed
+            if self.lock and chr(keysyms[0]).isalpha():
+                shift = not shift
+            keysym = keysyms[1] if shift else keysyms[0]
+            if CONTROL in self.pressed:
+                keysym = 'Control', keysym
+            self.typed.append(keysym)
+
+class MappingNotify(object):
+    type = X.MappingNotify
+
+class FakeXTest(object):
+
+    def fake_input(self, display, event_type, keycode):
+        display.fake_input(event_type, keycode)
+
+class KeyboardEmulationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.display = FakeDisplay()
+        self.modules = xkeyboardcontrol.display, xkeyboardcontrol.xtest
+        xkeyboardcontrol.display = self
+        xkeyboardcontrol.xtest = FakeXTest()
+        self.emulation = xkeyboardcontrol.KeyboardEmulation()
+
+    def tearDown(self):
+        xkeyboardcontrol.display, xkeyboardcontrol.xtest = self.modules
+
+    def Display(self):
+        return self.display
+
+    def test_send_string(self):
+        self.emulation.send_string(u'aA1!')
+        self.assertEqual(self.display.typed, map(ord, 'aA1!'))
+        self.assertEqual(self.display.pressed, set())
+
+    def test_caps_lock(self):
+        self.display.fake_input(X.KeyPress, CAPS_LOCK)
+        self.display.fake_input(X.KeyRelease, CAPS_LOCK)
+        self.display.fake_input(X.KeyPress, SHIFT)
+        self.emulation.send_string(u'aA1!')
+        self.assertEqual(self.display.typed, map(ord, 'aA1!'))
+        # The keyboard is left as it was.
+        self.assertTrue(self.display.lock)
+        self.assertEqual(self.display.pressed, set([SHIFT]))
+        self.assertEqual(self.display.keymap_queries, 1)
+
+    def test_locks_only(self):
+        # Locked modifiers are not held, so the keys aren't looked up.
+        for keycode in (CAPS_LOCK, NUM_LOCK):
+            self.display.fake_input(X.KeyPress, keycode)
+            self.display.fake_input(X.KeyRelease, keycode)
+        self.emulation.send_string(u'aA')
+        self.assertEqual(self.display.typed, map(ord, 'aA'))
+        self.assertTrue(self.display.lock)
+        self.assertTrue(self.display.num_lock)
+        self.assertEqual(self.display.keymap_queries, 0)
+
+    def test_mapping_change(self):
+        self.emulation.send_string(u'a')
+        self.display.remap(10, (ord('b'), ord('B')))
+        self.display.remap(12, (ord('a'), ord('A')))
+        self.emulation.send_string(u'aA')
+        self.assertEqual(self.display.typed, map(ord, 'aaA'))
+        self.assertEqual(self.display.events, [])
+
+    def test_send_backspaces(self):
+        self.display.fake_input(X.KeyPress, CONTROL)
+        self.emulation.send_backspaces(2)
+        self.assertEqual(self.display.typed, [XK.XK_BackSpace] * 2)
+        self.assertEqual(self.display.pressed, set([CONTROL]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,18 +23,23 @@ http://tronche.com/gui/x/xlib/input/keyboard-encoding.html
 
 """
 
+import collections
 import sys
 import threading
 
 from Xlib import X, XK, display
 from Xlib.ext import record, xtest
-from Xlib.protocol import rq, event
+from Xlib.protocol import rq
 
 RECORD_EXTENSION_NOT_FOUND = "Xlib's RECORD extension is required, \
 but could not be found."
 
 keyboard_capture_instances = []
 
+# Keys that lock a modifier on and off instead of holding it.
+_LOCK_KEYSYMS = frozenset((XK.XK_Caps_Lock, XK.XK_Shift_Lock, XK.XK_Num_Lock,
+                           XK.XK_Scroll_Lock))
+
 
 class KeyboardCapture(threading.Thread):
     """Listen to keyboard press and release events."""
@@ -43,7 +48,7 @@ class KeyboardCapture(threading.Thread):
         """Prepare to listen for keyboard events."""
         threading.Thread.__init__(self)
         self.context = None
-        self.key_events_to_ignore = []
+        self.key_events_to_ignore = collections.deque()
 
         # Assign default callback functions.
         self.key_down = lambda x: True
@@ -130,7 +135,7 @@ class KeyboardCapture(threading.Thread):
                 ignore_keycode, ignore_event_type = self.key_events_to_ignore[0]
                 if (keycode == ignore_keycode and
                     event.type == ignore_event_type):
-                    self.key_events_to_ignore.pop(0)
+                    self.key_events_to_ignore.popleft()
                     continue
             # ...or pass it on to a callback method.
             if event.type == X.KeyPress:
@@ -156,21 +161,65 @@ class KeyboardCapture(threading.Thread):
         Xlib.X.KeyRelease.
 
         """
-        self.key_events_to_ignore += key_events
+        self.key_events_to_ignore.extend(key_events)
 
 
 class KeyboardEmulation:
-    """Emulate keyboard events."""
+    """Emulate keyboard events.
+
+    Keys are typed with the XTEST extension. All the key events of a call are
+    sent as one batch of requests followed by a single sync, and every
+    KeyboardCapture instance is told to ignore them.
+
+    XTEST events are combined with the real keyboard state, so before text is
+    typed the held modifier keys are released and Caps Lock is turned off, and
+    both are restored afterwards.
+
+    """
 
     def __init__(self):
         """Prepare to emulate keyboard events."""
         self.display = display.Display()
+        self._update_keyboard_mapping()
+
+    def _update_keyboard_mapping(self):
+        """Read the modifier mapping and drop cached keycodes."""
         self.modifier_mapping = self.display.get_modifier_mapping()
+        # A keycode for each modifier, pressed to apply its mask bit.
+        self._modifier_keycodes = []
+        # The mask of the modifiers that are held down, unlike Lock and the
+        # ones of lock keys like Num Lock, see _modifier_events.
+        self._held_modifiers = 0
+        for i, mod_keycodes in enumerate(self.modifier_mapping):
+            keycodes = [k for k in mod_keycodes if k]
+            self._modifier_keycodes.append(keycodes[0] if keycodes else None)
+            if i != X.LockMapIndex and any(
+                self.display.keycode_to_keysym(k, 0) not in _LOCK_KEYSYMS
+                for k in keycodes):
+                self._held_modifiers |= 1 << i
+        # (keycode, modifiers) pairs by keysym.
+        self._keycode_cache = {}
         # Determine the backspace keycode.
         backspace_keysym = XK.string_to_keysym('BackSpace')
         self.backspace_keycode, mods = self._keysym_to_keycode_and_modifiers(
                                                 backspace_keysym)
 
+    def _check_keyboard_mapping(self):
+        """Update the cached keycodes if the keyboard mapping changed.
+
+        The X server sends MappingNotify events to every client when the
+        keyboard mapping changes.
+
+        """
+        changed = False
+        while self.display.pending_events():
+            e = self.display.next_event()
+            if e.type == X.MappingNotify:
+                self.display.refresh_keyboard_mapping(e)
+                changed = True
+        if changed:
+            self._update_keyboard_mapping()
+
     def send_backspaces(self, number_of_backspaces):
         """Emulate the given number of backspaces.
 
@@ -181,8 +230,15 @@ class KeyboardEmulation:
         number_of_backspace -- The number of backspaces to emulate.
 
         """
-        for x in xrange(number_of_backspaces):
-            self._send_keycode(self.backspace_keycode)
+        if number_of_backspaces <= 0:
+            return
+        self._check_keyboard_mapping()
+        keycode = self.backspace_keycode
+        if keycode is None:
+            return
+        self._send_key_events([(keycode, X.KeyPress),
+                               (keycode, X.KeyRelease)] *
+                              number_of_backspaces, clear_modifiers=True)
 
     def send_string(self, s):
         """Emulate the given string.
@@ -194,12 +250,14 @@ class KeyboardEmulation:
         s -- The string to emulate.
 
         """
+        self._check_keyboard_mapping()
+        keycode_events = []
         for char in s:
             keysym = ord(char)
             keycode, modifiers = self._keysym_to_keycode_and_modifiers(keysym)
             if keycode is not None:
-                self._send_keycode(keycode, modifiers)
-        self.display.sync()
+                self._add_key_events(keycode_events, keycode, modifiers)
+        self._send_key_events(keycode_events, clear_modifiers=True)
 
     def send_key_combination(self, combo_string):
         """Emulate a sequence of key combinations.
@@ -223,6 +281,7 @@ class KeyboardEmulation:
         and release the Tab key, and then release the left Alt key.
 
         """
+        self._check_keyboard_mapping()
         # Convert the argument into a sequence of keycode, event type pairs
         # that, if executed in order, would emulate the key
         # combination represented by the argument.
@@ -266,62 +325,90 @@ class KeyboardEmulation:
         for keycode in key_down_stack:
             keycode_events.append((keycode, X.KeyRelease))
 
-        # Tell all KeyboardCapture instances to ignore the key
-        # events that are about to be sent.
-        for capture in keyboard_capture_instances:
-            capture.ignore_key_events(keycode_events)
-
-        # Emulate the key combination by sending key events.
-        for keycode, event_type in keycode_events:
-            xtest.fake_input(self.display, event_type, keycode)
-        self.display.sync()
+        self._send_key_events(keycode_events)
 
-    def _send_keycode(self, keycode, modifiers=0):
-        """Emulate a key press and release.
+    def _add_key_events(self, keycode_events, keycode, modifiers):
+        """Add the events that type a keycode with the given modifiers.
 
         Arguments:
 
+        keycode_events -- A list of keycode, event type pairs to add to.
+
         keycode -- An integer in the inclusive range [8-255].
 
         modifiers -- An 8-bit bit mask indicating if the key pressed
         is modified by other keys, such as Shift, Capslock, Control,
-        and Alt.
+        and Alt. The keys for these modifiers are held down while the key
+        is pressed.
 
         """
-        self._send_key_event(keycode, modifiers, event.KeyPress)
-        self._send_key_event(keycode, modifiers, event.KeyRelease)
+        held = [self._modifier_keycodes[i] for i in xrange(8)
+                if modifiers & (1 << i) and self._modifier_keycodes[i]]
+        for modifier_keycode in held:
+            keycode_events.append((modifier_keycode, X.KeyPress))
+        keycode_events.append((keycode, X.KeyPress))
+        keycode_events.append((keycode, X.KeyRelease))
+        for modifier_keycode in reversed(held):
+            keycode_events.append((modifier_keycode, X.KeyRelease))
+
+    def _modifier_events(self):
+        """Return the events that clear and restore the modifier state.
+
+        Returns a pair of lists of keycode, event type pairs. The first
+        releases the modifier keys that are held down and turns Caps Lock off,
+        the second undoes that.
 
-    def _send_key_event(self, keycode, modifiers, event_class):
-        """Simulate a key press or release.
-
-        These events are not detected by KeyboardCapture.
+        """
+        mask = self.display.screen().root.query_pointer().mask
+        clear = []
+        restore = []
+        if mask & X.LockMask:
+            # Lock is toggled by a press and release of its key.
+            keycode = self._modifier_keycodes[X.LockMapIndex]
+            if keycode:
+                toggle = [(keycode, X.KeyPress), (keycode, X.KeyRelease)]
+                clear.extend(toggle)
+                restore.extend(toggle)
+        held = mask & self._held_modifiers
+        if not held:
+            return clear, restore
+        # Only the keys that are down are released.
+        keymap = self.display.query_keymap()
+        for i, mod_keycodes in enumerate(self.modifier_mapping):
+            if not held & (1 << i):
+                continue
+            for keycode in mod_keycodes:
+                if keycode and keymap[keycode >> 3] & (1 << (keycode & 7)):
+                    clear.append((keycode, X.KeyRelease))
+                    restore.append((keycode, X.KeyPress))
+        return clear, restore
+
+    def _send_key_events(self, keycode_events, clear_modifiers=False):
+        """Send a batch of key events with a single sync.
 
         Arguments:
 
-        keycode -- An integer in the inclusive range [8-255].
+        keycode_events -- A sequence of keycode, event type pairs.
 
-        modifiers -- An 8-bit bit mask indicating if the key pressed
-        is modified by other keys, such as Shift, Capslock, Control,
-        and Alt.
-
-        event_class -- One of Xlib.protocol.event.KeyPress or
-        Xlib.protocol.event.KeyRelease.
+        clear_modifiers -- Whether to send the events without the modifiers
+        and Caps Lock of the real keyboard, see _modifier_events.
 
         """
-        target_window = self.display.get_input_focus().focus
-        key_event = event_class(detail=keycode,
-                                 time=X.CurrentTime,
-                                 root=self.display.screen().root,
-                                 window=target_window,
-                                 child=X.NONE,
-                                 root_x=1,
-                                 root_y=1,
-                                 event_x=1,
-                                 event_y=1,
-                                 state=modifiers,
-                                 same_screen=1
-                                 )
-        target_window.send_event(key_event)
+        if not keycode_events:
+            return
+        if clear_modifiers:
+            clear, restore = self._modifier_events()
+            if clear or restore:
+                keycode_events = clear + list(keycode_events) + restore
+        # Tell all KeyboardCapture instances to ignore the key
+        # events that are about to be sent.
+        for capture in keyboard_capture_instances:
+            capture.ignore_key_events(keycode_events)
+
+        # The requests are buffered and sent together by the sync.
+        for keycode, event_type in keycode_events:
+            xtest.fake_input(self.display, event_type, keycode)
+        self.display.sync()
 
     def _keysym_to_keycode_and_modifiers(self, keysym):
         """Return a keycode and modifier mask pair that result in the keysym.
@@ -329,13 +416,20 @@ class KeyboardEmulation:
         There is a one-to-many mapping from keysyms to keycode and
         modifiers pairs; this function returns one of the possibly
         many valid mappings, or the tuple (None, None) if no mapping
-        exists.
+        exists. Results are cached until the keyboard mapping changes.
 
         Arguments:
 
         keysym -- A key symbol.
 
         """
+        result = self._keycode_cache.get(keysym)
+        if result is None:
+            result = self._keycode_cache[keysym] = self._lookup_keysym(keysym)
+        return result
+
+    def _lookup_keysym(self, keysym):
+        """Find a keycode and modifier mask pair for the keysym, uncached."""
         keycodes = self.display.keysym_to_keycodes(keysym)
         if len(keycodes) > 0:
             keycode, offset = keycodes[0]
@@ -0,0 +1,165 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Queued stages for running parts of the steno pipeline on their own threads.
+
+By default the machine thread translates, formats and sends output for each
+stroke before reading the next one, so a slow X server delays reading the
+machine. In the queued pipeline each stage has a worker thread that makes the
+calls put on its bounded queue, in order. When a queue is full, put blocks
+until there is room, so a slow stage holds back the stage feeding it instead
+of letting work pile up.
+
+"""
+
+import logging
+import Queue
+import threading
+import time
+
+import config as conf
+import latency
+
+# The number of calls that can wait in a stage's queue.
+DEFAULT_QUEUE_SIZE = 256
+
+# Seconds stop waits for room in a full queue and for the worker to finish.
+STOP_TIMEOUT = 2.0
+
+# The functions of an output, see formatting.Formatter.
+_OUTPUT_FUNCTIONS = ('send_backspaces', 'send_string', 'send_key_combination',
+                     'send_engine_command')
+
+class Stage(object):
+    """A worker thread that makes queued calls in order.
+
+    Attributes:
+    name -- The name of the stage, also used for its thread.
+
+    """
+
+    def __init__(self, name, maxsize=DEFAULT_QUEUE_SIZE):
+        """Start a stage.
+
+        Arguments:
+
+        name -- The name of the stage.
+
+        maxsize -- The number of calls that can wait in the queue.
+
+        """
+        self.name = name
+        self._queue = Queue.Queue(maxsize)
+        self._processed = 0
+        self._max_depth = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        # Set when the stage stops without making the queued calls.
+        self._abandoned = False
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, function, *args):
+        """Queue a call, blocking while the queue is full."""
+        start = latency.current() if latency.enabled else None
+        self._queue.put((time.time(), start, function, args))
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    def wait(self):
+        """Block until every queued call has been made."""
+        self._queue.join()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Make the queued calls and stop the worker thread.
+
+        When the queue stays full for timeout seconds, for example because
+        the output is stalled, the worker stops after its current call and
+        the other queued calls are dropped. Waits up to timeout seconds more
+        for the worker to stop. A timeout of None waits as long as it takes.
+
+        """
+        try:
+            self._queue.put(None, timeout=timeout)
+        except Queue.Full:
+            self._abandoned = True
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Return a dictionary with the queue depth and call latencies.
+
+        depth -- The number of calls waiting now.
+
+        max_depth -- The most calls that were waiting at once.
+
+        processed -- The number of calls made.
+
+        mean_latency, max_latency -- The seconds from queuing a call to its
+        return.
+
+        """
+        processed = self._processed
+        return {
+            'depth': self._queue.qsize(),
+            'max_depth': self._max_depth,
+            'processed': processed,
+            'mean_latency': (self._total_latency / processed if processed
+                             else 0.0),
+            'max_latency': self._max_latency,
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None or self._abandoned:
+                    return
+                queued, start, function, args = item
+                if start is not None:
+                    latency.set_current(start)
+                try:
+                    function(*args)
+                except Exception:
+                    logging.getLogger(conf.LOGGER_NAME).exception(
+                        'Error in the %s stage', self.name)
+                if start is not None:
+                    latency.mark('%s stage' % self.name)
+                elapsed = time.time() - queued
+                self._processed += 1
+                self._total_latency += elapsed
+                if elapsed > self._max_latency:
+                    self._max_latency = elapsed
+            finally:
+                self._queue.task_done()
+
+class QueuedOutput(object):
+    """An output whose calls are made on a stage's thread.
+
+    It has the same functions as the output it wraps, see
+    formatting.Formatter.
+
+    """
+
+    def __init__(self, output, stage):
+        """Wrap an output.
+
+        Arguments:
+
+        output -- The output that makes the calls.
+
+        stage -- The stage to queue the calls on.
+
+        """
+        self.stage = stage
+        for name in _OUTPUT_FUNCTIONS:
+            function = getattr(output, name, None)
+            if function is not None:
+                setattr(self, name, self._queued(function))
+
+    def _queued(self, function):
+        put = self.stage.put
+        def queue_call(*args):
+            put(function, *args)
+        return queue_call
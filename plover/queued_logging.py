@@ -0,0 +1,170 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A logging handler that writes records on a background thread.
+
+The engine logs every stroke and translation from the machine and translator
+threads. With a file handler that means formatting the line, writing it and
+sometimes rotating the log before the stroke is translated. A QueuedHandler
+only puts the record on a bounded queue. A writer thread formats the records
+and passes them to the real handlers in batches, flushing each handler once
+per batch. Handlers that flush every record themselves, like the file
+handlers, still do so, but on the writer thread.
+
+When the queue is full the policy decides what happens to a new record:
+
+BLOCK -- Wait for room in the queue. Nothing is lost but a slow disk delays
+the stroke.
+
+DROP -- Drop the new record.
+
+DROP_OLDEST -- Drop the oldest record in the queue to make room.
+
+"""
+
+import collections
+import logging
+import threading
+
+BLOCK = 'block'
+DROP = 'drop'
+DROP_OLDEST = 'drop_oldest'
+POLICIES = (BLOCK, DROP, DROP_OLDEST)
+
+# The number of records that can wait in the queue.
+DEFAULT_QUEUE_SIZE = 10000
+
+# The most records written between flushes.
+BATCH_SIZE = 256
+
+class QueuedHandler(logging.Handler):
+    """Pass records to other handlers on a writer thread.
+
+    Attributes:
+    handlers -- The handlers the records are written to.
+    policy -- What to do with records when the queue is full.
+
+    """
+
+    def __init__(self, handlers, maxsize=DEFAULT_QUEUE_SIZE, policy=DROP):
+        """Start the writer thread.
+
+        Arguments:
+
+        handlers -- The handlers to write the records to.
+
+        maxsize -- The number of records that can wait in the queue.
+
+        policy -- One of BLOCK, DROP and DROP_OLDEST.
+
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown queue policy: %s' % policy)
+        logging.Handler.__init__(self)
+        self.handlers = list(handlers)
+        self.maxsize = maxsize
+        self.policy = policy
+        self._records = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        # Records taken by the writer and not yet written.
+        self._writing = 0
+        self._closed = False
+        self._max_depth = 0
+        self._dropped = 0
+        self._written = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run,
+                                        name='QueuedHandler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._records) >= self.maxsize:
+                if self.policy == DROP:
+                    self._dropped += 1
+                    return
+                elif self.policy == DROP_OLDEST:
+                    self._records.popleft()
+                    self._dropped += 1
+                else:
+                    while len(self._records) >= self.maxsize:
+                        self._condition.wait()
+            self._records.append(record)
+            depth = len(self._records)
+            if depth > self._max_depth:
+                self._max_depth = depth
+            self._condition.notify_all()
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        with self._condition:
+            while self._records or self._writing:
+                self._condition.wait()
+
+    def close(self):
+        """Write the queued records, stop the writer and close the handlers."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+    def stats(self):
+        """Return a dictionary with the queue depth and record counts.
+
+        depth -- The number of records waiting now.
+
+        max_depth -- The most records that were waiting at once.
+
+        dropped -- The number of records dropped because the queue was full.
+
+        written -- The number of records written.
+
+        batches -- The number of batches they were written in.
+
+        """
+        with self._condition:
+            return {
+                'depth': len(self._records),
+                'max_depth': self._max_depth,
+                'dropped': self._dropped,
+                'written': self._written,
+                'batches': self._batches,
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._records and not self._closed:
+                    self._condition.wait()
+                if not self._records:
+                    return
+                count = min(len(self._records), BATCH_SIZE)
+                batch = [self._records.popleft() for i in xrange(count)]
+                self._writing = count
+                # Make room for blocked callers.
+                self._condition.notify_all()
+            self._write(batch)
+            with self._condition:
+                self._writing = 0
+                self._written += count
+                self._batches += 1
+                self._condition.notify_all()
+
+    def _write(self, batch):
+        for handler in self.handlers:
+            # Like Handler.handle, but the lock is taken once per batch.
+            handler.acquire()
+            try:
+                for record in batch:
+                    if (record.levelno >= handler.level and
+                        handler.filter(record)):
+                        handler.emit(record)
+                handler.flush()
+            finally:
+                handler.release()
@@ -3,10 +3,12 @@
 
 """Generic stenography data models.
 
-This module contains the following class:
+This module contains the following classes:
 
 Stroke -- A data model class that encapsulates a sequence of steno keys.
 
+StenoKeys -- A tuple of steno keys that knows its key mask.
+
 """
 
 import re
@@ -77,7 +79,62 @@ STENO_KEY_ORDER = {"#": -1,
 
 IMPLICIT_HYPHEN = set(('A-', 'O-', '5-', '0-', '-E', '-U', '*'))
 
-class Stroke:
+# The steno keys in steno order and the bit of each key in a key mask.
+_KEYS_IN_ORDER = sorted(STENO_KEY_ORDER, key=STENO_KEY_ORDER.get)
+STENO_KEY_MASKS = dict((key, 1 << i) for i, key in enumerate(_KEYS_IN_ORDER))
+
+# Strokes and key tuples by key mask. Only a few thousand different chords
+# are used in practice, the limit guards against garbage input.
+_CACHE_LIMIT = 65536
+_STROKES = {}
+_STENO_KEYS = {}
+
+def keys_to_mask(steno_keys):
+    """Return the key mask for a sequence of steno keys.
+
+    Raises KeyError for keys that aren't steno keys.
+
+    """
+    mask = 0
+    for key in steno_keys:
+        mask |= STENO_KEY_MASKS[key]
+    return mask
+
+class StenoKeys(tuple):
+    """A tuple of steno keys in steno order that knows its key mask.
+
+    Machines can pass these to their callbacks instead of lists of keys, so a
+    stroke can be found by its key mask without converting the keys again.
+
+    Attributes:
+    keymask -- The key mask of the keys.
+
+    """
+    def __new__(cls, steno_keys):
+        """Create from a sequence of steno keys.
+
+        Raises KeyError for keys that aren't steno keys.
+
+        """
+        steno_keys = tuple.__new__(cls, sorted(set(steno_keys),
+                                               key=STENO_KEY_MASKS.__getitem__))
+        steno_keys.keymask = keys_to_mask(steno_keys)
+        return steno_keys
+
+    @staticmethod
+    def from_mask(mask):
+        """Return the shared StenoKeys for a key mask."""
+        steno_keys = _STENO_KEYS.get(mask)
+        if steno_keys is None:
+            if mask < 0 or mask >> len(_KEYS_IN_ORDER):
+                raise ValueError('Invalid key mask: %#x' % mask)
+            steno_keys = StenoKeys(key for key in _KEYS_IN_ORDER
+                                   if mask & STENO_KEY_MASKS[key])
+            if len(_STENO_KEYS) < _CACHE_LIMIT:
+                _STENO_KEYS[mask] = steno_keys
+        return steno_keys
+
+class Stroke(object):
     """A standardized data model for stenotype machine strokes.
 
     This class standardizes the representation of a stenotype chord. A stenotype
@@ -88,7 +145,14 @@ class Stroke:
     stenographic ordering on the keys, and combines the keys into a single
     string (called RTFCRE for historical reasons).
 
+    Attributes:
+    steno_keys -- A tuple of the keys in steno order, with number keys
+    converted to numbers.
+    rtfcre -- The stroke in RTF/CRE format.
+    is_correction -- True for the correction stroke.
+
     """
+    __slots__ = ('steno_keys', 'rtfcre', 'is_correction')
 
     def __init__(self, steno_keys) :
         """Create a steno stroke by formatting steno keys.
@@ -124,11 +188,38 @@ class Stroke:
             post = ''.join(k.strip('-') for k in steno_keys if k[0] == '-')
             self.rtfcre = '-'.join([pre, post]) if post else pre
 
-        self.steno_keys = steno_keys
+        self.steno_keys = tuple(steno_keys)
 
         # Determine if this stroke is a correction stroke.
         self.is_correction = (self.rtfcre == '*')
 
+    @staticmethod
+    def from_keymask(mask):
+        """Return the shared Stroke for a key mask.
+
+        Strokes are cached by key mask so they must not be modified.
+
+        """
+        stroke = _STROKES.get(mask)
+        if stroke is None:
+            stroke = Stroke(StenoKeys.from_mask(mask))
+            if len(_STROKES) < _CACHE_LIMIT:
+                _STROKES[mask] = stroke
+        return stroke
+
+    @staticmethod
+    def from_keys(steno_keys):
+        """Return the shared Stroke for a sequence of steno keys.
+
+        StenoKeys are looked up by their key mask directly. Raises KeyError for
+        keys that aren't steno keys.
+
+        """
+        mask = getattr(steno_keys, 'keymask', None)
+        if mask is None:
+            mask = keys_to_mask(steno_keys)
+        return Stroke.from_keymask(mask)
+
     def __str__(self):
         if self.is_correction:
             prefix = '*'
@@ -143,6 +234,9 @@ class Stroke:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return hash(self.steno_keys)
+
     def __repr__(self):
         return str(self)
 
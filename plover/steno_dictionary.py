@@ -9,6 +9,8 @@ A steno dictionary maps sequences of steno strokes to translations.
 
 import collections
 import config as conf
+import struct
+import threading
 from steno import normalize_steno
 
 try:
@@ -20,7 +22,11 @@ class StenoDictionary(collections.MutableMapping):
     """A steno dictionary.
 
     This dictionary maps immutable sequences to translations and tracks the
-    length of the longest key.
+    length of the longest key, using a count of keys per length so deleting
+    keys never rescans the dictionary. It also indexes the proper prefixes of
+    its keys so the translator can skip stroke sequences that can't start any
+    entry. With a value compiler set it also keeps a compiled form of every
+    distinct value, see set_value_compiler.
 
     Attributes:
     longest_key -- A read only property holding the length of the longest key.
@@ -28,8 +34,17 @@ class StenoDictionary(collections.MutableMapping):
     """
     def __init__(self, *args, **kw):
         self._dict = {}
+        # Number of keys that each proper prefix is a prefix of.
+        self._prefixes = {}
+        # Number of keys of each length, index 0 is for length 1.
+        self._lengths = []
         self._longest_key_length = 0
         self._longest_listener_callbacks = set()
+        # Compiled values by value, and the number of entries removed or
+        # replaced since the tables kept by value were last pruned.
+        self._compiler = None
+        self._compiled = {}
+        self._stale = 0
         self.update(*args, **kw)
 
     @property
@@ -46,21 +61,168 @@ class StenoDictionary(collections.MutableMapping):
     def __getitem__(self, key):
         return self._dict.__getitem__(key)
 
+    def get(self, key, default=None):
+        return self._dict.get(key, default)
+
+    def lookup(self, key):
+        """Return a tuple of the value for key and its compiled form.
+
+        The value is None if key is missing and the compiled form is None
+        when there is no value compiler.
+
+        """
+        value = self._dict.get(key)
+        return value, self._compiled.get(value)
+
+    def set_value_compiler(self, compiler):
+        """Keep a compiled form of every value.
+
+        The compiler is called with each value when the entry is added or
+        changed, so work that only depends on the value is done when the
+        dictionary is loaded or modified instead of on every lookup. Equal
+        values are compiled and stored once.
+
+        Arguments:
+
+        compiler -- A function that takes a value and returns its compiled
+        form, or None to stop compiling values.
+
+        """
+        if compiler is self._compiler:
+            return
+        self._compiler = compiler
+        compiled = {}
+        if compiler is not None:
+            for value in self._dict.itervalues():
+                if value not in compiled:
+                    compiled[value] = compiler(value)
+        self._compiled = compiled
+
     def __setitem__(self, key, value):
-        self._longest_key = max(self._longest_key, len(key))
-        self._dict.__setitem__(key, value)
+        self._add(key, value)
+        self._longest_key = len(self._lengths)
 
     def __delitem__(self, key):
-        self._dict.__delitem__(key)
-        if len(key) == self.longest_key:
-            if self._dict:
-                self._longest_key = max(len(x) for x in self._dict.iterkeys())
+        self._remove(key)
+        self._longest_key = len(self._lengths)
+
+    def update(self, *args, **kw):
+        """Add entries like dict.update.
+
+        Longest key listeners are notified at most once, after all the entries
+        have been added.
+
+        """
+        if len(args) > 1:
+            raise TypeError('update expected at most 1 arguments, got %d' %
+                            len(args))
+        try:
+            if args:
+                other = args[0]
+                if isinstance(other, collections.Mapping):
+                    other = other.iteritems()
+                elif hasattr(other, 'keys'):
+                    other = ((key, other[key]) for key in other.keys())
+                for key, value in other:
+                    self._add(key, value)
+            for key, value in kw.iteritems():
+                self._add(key, value)
+        finally:
+            self._longest_key = len(self._lengths)
+
+    def delete_many(self, keys):
+        """Delete several keys.
+
+        Longest key listeners are notified at most once, after all the keys
+        have been deleted. Raises KeyError on the first missing key, keys
+        before it stay deleted.
+
+        """
+        try:
+            for key in keys:
+                self._remove(key)
+        finally:
+            self._longest_key = len(self._lengths)
+
+    def clear(self):
+        self._dict.clear()
+        self._compiled.clear()
+        self._stale = 0
+        self._prefixes.clear()
+        del self._lengths[:]
+        self._longest_key = 0
+
+    def _add(self, key, value):
+        """Set an entry without notifying longest key listeners."""
+        replaced = key in self._dict
+        if not replaced:
+            length = len(key)
+            lengths = self._lengths
+            if length > len(lengths):
+                lengths.extend([0] * (length - len(lengths)))
+            if length:
+                lengths[length - 1] += 1
+            prefixes = self._prefixes
+            for i in xrange(1, length):
+                prefix = key[:i]
+                prefixes[prefix] = prefixes.get(prefix, 0) + 1
+        self._dict[key] = value
+        self._compile(value)
+        if replaced:
+            self._release()
+
+    def _remove(self, key):
+        """Delete an entry without notifying longest key listeners."""
+        del self._dict[key]
+        self._release()
+        length = len(key)
+        lengths = self._lengths
+        if length:
+            lengths[length - 1] -= 1
+            # Keep the last count non zero so its length is the longest key.
+            while lengths and not lengths[-1]:
+                lengths.pop()
+        prefixes = self._prefixes
+        for i in xrange(1, length):
+            prefix = key[:i]
+            count = prefixes[prefix] - 1
+            if count:
+                prefixes[prefix] = count
             else:
-                self._longest_key = 0
+                del prefixes[prefix]
+
+    def _compile(self, value):
+        """Compile a value unless it is already compiled."""
+        if self._compiler is not None and value not in self._compiled:
+            self._compiled[value] = self._compiler(value)
+
+    def _release(self):
+        """Note that a value may no longer be used by any entry.
+
+        The tables kept by value are rebuilt from the entries once there have
+        been as many removals as entries, so pruning costs a constant amount
+        per removal.
+
+        """
+        self._stale += 1
+        if self._stale > len(self._dict):
+            self._prune()
+            self._stale = 0
+
+    def _prune(self):
+        """Rebuild the tables kept by value from the entries."""
+        if self._compiler is not None:
+            compiled = self._compiled
+            self._compiled = dict((value, compiled[value])
+                                  for value in self._dict.itervalues())
 
     def __contains__(self, key):
         return self._dict.__contains__(key)
 
+    def has_prefix(self, strokes):
+        """Return True if strokes is the start of a longer key."""
+        return strokes in self._prefixes
+
     def iterkeys(self):
         return self._dict.iterkeys()
 
@@ -88,6 +250,290 @@ class StenoDictionary(collections.MutableMapping):
     def remove_longest_key_listener(self, callback):
         self._longest_listener_callbacks.remove(callback)
 
+class CompactStenoDictionary(StenoDictionary):
+    """A StenoDictionary that stores its entries compactly.
+
+    Stroke strings are interned in a table shared by all compact dictionaries
+    and each key is stored as a packed array of stroke numbers instead of a
+    tuple of strings. Equal translations of the same type are stored once.
+    Keys are returned as tuples of strokes, as in StenoDictionary, at the cost
+    of somewhat slower lookups.
+
+    """
+    # Stroke numbers by stroke and strokes by number, shared by all instances.
+    # Dictionaries are loaded on several threads, so new strokes are only
+    # added with the lock held. The table is never pruned: the strokes of a
+    # steno theory are a small set.
+    _stroke_numbers = {}
+    _strokes = []
+    _intern_lock = threading.Lock()
+
+    def __init__(self, *args, **kw):
+        # The stored translations by type and value, so a str translation
+        # doesn't stand in for an equal unicode one.
+        self._values = {}
+        super(CompactStenoDictionary, self).__init__(*args, **kw)
+
+    def _pack(self, key):
+        """Return the packed key or None if a stroke was never interned."""
+        numbers = self._stroke_numbers
+        try:
+            return _key_struct(len(key)).pack(*[numbers[s] for s in key])
+        except (KeyError, TypeError):
+            return None
+
+    def _intern(self, key):
+        """Return the packed key, interning any new strokes."""
+        numbers = self._stroke_numbers
+        packed = []
+        for stroke in key:
+            number = numbers.get(stroke)
+            if number is None:
+                with self._intern_lock:
+                    number = numbers.get(stroke)
+                    if number is None:
+                        # Store the stroke before its number can be seen.
+                        number = len(self._strokes)
+                        self._strokes.append(stroke)
+                        numbers[stroke] = number
+            packed.append(number)
+        return _key_struct(len(key)).pack(*packed)
+
+    def _share(self, value):
+        """Return the stored copy of value."""
+        values = self._values.get(type(value))
+        if values is None:
+            values = self._values[type(value)] = {}
+        return values.setdefault(value, value)
+
+    def _prune(self):
+        super(CompactStenoDictionary, self)._prune()
+        tables = {}
+        for value in self._dict.itervalues():
+            values = tables.get(type(value))
+            if values is None:
+                values = tables[type(value)] = {}
+            values[value] = value
+        self._values = tables
+
+    def _unpack(self, packed):
+        strokes = self._strokes
+        numbers = _key_struct(len(packed) / _KEY_ITEM_SIZE).unpack(packed)
+        return tuple([strokes[n] for n in numbers])
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __getitem__(self, key):
+        packed = self._pack(key)
+        if packed is None:
+            raise KeyError(key)
+        return self._dict[packed]
+
+    def get(self, key, default=None):
+        packed = self._pack(key)
+        if packed is None:
+            return default
+        return self._dict.get(packed, default)
+
+    def lookup(self, key):
+        packed = self._pack(key)
+        if packed is None:
+            return None, None
+        value = self._dict.get(packed)
+        return value, self._compiled.get(value)
+
+    def __contains__(self, key):
+        packed = self._pack(key)
+        return packed is not None and packed in self._dict
+
+    def has_prefix(self, strokes):
+        packed = self._pack(strokes)
+        return packed is not None and packed in self._prefixes
+
+    def clear(self):
+        super(CompactStenoDictionary, self).clear()
+        self._values.clear()
+
+    def _add(self, key, value):
+        packed = self._intern(key)
+        replaced = packed in self._dict
+        if not replaced:
+            length = len(key)
+            lengths = self._lengths
+            if length > len(lengths):
+                lengths.extend([0] * (length - len(lengths)))
+            if length:
+                lengths[length - 1] += 1
+            prefixes = self._prefixes
+            for i in xrange(_KEY_ITEM_SIZE, len(packed), _KEY_ITEM_SIZE):
+                prefix = packed[:i]
+                prefixes[prefix] = prefixes.get(prefix, 0) + 1
+        value = self._dict[packed] = self._share(value)
+        self._compile(value)
+        if replaced:
+            self._release()
+
+    def _remove(self, key):
+        packed = self._pack(key)
+        if packed is None or packed not in self._dict:
+            raise KeyError(key)
+        del self._dict[packed]
+        self._release()
+        length = len(key)
+        lengths = self._lengths
+        if length:
+            lengths[length - 1] -= 1
+            while lengths and not lengths[-1]:
+                lengths.pop()
+        prefixes = self._prefixes
+        for i in xrange(_KEY_ITEM_SIZE, len(packed), _KEY_ITEM_SIZE):
+            prefix = packed[:i]
+            count = prefixes[prefix] - 1
+            if count:
+                prefixes[prefix] = count
+            else:
+                del prefixes[prefix]
+
+    def iterkeys(self):
+        unpack = self._unpack
+        for packed in self._dict.iterkeys():
+            yield unpack(packed)
+
+    def iteritems(self):
+        unpack = self._unpack
+        for packed, value in self._dict.iteritems():
+            yield unpack(packed), value
+
+# Packed keys are arrays of unsigned 32 bit stroke numbers.
+_KEY_ITEM_SIZE = 4
+_KEY_STRUCTS = {}
+
+def _key_struct(length):
+    key_struct = _KEY_STRUCTS.get(length)
+    if key_struct is None:
+        key_struct = _KEY_STRUCTS[length] = struct.Struct('<%dI' % length)
+    return key_struct
+
+class StenoDictionaryCollection(object):
+    """A priority ordered stack of steno dictionaries.
+
+    Lookups walk the dictionaries in order and return the first translation
+    found, so earlier dictionaries override later ones. The dictionaries are
+    not copied: changes made to any of them are visible immediately, and
+    adding, removing or reordering dictionaries only touches the list.
+
+    The collection can be used by the translator in place of a single
+    StenoDictionary. A value compiler set on the collection is set on every
+    dictionary in it that supports one.
+
+    Attributes:
+    longest_key -- A read only property holding the length of the longest key
+    in any of the dictionaries.
+
+    """
+    def __init__(self, dicts=()):
+        self._dicts = []
+        self._longest_key_length = 0
+        self._longest_listener_callbacks = set()
+        self._compiler = None
+        self.set_dicts(dicts)
+
+    @property
+    def longest_key(self):
+        """The length of the longest key in the collection."""
+        return self._longest_key_length
+
+    @property
+    def dicts(self):
+        """The dictionaries, from highest to lowest priority."""
+        return list(self._dicts)
+
+    def set_dicts(self, dicts):
+        """Replace the dictionaries, given from highest to lowest priority."""
+        dicts = list(dicts)
+        callback = self._longest_key_changed
+        for d in self._dicts:
+            d.remove_longest_key_listener(callback)
+        for d in dicts:
+            d.add_longest_key_listener(callback)
+            if self._compiler is not None and hasattr(d, 'set_value_compiler'):
+                d.set_value_compiler(self._compiler)
+        # Lookups may happen on other threads so the list is replaced, never
+        # modified in place.
+        self._dicts = dicts
+        self._longest_key_changed()
+
+    def insert(self, index, d):
+        """Insert a dictionary at the given priority."""
+        dicts = list(self._dicts)
+        dicts.insert(index, d)
+        self.set_dicts(dicts)
+
+    def remove(self, d):
+        """Remove a dictionary from the collection."""
+        dicts = list(self._dicts)
+        dicts.remove(d)
+        self.set_dicts(dicts)
+
+    def replace(self, old, new):
+        """Put a dictionary in the place of another one."""
+        dicts = list(self._dicts)
+        dicts[dicts.index(old)] = new
+        self.set_dicts(dicts)
+
+    def set_value_compiler(self, compiler):
+        """Set the value compiler of the dictionaries, see StenoDictionary."""
+        self._compiler = compiler
+        for d in self._dicts:
+            if hasattr(d, 'set_value_compiler'):
+                d.set_value_compiler(compiler)
+
+    def get(self, key, default=None):
+        for d in self._dicts:
+            value = d.get(key)
+            if value is not None:
+                return value
+        return default
+
+    def lookup(self, key):
+        """Return the first value for key and its compiled form."""
+        for d in self._dicts:
+            value, compiled = d.lookup(key)
+            if value is not None:
+                return value, compiled
+        return None, None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def has_prefix(self, strokes):
+        """Return True if strokes start a longer key in any dictionary."""
+        for d in self._dicts:
+            if d.has_prefix(strokes):
+                return True
+        return False
+
+    def _longest_key_changed(self, *args):
+        longest_key = max([d.longest_key for d in self._dicts] or [0])
+        if longest_key == self._longest_key_length:
+            return
+        self._longest_key_length = longest_key
+        for callback in self._longest_listener_callbacks:
+            callback(longest_key)
+
+    def add_longest_key_listener(self, callback):
+        self._longest_listener_callbacks.add(callback)
+
+    def remove_longest_key_listener(self, callback):
+        self._longest_listener_callbacks.remove(callback)
+
 def load_dictionary(data):
     """Load a json dictionary from a string."""
     
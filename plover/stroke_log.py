@@ -0,0 +1,221 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Compact binary logs of strokes.
+
+A text stroke line in plover.log takes about 45 bytes. With the
+binary_stroke_log option the engine writes strokes to a binary stroke log,
+which keeps the time and the key mask of each stroke in about 4. With the
+stroke_journal option it writes them to a stroke journal, see plover.journal,
+which takes 8 bytes per stroke but can be read from any time.
+
+The file starts with MAGIC, followed by records of two unsigned varints (7
+bits per byte, least significant first, the high bit set on all but the last
+byte). The first varint holds a time in its upper bits and a flag in its
+lowest bit:
+
+flag 0 -- The time is the milliseconds since the previous stroke.
+
+flag 1 -- The time is the milliseconds since the epoch. Written for the first
+stroke of each file.
+
+The second varint is the key mask of the stroke, see steno.STENO_KEY_MASKS.
+
+"""
+
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+
+from journal import JournalWriter, MAX_TIME, stroke_mask
+from steno import StenoKeys
+
+MAGIC = 'PLVS\x01'
+
+# The extension of the binary stroke log next to the text log.
+EXTENSION = '.strokes'
+
+class StrokeMessage(object):
+    """The message of a logged stroke.
+
+    The text is only built when a handler formats the record, so with a
+    queued handler the stroke thread does not pay for it.
+
+    Attributes:
+    steno_keys -- The keys of the stroke.
+
+    """
+    __slots__ = ('steno_keys',)
+
+    def __init__(self, steno_keys):
+        self.steno_keys = steno_keys
+
+    def __str__(self):
+        return 'Stroke(%s)' % ' '.join(self.steno_keys)
+
+def is_stroke(record):
+    """Return whether a log record is a logged stroke."""
+    return isinstance(record.msg, StrokeMessage)
+
+class TextFilter(logging.Filter):
+    """Keep the stroke records out of a text log."""
+
+    def filter(self, record):
+        return not is_stroke(record)
+
+def _varint(value):
+    data = bytearray()
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return data
+
+def encode(millis, mask, previous=None):
+    """Return the record of a stroke.
+
+    Arguments:
+
+    millis -- The time of the stroke in milliseconds since the epoch.
+
+    mask -- The key mask of the stroke.
+
+    previous -- The time of the previous stroke in the file, or None for the
+    first stroke.
+
+    """
+    if previous is None or millis < previous:
+        data = _varint(millis << 1 | 1)
+    else:
+        data = _varint(millis - previous << 1)
+    data += _varint(mask)
+    return data
+
+class BinaryStrokeHandler(RotatingFileHandler):
+    """A rotating log handler that writes strokes in the binary format.
+
+    Records that are not strokes are ignored.
+
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0):
+        self._previous = None
+        RotatingFileHandler.__init__(self, filename, maxBytes=maxBytes,
+                                     backupCount=backupCount, delay=True)
+
+    def _open(self):
+        stream = open(self.baseFilename, 'ab')
+        stream.seek(0, os.SEEK_END)
+        if not stream.tell():
+            stream.write(MAGIC)
+        # Each file starts from an absolute time.
+        self._previous = None
+        return stream
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+    def format(self, record):
+        millis = int(record.created * 1000)
+        data = encode(millis, stroke_mask(record.msg.steno_keys),
+                      self._previous)
+        self._previous = millis
+        return data
+
+    def emit(self, record):
+        # FileHandler.emit ends every record with a newline, so the record is
+        # written here instead.
+        if not is_stroke(record):
+            return
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record))
+            self.flush()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+
+class JournalHandler(RotatingFileHandler):
+    """A rotating log handler that writes strokes to a stroke journal.
+
+    Records that are not strokes are ignored. A new journal is started when
+    the journal reaches maxBytes or the end of its time range.
+
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0):
+        RotatingFileHandler.__init__(self, filename, maxBytes=maxBytes,
+                                     backupCount=backupCount, delay=True)
+
+    def _open(self):
+        return JournalWriter(self.baseFilename)
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        return ((self.maxBytes > 0 and self.stream.size() >= self.maxBytes) or
+                self.stream.time(record.created) > MAX_TIME)
+
+    def emit(self, record):
+        # FileHandler.emit writes formatted text, so the record is written
+        # here instead.
+        if not is_stroke(record):
+            return
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.append(stroke_mask(record.msg.steno_keys),
+                               self.stream.time(record.created))
+            self.flush()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = ord(data[offset])
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+def read_strokes(data):
+    """Yield the strokes of a binary stroke log.
+
+    Arguments:
+
+    data -- The contents of the log file.
+
+    Yields (time, steno keys) tuples where time is in seconds since the epoch.
+    Raises ValueError if the data is not a binary stroke log. A truncated last
+    record is ignored.
+
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError('Not a binary stroke log')
+    offset = len(MAGIC)
+    millis = 0
+    end = len(data)
+    while offset < end:
+        try:
+            value, offset = _read_varint(data, offset)
+            mask, offset = _read_varint(data, offset)
+        except IndexError:
+            return
+        if value & 1:
+            millis = value >> 1
+        else:
+            millis += value >> 1
+        yield millis / 1000.0, StenoKeys.from_mask(mask)
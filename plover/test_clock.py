@@ -0,0 +1,20 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for clock.py."""
+
+import time
+import unittest
+from clock import monotonic
+
+class ClockTestCase(unittest.TestCase):
+
+    def test_monotonic(self):
+        start = monotonic()
+        time.sleep(0.05)
+        elapsed = monotonic() - start
+        # Sleeping uses no CPU time, so a CPU clock would barely move.
+        self.assertTrue(0.04 <= elapsed < 1, elapsed)
+
+if __name__ == '__main__':
+    unittest.main()
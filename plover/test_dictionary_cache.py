@@ -0,0 +1,192 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for dictionary_cache.py."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from dictionary_cache import (CompiledDictionary, cache_filename,
+                              compile_dictionary, is_cache_valid,
+                              load_dictionary_file, update_cache)
+from steno_dictionary import StenoDictionary
+
+class DictionaryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'dict.json')
+        self.cache_dir = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_source(self, data):
+        with open(self.source, 'wb') as f:
+            f.write(data)
+
+    def test_compiled_dictionary(self):
+        d = StenoDictionary()
+        d[('S',)] = u'a'
+        d[('T', '-P')] = u'\xf1'
+        d[('S', 'T', 'K')] = u'{^ing}'
+        filename = os.path.join(self.dir, 'compiled')
+        compile_dictionary(d, filename)
+        c = CompiledDictionary(filename)
+        self.assertEqual(len(c), 3)
+        self.assertEqual(c.longest_key, 3)
+        self.assertEqual(c[('S',)], u'a')
+        self.assertEqual(c[('T', '-P')], u'\xf1')
+        self.assertEqual(c.get(('S', 'T', 'K')), u'{^ing}')
+        self.assertIsNone(c.get(('T',)))
+        self.assertEqual(c.lookup(('S', 'T', 'K')), (u'{^ing}', None))
+        # Values are compiled as they are looked up.
+        compiled = []
+        def compiler(value):
+            compiled.append(value)
+            return value.upper()
+        c.set_value_compiler(compiler)
+        self.assertEqual(c.lookup(('S', 'T', 'K')), (u'{^ing}', u'{^ING}'))
+        self.assertEqual(c.lookup(('S', 'T', 'K')), (u'{^ing}', u'{^ING}'))
+        self.assertEqual(c.lookup(('T',)), (None, None))
+        self.assertEqual(compiled, [u'{^ing}'])
+        c.set_value_compiler(None)
+        self.assertEqual(c.lookup(('S',)), (u'a', None))
+        self.assertRaises(KeyError, lambda: c[('S', 'T')])
+        self.assertIn(('S',), c)
+        self.assertNotIn(('-P',), c)
+        self.assertEqual(dict(c.iteritems()), d._dict)
+        self.assertTrue(c.has_prefix(('S',)))
+        self.assertTrue(c.has_prefix(('S', 'T')))
+        self.assertFalse(c.has_prefix(('S', 'T', 'K')))
+        self.assertFalse(c.has_prefix(('T', '-P')))
+        c[('T', '-P', 'S')] = u'b'
+        self.assertTrue(c.has_prefix(('T', '-P')))
+        del c[('T', '-P', 'S')]
+        self.assertFalse(c.has_prefix(('T', '-P')))
+        c.close()
+
+    def test_changes(self):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+        d = StenoDictionary()
+        d[('S',)] = u'a'
+        d[('T', '-P')] = u'b'
+        filename = os.path.join(self.dir, 'compiled')
+        compile_dictionary(d, filename)
+        c = CompiledDictionary(filename)
+        c.add_longest_key_listener(listener)
+        c[('S',)] = u'c'
+        c[('S', 'T', 'K')] = u'd'
+        self.assertEqual(len(c), 3)
+        self.assertEqual(c[('S',)], u'c')
+        self.assertEqual(c.longest_key, 3)
+        del c[('S', 'T', 'K')]
+        del c[('T', '-P')]
+        self.assertEqual(c.longest_key, 1)
+        self.assertEqual(len(c), 1)
+        self.assertNotIn(('T', '-P'), c)
+        self.assertRaises(KeyError, c.__delitem__, ('T', '-P'))
+        del c[('S',)]
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.longest_key, 0)
+        self.assertEqual(c.items(), [])
+        c[('T', '-P')] = u'e'
+        self.assertEqual(c.items(), [(('T', '-P'), u'e')])
+        self.assertEqual(notifications, [3, 2, 1, 0, 2])
+        c.update([(('S',), u'f'), (('S', 'T', 'K'), u'g')])
+        c.delete_many([('T', '-P'), ('S', 'T', 'K')])
+        self.assertEqual(c.items(), [(('S',), u'f')])
+        self.assertEqual(notifications, [3, 2, 1, 0, 2, 3, 1])
+        c.clear()
+        self.assertEqual(len(c), 0)
+        self.assertEqual(notifications, [3, 2, 1, 0, 2, 3, 1, 0])
+        c.close()
+
+    def test_empty_dictionary(self):
+        filename = os.path.join(self.dir, 'compiled')
+        compile_dictionary(StenoDictionary(), filename)
+        c = CompiledDictionary(filename)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.longest_key, 0)
+        self.assertIsNone(c.get(('S',)))
+        self.assertEqual(c.items(), [])
+        c.close()
+
+    def test_load_dictionary_file(self):
+        self.write_source('{"S": "a", "T/-P": "b"}')
+        d = load_dictionary_file(self.source, self.cache_dir)
+        cached = cache_filename(self.source, self.cache_dir)
+        self.assertIsInstance(d, CompiledDictionary)
+        self.assertTrue(is_cache_valid(cached, self.source))
+        self.assertEqual(d[('T', '-P')], 'b')
+        d.close()
+
+        # Touching the file without changing it keeps the cache.
+        st = os.stat(self.source)
+        os.utime(self.source, (st.st_atime, st.st_mtime + 10))
+        self.assertTrue(is_cache_valid(cached, self.source))
+
+        # Changing the contents invalidates it.
+        self.write_source('{"S": "c", "T/-P": "b"}')
+        self.assertFalse(is_cache_valid(cached, self.source))
+        d = load_dictionary_file(self.source, self.cache_dir)
+        self.assertEqual(d[('S',)], 'c')
+        self.assertTrue(is_cache_valid(cached, self.source))
+        d.close()
+
+    def test_update_cache(self):
+        self.write_source('{"S": "a", "T/-P": "b"}')
+        cached = cache_filename(self.source, self.cache_dir)
+        self.assertTrue(update_cache(self.source, [('S', 'a'), ('T/-P', 'b')],
+                                     self.cache_dir))
+        self.assertTrue(is_cache_valid(cached, self.source))
+        d = CompiledDictionary(cached)
+        self.assertEqual(d[('T', '-P')], 'b')
+        d.close()
+        # A valid cache is kept without looking at the pairs.
+        self.assertTrue(update_cache(self.source, [], self.cache_dir))
+        d = CompiledDictionary(cached)
+        self.assertEqual(len(d), 2)
+        d.close()
+
+    def test_mapped_cache(self):
+        self.write_source('{"S": "a", "T/-P": "b"}')
+        cached = cache_filename(self.source, self.cache_dir)
+        d = load_dictionary_file(self.source, self.cache_dir)
+        inode = os.stat(cached).st_ino
+        # Touching the source updates the header in a new file.
+        st = os.stat(self.source)
+        os.utime(self.source, (st.st_atime, st.st_mtime + 10))
+        self.assertTrue(is_cache_valid(cached, self.source))
+        self.assertNotEqual(os.stat(cached).st_ino, inode)
+        self.assertTrue(is_cache_valid(cached, self.source))
+        self.write_source('{"S": "c"}')
+        e = load_dictionary_file(self.source, self.cache_dir)
+        # The mapped file is replaced, not changed.
+        self.assertEqual(d[('T', '-P')], 'b')
+        self.assertEqual(e.items(), [(('S',), 'c')])
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(cached)])
+        e.close()
+        # A closed dictionary has no mapped entries.
+        d.close()
+        self.assertIsNone(d.get(('S',)))
+        self.assertNotIn(('S',), d)
+        self.assertFalse(d.has_prefix(('T',)))
+
+    def test_invalid_cache(self):
+        self.write_source('{"S": "a"}')
+        cached = cache_filename(self.source, self.cache_dir)
+        os.makedirs(self.cache_dir)
+        with open(cached, 'wb') as f:
+            f.write('garbage')
+        self.assertFalse(is_cache_valid(cached, self.source))
+        d = load_dictionary_file(self.source, self.cache_dir)
+        self.assertEqual(d[('S',)], 'a')
+        d.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -167,6 +167,71 @@ class FormatterTestCase(unittest.TestCase):
                 self.assertEqual(do[i].formatting, formats[i])
             self.assertEqual(output.instructions, outputs)
 
+    def test_render_text(self):
+        translations = [translation(rtfcre=('S',), english=english) for english
+                        in ('hello', 'cat', '{^s}', '{#Return}', '{.}', 'it',
+                            '{^}{^ing}')]
+        self.assertEqual(''.join(formatting.render_text(translations)),
+                         ' hello cats. Iting')
+        translations = [translation(rtfcre=('S',), english=english) for english
+                        in ('nap', '{^ing}') * 3]
+        chunks = list(formatting.render_text(translations, hold=5))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), ' napping napping napping')
+        self.assertEqual(list(formatting.render_text([])), [])
+        # Text already yielded can't be deleted.
+        translations = [translation(rtfcre=('S',), english=english) for english
+                        in ('make', '{^ing}')]
+        self.assertEqual(''.join(formatting.render_text(translations, hold=1)),
+                         ' making')
+        with self.assertRaises(ValueError):
+            list(formatting.render_text(translations, hold=0))
+
+    def test_coalescing_output(self):
+        capture = CaptureOutput()
+        output = formatting.CoalescingOutput(capture)
+        output.send_string(' nap')
+        output.send_string('ping')
+        output.flush()
+        self.assertEqual(capture.instructions, [('s', ' napping')])
+        # Only the changed end of the text is deleted and typed again.
+        output.send_backspaces(4)
+        output.send_string('s')
+        output.send_backspaces(1)
+        output.send_string('ped')
+        output.flush()
+        self.assertEqual(capture.instructions[1:], [('b', 3), ('s', 'ed')])
+        self.assertEqual(output.keystrokes_saved, 9 - 5)
+        # Nothing is sent when the text doesn't change.
+        output.send_backspaces(6)
+        output.send_string('napped')
+        output.flush()
+        self.assertEqual(len(capture.instructions), 3)
+        self.assertEqual(output.flushes, 2)
+
+        # Key combinations may move the cursor.
+        output.send_string(' x')
+        output.send_key_combination('Left')
+        output.send_backspaces(2)
+        output.send_string(' x')
+        output.send_engine_command('toggle')
+        self.assertEqual(capture.instructions[3:],
+                         [('s', ' x'), ('c', 'Left'), ('b', 2), ('s', ' x'),
+                          ('e', 'toggle')])
+
+        # The formatter flushes after each call to format.
+        del capture.instructions[:]
+        formatter = formatting.Formatter()
+        formatter.set_output(output)
+        t1 = translation(rtfcre=('S',), english='dare')
+        t2 = translation(rtfcre=('S',), english='{^ing}')
+        formatter.format([], [t1], None)
+        formatter.format([], [t2], t1)
+        formatter.format([t2], [], t1)
+        self.assertEqual(capture.instructions,
+                         [('s', ' dare'), ('b', 1), ('s', 'ing'),
+                          ('b', 3), ('s', 'e')])
+
     def test_undo(self):
         cases = [
         ([action(text='hello')], [('b', 5)]),
@@ -203,6 +268,11 @@ class FormatterTestCase(unittest.TestCase):
         self.assertEqual(action(text='test'), action(text='test'))
         self.assertEqual(action(text='test', word='test').copy_state(),
                          action(word='test'))
+        self.assertEqual(action(text='x', attach=True, combo='c',
+                                command='e', replace='r').copy_state(),
+                         action(attach=True))
+        self.assertNotEqual(action(command='a'), action(command='b'))
+        self.assertFalse(hasattr(action(), '__dict__'))
 
     def test_translation_to_actions(self):
         cases = [
@@ -246,6 +316,31 @@ class FormatterTestCase(unittest.TestCase):
         ]
         self.check_arglist(formatting._translation_to_actions, cases)
 
+    def test_parse_cache(self):
+        cache = formatting.parse_cache
+        cache.clear()
+        for i in xrange(3):
+            self.assertEqual(
+                formatting._translation_to_actions('{^ing}', action(word='go')),
+                [action(text='ing', word='going')])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        # Cached atoms don't keep the context they were first used in.
+        self.assertEqual(
+            formatting._translation_to_actions('{^ing}', action(word='die')),
+            [action(text='ying', replace='ie', word='dying')])
+
+    def test_compiled_translation(self):
+        template = formatting.compile_translation('{^ing}')
+        t = translation(rtfcre=('-G',), english='{^ing}')
+        t.template = template
+        formatter = formatting.Formatter()
+        formatter.format([], [t], translation(formatting=[action(word='go')]))
+        self.assertEqual(t.formatting, [action(text='ing', word='going')])
+        # The template is used instead of the english.
+        t.template = formatting.compile_translation('{^ed}')
+        formatter.format([], [t], translation(formatting=[action(word='go')]))
+        self.assertEqual(t.formatting, [action(text='ed', word='goed')])
+
     def test_raw_to_actions(self):
         cases = (
 
@@ -0,0 +1,150 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for journal.py."""
+
+import bisect
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from journal import (Journal, JournalWriter, MAX_TIME, convert_log, replay,
+                     stroke_mask)
+from steno import StenoKeys, Stroke
+from steno_dictionary import StenoDictionary
+from transcript import parse_log
+from translation import Translator
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'plover.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, times, **kwargs):
+        writer = JournalWriter(self.filename, **kwargs)
+        for i, millis in enumerate(times):
+            writer.append(i % 1000 + 1, millis)
+        writer.close()
+
+    def test_find(self):
+        rng = random.Random(2)
+        times = []
+        millis = 0
+        for i in xrange(1000):
+            millis += rng.choice((0, 1, 5, 150, 3000))
+            times.append(millis)
+        self.write(times, segment_strokes=64, index_stride=8)
+        with Journal(self.filename) as journal:
+            self.assertEqual(len(journal), 1000)
+            self.assertEqual(journal._segments, 15)
+            self.assertEqual(journal.record(999), (times[999], 1000))
+            for target in range(-2, 40) + range(0, millis + 10, 7):
+                self.assertEqual(journal.find(target / 1000.0),
+                                 bisect.bisect_left(times, target))
+            strokes = list(journal.strokes_between(times[500] / 1000.0,
+                                                   times[600] / 1000.0))
+            first = bisect.bisect_left(times, times[500])
+            last = bisect.bisect_left(times, times[600])
+            self.assertEqual(strokes, [(times[i] / 1000.0,
+                                        StenoKeys.from_mask(i % 1000 + 1))
+                                       for i in xrange(first, last)])
+
+    def test_append(self):
+        self.write([5, 3, 10], segment_strokes=4, index_stride=2)
+        writer = JournalWriter(self.filename)
+        self.assertEqual(writer.count, 3)
+        # Times never go back.
+        self.assertTrue(writer.time() >= 10)
+        writer.append(stroke_mask(['S-', 'Fn']), 20)
+        writer.append(1)
+        writer.close()
+        with Journal(self.filename) as journal:
+            self.assertEqual([journal.record(i) for i in xrange(4)],
+                             [(5, 1), (5, 2), (10, 3),
+                              (20, StenoKeys(['S-']).keymask)])
+            self.assertEqual(journal._segments, 1)
+            self.assertEqual(len(journal), 5)
+            self.assertTrue(journal.record(4)[0] >= 20)
+        with self.assertRaises(OverflowError):
+            JournalWriter(self.filename).append(1, MAX_TIME + 1)
+
+    def test_time(self):
+        writer = JournalWriter(self.filename, start_time=1000.0)
+        self.assertEqual(writer.time(1002.5), 2500)
+        writer.append(1, writer.time(1002.5))
+        # A clock that was set back doesn't move times back.
+        self.assertEqual(writer.time(1001.0), 2500)
+        writer.close()
+
+    def test_damaged(self):
+        self.write(range(4), segment_strokes=4, index_stride=2)
+        size = os.path.getsize(self.filename)
+        # A partly written index block and a partly written record.
+        for cut in (1, 8):
+            with open(self.filename, 'r+b') as f:
+                f.truncate(size - cut)
+            writer = JournalWriter(self.filename)
+            self.assertEqual(writer.count, 4)
+            writer.close()
+            self.assertEqual(os.path.getsize(self.filename), size)
+        with open(self.filename, 'ab') as f:
+            f.write('\x01\x02\x03')
+        writer = JournalWriter(self.filename)
+        writer.append(1, 4)
+        writer.close()
+        with Journal(self.filename) as journal:
+            self.assertEqual([journal.record(i)[0] for i in xrange(5)],
+                             range(5))
+        with open(self.filename, 'wb') as f:
+            f.write('2013-05-01 10:00:00,000 Stroke(S-)\n')
+        self.assertRaises(ValueError, Journal, self.filename)
+        self.assertRaises(ValueError, JournalWriter, self.filename)
+
+    def test_refresh(self):
+        writer = JournalWriter(self.filename)
+        writer.append(1, 0)
+        writer.flush()
+        with Journal(self.filename) as journal:
+            self.assertEqual(len(journal), 1)
+            writer.append(2, 10)
+            writer.flush()
+            journal.refresh()
+            self.assertEqual(len(journal), 2)
+            self.assertEqual(journal.find(0.005), 1)
+        writer.close()
+
+    def test_convert_log(self):
+        log = os.path.join(self.dir, 'plover.log')
+        with open(log, 'wb') as f:
+            f.write('2013-05-01 10:00:00,000 Stroke(S- -P)\n'
+                    '2013-05-01 10:00:00,100 Translation(((\'SP\',) : sp)\n'
+                    '2013-05-01 10:00:01,250 Stroke(H- -L Fn)\n')
+        with open(log, 'rb') as f:
+            self.assertEqual(convert_log(parse_log(f), self.filename), 2)
+        with Journal(self.filename) as journal:
+            self.assertEqual(list(journal.strokes()),
+                             [(0.0, StenoKeys(['S-', '-P'])),
+                              (1.25, StenoKeys(['H-', '-L']))])
+        with self.assertRaises(ValueError):
+            convert_log([], self.filename)
+
+    def test_replay(self):
+        self.write([0, 100, 200, 300])
+        translator = Translator()
+        translator.set_dictionary(StenoDictionary())
+        strokes = []
+        def listener(undo, do, prev):
+            strokes.extend(t.strokes[-1] for t in do)
+        translator.add_listener(listener)
+        with Journal(self.filename) as journal:
+            self.assertEqual(replay(journal, translator, 0.1, 0.3), 2)
+        self.assertEqual(strokes, [Stroke.from_keymask(2),
+                                   Stroke.from_keymask(3)])
+
+if __name__ == '__main__':
+    unittest.main()
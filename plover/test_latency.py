@@ -0,0 +1,79 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for latency.py."""
+
+import unittest
+import latency
+from formatting import Formatter
+from machine.base import StenotypeBase
+from pipeline import Stage
+from steno import Stroke
+from steno_dictionary import StenoDictionary
+from translation import Translator
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_histogram(self):
+        h = latency.Histogram()
+        self.assertEqual(h.percentile(50), 0.0)
+        for i in xrange(1, 101):
+            h.add(i / 1000.0)
+        self.assertEqual(h.count, 100)
+        self.assertEqual(h.max, 0.1)
+        self.assertTrue(0.050 <= h.percentile(50) <= 0.050 * 1.1)
+        self.assertTrue(0.099 <= h.percentile(99) <= 0.1)
+        self.assertEqual(h.percentile(100), 0.1)
+        h.add(0)
+        self.assertEqual(h.percentile(0), h.SMALLEST)
+
+class LatencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        latency.reset()
+
+    def tearDown(self):
+        latency.disable()
+        latency.reset()
+
+    def pipeline(self):
+        machine = StenotypeBase()
+        translator = Translator()
+        translator.set_dictionary(StenoDictionary({('S',): 'is'}))
+        translator.add_listener(Formatter().format)
+        machine.add_callback(
+            lambda keys: translator.translate(Stroke.from_keys(keys)))
+        return machine
+
+    def test_disabled(self):
+        self.pipeline()._notify(['S-'])
+        self.assertEqual(latency.stats(), {})
+
+    def test_pipeline(self):
+        latency.enable()
+        machine = self.pipeline()
+        for i in xrange(3):
+            machine._notify(['S-'])
+        stats = latency.stats()
+        self.assertEqual(sorted(stats), ['format', 'output', 'translate'])
+        for stage in stats.values():
+            self.assertEqual(stage['count'], 3)
+            self.assertTrue(0 <= stage['p50'] <= stage['p99'] <= stage['max'])
+        self.assertTrue(stats['translate']['max'] <= stats['output']['max'])
+        self.assertEqual([line.split(':')[0] for line in
+                          latency.format_stats()],
+                         ['translate', 'format', 'output'])
+
+    def test_stage(self):
+        latency.enable()
+        stage = Stage('test')
+        latency.capture()
+        stage.put(latency.mark, 'queued')
+        stage.wait()
+        stage.stop()
+        stats = latency.stats()
+        self.assertEqual(stats['queued']['count'], 1)
+        self.assertEqual(stats['test stage']['count'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for lru_cache.py."""
+
+import unittest
+from lru_cache import LRUCache
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_lru_cache(self):
+        calls = []
+        def square(x):
+            calls.append(x)
+            return x * x
+        cache = LRUCache(square, 2)
+        self.assertEqual([cache(x) for x in (1, 2, 1, 3, 1, 2)],
+                         [1, 4, 1, 9, 1, 4])
+        # 2 was the least recently used when 3 was added.
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        self.assertEqual(len(cache), 2)
+        self.assertIn(1, cache)
+        self.assertNotIn(3, cache)
+
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(2, cache)
+        cache(2)
+        self.assertEqual(cache.hits, 3)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+        cache.resize(0)
+        del calls[:]
+        cache(5)
+        cache(5)
+        self.assertEqual(calls, [5, 5])
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
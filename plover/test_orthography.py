@@ -1,6 +1,7 @@
 # Copyright (c) 2013 Hesky Fisher
 # See LICENSE.txt for details.
 
+import orthography
 from orthography import add_suffix
 import unittest
 
@@ -75,6 +76,26 @@ class OrthographyTestCase(unittest.TestCase):
         assert add_suffix('color', 'ing') != 'coloring'  # TODO
         assert add_suffix('inhibit', 'ing') != 'inhibiting'  # TODO
         assert add_suffix('master', 'ed') != 'mastered'  # TODO
+
+    def test_cache(self):
+        orthography.cache.clear()
+        assert add_suffix('narrate', 'ing') == 'narrating'
+        assert add_suffix('narrate', 'ing') == 'narrating'
+        assert add_suffix('Narrate', 'ing and') == 'Narrating and'
+        assert (orthography.cache.hits, orthography.cache.misses) == (1, 2)
+
+    def test_word_list(self):
+        try:
+            orthography.set_word_list(['altered', 'Monitoring', 'beautiful'])
+            assert add_suffix('alter', 'ed') == 'altered'
+            assert add_suffix('monitor', 'ing') == 'monitoring'
+            assert add_suffix('beauty', 'ful') == 'beautiful'
+            # Words not in the list are spelled by the rules.
+            assert add_suffix('defer', 'ed') == 'deferred'
+            assert add_suffix('fix', 'ed') == 'fixed'
+        finally:
+            orthography.set_word_list(None)
+        assert add_suffix('alter', 'ed') != 'altered'
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
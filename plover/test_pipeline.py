@@ -0,0 +1,99 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for pipeline.py."""
+
+import threading
+import time
+import unittest
+from pipeline import QueuedOutput, Stage
+
+class StageTestCase(unittest.TestCase):
+
+    def test_stage(self):
+        stage = Stage('test')
+        calls = []
+        threads = []
+        def call(i):
+            calls.append(i)
+            threads.append(threading.current_thread())
+        for i in xrange(100):
+            stage.put(call, i)
+        stage.wait()
+        self.assertEqual(calls, range(100))
+        self.assertEqual(set(threads), set([stage._thread]))
+        stats = stage.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['processed'], 100)
+        self.assertTrue(1 <= stats['max_depth'] <= 100)
+        self.assertTrue(0 <= stats['mean_latency'] <= stats['max_latency'])
+        stage.stop()
+        self.assertFalse(stage._thread.is_alive())
+
+    def test_errors(self):
+        stage = Stage('test')
+        calls = []
+        def fail():
+            raise ValueError()
+        stage.put(fail)
+        stage.put(calls.append, 1)
+        stage.wait()
+        self.assertEqual(calls, [1])
+        self.assertEqual(stage.stats()['processed'], 2)
+        stage.stop()
+
+    def test_backpressure(self):
+        stage = Stage('test', maxsize=1)
+        release = threading.Event()
+        stage.put(release.wait)
+        stage.put(release.wait)
+        # The queue is full, so the next put blocks until the stage catches up.
+        done = threading.Event()
+        def put():
+            stage.put(done.set)
+        producer = threading.Thread(target=put)
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())
+        release.set()
+        producer.join()
+        stage.wait()
+        self.assertTrue(done.is_set())
+        stage.stop()
+
+    def test_stop_full_queue(self):
+        stage = Stage('test', maxsize=2)
+        release = threading.Event()
+        calls = []
+        stage.put(release.wait)
+        while stage.stats()['depth']:
+            release.wait(0.001)
+        stage.put(calls.append, 1)
+        stage.put(calls.append, 2)
+        # The stalled call keeps the queue full.
+        start = time.time()
+        stage.stop(timeout=0.1)
+        self.assertLess(time.time() - start, 1)
+        release.set()
+        stage._thread.join(5)
+        self.assertFalse(stage._thread.is_alive())
+        self.assertEqual(calls, [])
+
+    def test_queued_output(self):
+        stage = Stage('output')
+        calls = []
+        class Output(object):
+            def send_backspaces(self, n):
+                calls.append(('b', n))
+            def send_string(self, s):
+                calls.append(('s', s))
+        output = QueuedOutput(Output(), stage)
+        output.send_string('hello')
+        output.send_backspaces(2)
+        self.assertFalse(hasattr(output, 'send_key_combination'))
+        stage.wait()
+        self.assertEqual(calls, [('s', 'hello'), ('b', 2)])
+        stage.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for queued_logging.py."""
+
+import logging
+import threading
+import unittest
+from queued_logging import BLOCK, DROP, DROP_OLDEST, QueuedHandler
+
+class ListHandler(logging.Handler):
+    """Collects messages, blocking while the gate is closed."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+        self.flushes = 0
+        self.threads = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def emit(self, record):
+        self.gate.wait()
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread())
+
+    def flush(self):
+        self.flushes += 1
+
+def make_record(msg):
+    return logging.LogRecord('test', logging.INFO, __file__, 0, msg, None,
+                             None)
+
+class QueuedHandlerTestCase(unittest.TestCase):
+
+    def test_order(self):
+        target = ListHandler()
+        handler = QueuedHandler([target])
+        for i in xrange(1000):
+            handler.handle(make_record(str(i)))
+        handler.flush()
+        self.assertEqual(target.messages, [str(i) for i in xrange(1000)])
+        self.assertEqual(target.threads, set([handler._thread]))
+        stats = handler.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['written'], 1000)
+        self.assertEqual(stats['dropped'], 0)
+        self.assertTrue(4 <= stats['batches'] <= 1000)
+        # The target is flushed once per batch, not once per record.
+        self.assertEqual(target.flushes, stats['batches'])
+        handler.close()
+        self.assertFalse(handler._thread.is_alive())
+
+    def test_level(self):
+        target = ListHandler()
+        target.setLevel(logging.WARNING)
+        handler = QueuedHandler([target])
+        handler.handle(make_record('info'))
+        record = make_record('warning')
+        record.levelno = logging.WARNING
+        handler.handle(record)
+        handler.close()
+        self.assertEqual(target.messages, ['warning'])
+
+    def test_filter(self):
+        target = ListHandler()
+        target.addFilter(logging.Filter('other'))
+        handler = QueuedHandler([target])
+        handler.handle(make_record('test'))
+        record = make_record('other')
+        record.name = 'other'
+        handler.handle(record)
+        handler.close()
+        self.assertEqual(target.messages, ['other'])
+
+    def fill(self, policy):
+        target = ListHandler()
+        target.gate.clear()
+        handler = QueuedHandler([target], maxsize=3, policy=policy)
+        handler.handle(make_record('held'))
+        # Wait for the writer to take the first record.
+        while handler.stats()['depth']:
+            threading.Event().wait(0.001)
+        for i in xrange(5):
+            handler.handle(make_record(str(i)))
+        return target, handler
+
+    def test_drop(self):
+        target, handler = self.fill(DROP)
+        self.assertEqual(handler.stats()['dropped'], 2)
+        target.gate.set()
+        handler.close()
+        self.assertEqual(target.messages, ['held', '0', '1', '2'])
+
+    def test_drop_oldest(self):
+        target, handler = self.fill(DROP_OLDEST)
+        self.assertEqual(handler.stats()['dropped'], 2)
+        target.gate.set()
+        handler.close()
+        self.assertEqual(target.messages, ['held', '2', '3', '4'])
+
+    def test_block(self):
+        target = ListHandler()
+        target.gate.clear()
+        handler = QueuedHandler([target], maxsize=3, policy=BLOCK)
+        def log():
+            for i in xrange(10):
+                handler.handle(make_record(str(i)))
+        logger = threading.Thread(target=log)
+        logger.start()
+        logger.join(0.1)
+        self.assertTrue(logger.is_alive())
+        self.assertTrue(handler.stats()['depth'] <= 3)
+        target.gate.set()
+        logger.join()
+        handler.close()
+        self.assertEqual(target.messages, [str(i) for i in xrange(10)])
+        self.assertEqual(handler.stats()['dropped'], 0)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            QueuedHandler([], policy='never')
+
+if __name__ == '__main__':
+    unittest.main()
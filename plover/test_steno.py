@@ -0,0 +1,63 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for steno.py."""
+
+import unittest
+from steno import (STENO_KEY_MASKS, STENO_KEY_ORDER, StenoKeys, Stroke,
+                   keys_to_mask, normalize_steno)
+
+class StenoTestCase(unittest.TestCase):
+
+    def test_normalize_steno(self):
+        self.assertEqual(normalize_steno('S/T-P'), ('S', 'T-P'))
+        self.assertEqual(normalize_steno('#1-9'), ('1-9',))
+        self.assertEqual(normalize_steno('A-P'), ('AP',))
+
+    def test_stroke(self):
+        cases = (
+            (['S-', 'T-', '-P'], 'ST-P'),
+            (['-P', 'A-', 'S-'], 'SAP'),
+            (['#', 'S-', '-T'], '1-9'),
+            (['#', 'W-'], '#W'),
+            (['*'], '*'),
+            (['-Z', 'S-', '-Z'], 'S-Z'),
+        )
+        for keys, rtfcre in cases:
+            self.assertEqual(Stroke(keys).rtfcre, rtfcre)
+        self.assertTrue(Stroke(['*']).is_correction)
+        self.assertEqual(Stroke(['S-', '-P']), Stroke(['-P', 'S-']))
+        self.assertNotEqual(Stroke(['S-', '-P']), Stroke(['S-']))
+        self.assertEqual(len(set([Stroke(['S-']), Stroke(['S-'])])), 1)
+        self.assertRaises(KeyError, Stroke, ['Fn'])
+
+    def test_key_masks(self):
+        self.assertEqual(len(STENO_KEY_MASKS), len(STENO_KEY_ORDER))
+        self.assertEqual(sum(STENO_KEY_MASKS.values()),
+                         (1 << len(STENO_KEY_MASKS)) - 1)
+        self.assertEqual(keys_to_mask([]), 0)
+        self.assertEqual(keys_to_mask(['S-', 'S-']), STENO_KEY_MASKS['S-'])
+        self.assertRaises(KeyError, keys_to_mask, ['S-', 'pwr'])
+
+        keys = StenoKeys(['-P', 'A-', 'S-', 'A-'])
+        self.assertEqual(keys, ('S-', 'A-', '-P'))
+        self.assertEqual(keys.keymask, keys_to_mask(['S-', 'A-', '-P']))
+        self.assertIs(StenoKeys.from_mask(keys.keymask),
+                      StenoKeys.from_mask(keys.keymask))
+        self.assertEqual(StenoKeys.from_mask(keys.keymask), keys)
+        self.assertRaises(ValueError, StenoKeys.from_mask,
+                          1 << len(STENO_KEY_MASKS))
+
+    def test_cached_strokes(self):
+        keys = ['#', 'S-', '-T']
+        stroke = Stroke.from_keys(keys)
+        self.assertEqual(stroke, Stroke(keys))
+        self.assertEqual(stroke.rtfcre, '1-9')
+        self.assertIs(Stroke.from_keys(['-T', 'S-', '#']), stroke)
+        self.assertIs(Stroke.from_keys(StenoKeys(keys)), stroke)
+        self.assertIs(Stroke.from_keymask(keys_to_mask(keys)), stroke)
+        self.assertTrue(Stroke.from_keys(['*']).is_correction)
+        self.assertRaises(KeyError, Stroke.from_keys, ['S-', 'Fn'])
+
+if __name__ == '__main__':
+    unittest.main()
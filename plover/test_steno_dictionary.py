@@ -3,8 +3,10 @@
 
 """Unit tests for steno_dictionary.py."""
 
+import threading
 import unittest
-from steno_dictionary import StenoDictionary, load_dictionary
+from steno_dictionary import (CompactStenoDictionary, StenoDictionary,
+                              StenoDictionaryCollection, load_dictionary)
 
 class StenoDictionaryTestCase(unittest.TestCase):
 
@@ -45,6 +47,210 @@ class StenoDictionaryTestCase(unittest.TestCase):
         self.assertEqual(StenoDictionary([('a', 'b')]).items(), [('a', 'b')])
         self.assertEqual(StenoDictionary(a='b').items(), [('a', 'b')])
 
+    def test_bulk_changes(self):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+
+        d = StenoDictionary()
+        d.add_longest_key_listener(listener)
+        d.update([(('S',), 'a'), (('S', 'T'), 'b'), (('S', 'T', 'K'), 'c')])
+        self.assertEqual(d.longest_key, 3)
+        self.assertEqual(notifications, [3])
+        d.update({('T', 'K', 'P', 'W'): 'd'}, e=1)
+        self.assertEqual(d.longest_key, 4)
+        self.assertEqual(d['e'], 1)
+        self.assertEqual(notifications, [3, 4])
+        d.delete_many([('T', 'K', 'P', 'W'), ('S', 'T', 'K'), ('S', 'T')])
+        self.assertEqual(d.longest_key, 1)
+        self.assertEqual(notifications, [3, 4, 1])
+        self.assertFalse(d.has_prefix(('S',)))
+        self.assertRaises(KeyError, d.delete_many, [('S',), ('S',)])
+        self.assertEqual(d.items(), [('e', 1)])
+        self.assertEqual(notifications, [3, 4, 1])
+        d.delete_many(['e'])
+        self.assertEqual(d.longest_key, 0)
+        self.assertEqual(notifications, [3, 4, 1, 0])
+
+    def test_compact_dictionary(self):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+
+        d = CompactStenoDictionary([(('S',), 'a'), (('S', 'T'), 'b')])
+        d.add_longest_key_listener(listener)
+        self.assertEqual(d.longest_key, 2)
+        d[('T', '-P', 'S')] = u'b'
+        self.assertEqual(notifications, [3])
+        self.assertEqual(len(d), 3)
+        self.assertEqual(d[('S', 'T')], 'b')
+        self.assertEqual(d.get(('T', '-P', 'S')), u'b')
+        self.assertIsNone(d.get(('-Z',)))
+        self.assertIsNone(d.get(('S', 'T', 'K')))
+        self.assertRaises(KeyError, lambda: d[('-Z',)])
+        self.assertIn(('S',), d)
+        self.assertNotIn(('T',), d)
+        self.assertEqual(sorted(d.items()), [(('S',), 'a'), (('S', 'T'), 'b'),
+                                             (('T', '-P', 'S'), u'b')])
+        self.assertEqual(sorted(d), [('S',), ('S', 'T'), ('T', '-P', 'S')])
+        self.assertTrue(d.has_prefix(('T', '-P')))
+        self.assertFalse(d.has_prefix(('T', '-P', 'S')))
+
+        # Strokes are shared with other dictionaries and translations are
+        # stored once.
+        other = CompactStenoDictionary({(u'T', u'-P'): 'c'})
+        stroke = [k for k in d if len(k) == 3][0][0]
+        self.assertIs(other.keys()[0][0], stroke)
+        d[('-Z',)] = ''.join(['b'])
+        self.assertIs(d[('-Z',)], d[('S', 'T')])
+        # An equal translation of another type keeps its type.
+        self.assertIsInstance(d[('T', '-P', 'S')], unicode)
+        del d[('-Z',)]
+        self.assertEqual(notifications, [3])
+
+        del d[('T', '-P', 'S')]
+        self.assertEqual(notifications, [3, 2])
+        self.assertFalse(d.has_prefix(('T', '-P')))
+        self.assertRaises(KeyError, d.__delitem__, ('T', '-P', 'S'))
+        self.assertRaises(KeyError, d.__delitem__, ('-Z', '-Z'))
+        d.delete_many([('S',), ('S', 'T')])
+        self.assertEqual(notifications, [3, 2, 0])
+        self.assertEqual(d.items(), [])
+
+    def test_compact_values(self):
+        d = CompactStenoDictionary()
+        for i in xrange(10):
+            d[('S',)] = 'value %d' % i
+        d[('T',)] = 'value 9'
+        d[('-P',)] = u'value 9'
+        self.assertIsInstance(d[('-P',)], unicode)
+        # Replaced translations are pruned once there are enough of them.
+        self.assertEqual(sorted(len(values) for values in
+                                d._values.itervalues()), [1, 2])
+        del d[('S',)]
+        del d[('T',)]
+        self.assertEqual(d._values, {unicode: {u'value 9': u'value 9'}})
+        d.clear()
+        self.assertEqual(d._values, {})
+
+    def test_compact_intern_threads(self):
+        strokes = ['%d-' % i for i in xrange(2000)]
+        def load(order):
+            CompactStenoDictionary(((s,), s) for s in order)
+        threads = [threading.Thread(target=load, args=(order,))
+                   for order in (strokes, strokes[::-1], strokes[500:])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        numbers = CompactStenoDictionary._stroke_numbers
+        self.assertEqual(len(set(numbers[s] for s in strokes)), len(strokes))
+        for s in strokes:
+            self.assertEqual(CompactStenoDictionary._strokes[numbers[s]], s)
+
+    def test_prefixes(self):
+        d = StenoDictionary()
+        d[('S', 'T', 'K')] = 'a'
+        d[('S', 'T')] = 'b'
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertFalse(d.has_prefix(('S', 'T', 'K')))
+        self.assertFalse(d.has_prefix(('T',)))
+        del d[('S', 'T', 'K')]
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertFalse(d.has_prefix(('S', 'T')))
+        del d[('S', 'T')]
+        self.assertFalse(d.has_prefix(('S',)))
+        
+        c = StenoDictionaryCollection([StenoDictionary(), d])
+        self.assertFalse(c.has_prefix(('S',)))
+        d[('S', 'P')] = 'c'
+        self.assertTrue(c.has_prefix(('S',)))
+
+    def test_dictionary_collection(self):
+        notifications = []
+        def listener(longest_key):
+            notifications.append(longest_key)
+
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T',)] = 'b'
+        d2 = StenoDictionary()
+        d2[('S',)] = 'c'
+        d2[('W', 'H')] = 'd'
+        c = StenoDictionaryCollection([d1, d2])
+        c.add_longest_key_listener(listener)
+        self.assertEqual(c.longest_key, 2)
+        self.assertEqual(c[('S',)], 'a')
+        self.assertEqual(c.get(('W', 'H')), 'd')
+        self.assertIsNone(c.get(('W',)))
+        self.assertIn(('T',), c)
+        self.assertRaises(KeyError, lambda: c[('W',)])
+
+        # Changes to the dictionaries are seen by the collection.
+        d2[('S', 'T', 'K')] = 'e'
+        self.assertEqual(c.longest_key, 3)
+        self.assertEqual(c[('S', 'T', 'K')], 'e')
+        del d1[('S',)]
+        self.assertEqual(c[('S',)], 'c')
+        self.assertEqual(notifications, [3])
+
+        # Reordering changes priority.
+        d1[('S',)] = 'a'
+        c.set_dicts([d2, d1])
+        self.assertEqual(c[('S',)], 'c')
+        c.remove(d2)
+        self.assertEqual(c[('S',)], 'a')
+        self.assertEqual(c.longest_key, 1)
+        self.assertEqual(notifications, [3, 1])
+        d2[('S', 'T', 'K', 'P')] = 'f'
+        self.assertEqual(c.longest_key, 1)
+        c.insert(0, d2)
+        self.assertEqual(c.longest_key, 4)
+        self.assertEqual(c.dicts, [d2, d1])
+        c.replace(d2, StenoDictionary())
+        self.assertEqual(c.longest_key, 1)
+        self.assertEqual(notifications, [3, 1, 4, 1])
+
+    def test_value_compiler(self):
+        compiled = []
+        def compiler(value):
+            compiled.append(value)
+            return value.upper()
+
+        for cls in (StenoDictionary, CompactStenoDictionary):
+            del compiled[:]
+            d = cls()
+            d[('S',)] = 'a'
+            d[('T',)] = 'a'
+            self.assertEqual(d.lookup(('S',)), ('a', None))
+            d.set_value_compiler(compiler)
+            # Equal values are compiled once.
+            self.assertEqual(compiled, ['a'])
+            self.assertEqual(d.lookup(('T',)), ('a', 'A'))
+            d[('T',)] = 'b'
+            d.update({('S', 'P'): 'c', ('W',): 'c'})
+            self.assertEqual(compiled, ['a', 'b', 'c'])
+            self.assertEqual(d.lookup(('T',)), ('b', 'B'))
+            self.assertEqual(d.lookup(('S', 'P')), ('c', 'C'))
+            self.assertEqual(d.lookup(('K',)), (None, None))
+            del d[('T',)]
+            self.assertEqual(d.lookup(('T',)), (None, None))
+            # Compiled forms of values that are gone are pruned.
+            del d[('W',)]
+            self.assertEqual(sorted(d._compiled), ['a', 'c'])
+            d.set_value_compiler(None)
+            self.assertEqual(d.lookup(('S', 'P')), ('c', None))
+
+        d1 = StenoDictionary({('S',): 'a'})
+        d2 = StenoDictionary({('S',): 'b', ('T',): 'c'})
+        c = StenoDictionaryCollection([d1])
+        c.set_value_compiler(compiler)
+        c.insert(1, d2)
+        self.assertEqual(c.lookup(('S',)), ('a', 'A'))
+        self.assertEqual(c.lookup(('T',)), ('c', 'C'))
+        self.assertEqual(c.lookup(('W',)), (None, None))
+
     def test_load_dictionary(self):
         def assertEqual(a, b):
             self.assertEqual(a._dict, b)
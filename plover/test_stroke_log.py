@@ -0,0 +1,130 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for stroke_log.py."""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from journal import Journal
+from steno import StenoKeys
+from stroke_log import (BinaryStrokeHandler, JournalHandler, MAGIC,
+                        StrokeMessage, TextFilter, read_strokes, stroke_mask)
+
+def make_record(msg, created):
+    record = logging.LogRecord('test', logging.INFO, __file__, 0, msg, None,
+                               None)
+    record.created = created
+    return record
+
+class StrokeLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'plover.strokes')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, filename=None):
+        with open(filename or self.filename, 'rb') as f:
+            return list(read_strokes(f.read()))
+
+    def test_message(self):
+        self.assertEqual(str(StrokeMessage(['S-', '-T'])), 'Stroke(S- -T)')
+        self.assertFalse(TextFilter().filter(
+            make_record(StrokeMessage(['S-']), 0)))
+        self.assertTrue(TextFilter().filter(make_record('text', 0)))
+
+    def test_mask(self):
+        keys = StenoKeys(['S-', '-T'])
+        self.assertEqual(stroke_mask(keys), keys.keymask)
+        self.assertEqual(stroke_mask(['-T', 'S-', 'Fn']), keys.keymask)
+
+    def test_round_trip(self):
+        handler = BinaryStrokeHandler(self.filename)
+        strokes = [(1356998400.0, ['S-']), (1356998400.25, ['T-', '-T']),
+                   (1356998460.5, ['#', '*', '-Z']),
+                   (1356998460.5, ['A-', 'O-', '-E', '-U'])]
+        handler.handle(make_record('not a stroke', 1356998400.0))
+        for created, keys in strokes:
+            handler.handle(make_record(StrokeMessage(keys), created))
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        self.assertTrue(data.startswith(MAGIC))
+        # Strokes after the first take a few bytes each.
+        self.assertTrue(len(data) < len(MAGIC) + 10 + 3 * 6)
+        self.assertEqual(self.read(),
+                         [(t, StenoKeys(k)) for t, k in strokes])
+        # Appending starts from an absolute time again.
+        handler = BinaryStrokeHandler(self.filename)
+        handler.handle(make_record(StrokeMessage(['-D']), 1356998000.0))
+        handler.close()
+        self.assertEqual(self.read()[-1], (1356998000.0, StenoKeys(['-D'])))
+
+    def test_truncated(self):
+        handler = BinaryStrokeHandler(self.filename)
+        handler.handle(make_record(StrokeMessage(['S-']), 1.0))
+        handler.handle(make_record(StrokeMessage(['-Z']), 2.0))
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        self.assertEqual(list(read_strokes(data[:-1])),
+                         [(1.0, StenoKeys(['S-']))])
+        with self.assertRaises(ValueError):
+            list(read_strokes('Stroke(S-)'))
+
+    def test_rollover(self):
+        handler = BinaryStrokeHandler(self.filename, maxBytes=15,
+                                      backupCount=2)
+        for i in xrange(10):
+            handler.handle(make_record(StrokeMessage(['S-']), 100.0 + i))
+        handler.close()
+        # Every file can be read on its own.
+        times = (self.read(self.filename + '.2') +
+                 self.read(self.filename + '.1') + self.read())
+        self.assertEqual([t for t, keys in times],
+                         [100.0 + i for i in xrange(10 - len(times), 10)])
+
+    def read_journal(self, filename):
+        with Journal(filename) as journal:
+            return [(journal.start_time + t, keys)
+                    for t, keys in journal.strokes()]
+
+    def test_journal(self):
+        filename = os.path.join(self.directory, 'plover.journal')
+        handler = JournalHandler(filename)
+        now = time.time()
+        handler.handle(make_record('not a stroke', now))
+        # The journal starts when it is opened.
+        strokes = [(now + 1, ['S-']), (now + 1.25, ['T-', '-T', 'Fn']),
+                   (now + 61.5, ['#', '*', '-Z'])]
+        for created, keys in strokes:
+            handler.handle(make_record(StrokeMessage(keys), created))
+        handler.close()
+        # Journal times are system times, kept in whole milliseconds.
+        logged = self.read_journal(filename)
+        self.assertEqual([keys for t, keys in logged],
+                         [StenoKeys(['S-']), StenoKeys(['T-', '-T']),
+                          StenoKeys(['#', '*', '-Z'])])
+        start = logged[0][0]
+        for (t, keys), (created, expected) in zip(logged, strokes):
+            self.assertAlmostEqual(t - start, created - strokes[0][0],
+                                   delta=0.0015)
+
+    def test_journal_rollover(self):
+        filename = os.path.join(self.directory, 'plover.journal')
+        # The header and two strokes.
+        handler = JournalHandler(filename, maxBytes=36, backupCount=2)
+        for i in xrange(7):
+            handler.handle(make_record(StrokeMessage(['S-']), 100.0 + i))
+        handler.close()
+        self.assertEqual([len(self.read_journal(filename + suffix))
+                          for suffix in ('.2', '.1', '')], [2, 2, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for transcript.py."""
+
+import logging
+import os
+import random
+import shutil
+import StringIO
+import tempfile
+import unittest
+from mock import patch
+from journal import convert_log
+from stroke_log import BinaryStrokeHandler, StrokeMessage
+from transcript import (format_time, parse_log, plan_shards, read_log,
+                        translate_log, translate_shard, write_table,
+                        write_text)
+
+LOG = """2013-05-01 10:00:00,000 Stroke(S- -P)
+2013-05-01 10:00:00,100 *Translation(('SP',) : None)
+2013-05-01 10:00:01,250 Stroke(H- -L)
+2013-05-01 10:00:01,250 Translation(('HL',) : hello)
+2013-05-01 10:00:02,000 Stroke()
+garbage
+"""
+
+def _translate_shard_without_head(args):
+    # Pretend no shard joins up with the one before it.
+    from plover import transcript
+    rows, head, tail = transcript.translate_shard(
+        transcript._worker_dictionary, *args)
+    return rows, [], tail
+
+class TranscriptTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dictionary = os.path.join(self.dir, 'dict.json')
+        with open(self.dictionary, 'wb') as f:
+            f.write('{"HEL": "hell", "HEL/-P": "help", "-P": "{^ing}", '
+                    '"W-PB": "when", "KWR-S": "yes", "TP-PL": "{.}"}')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_log(self, strokes):
+        """Write a log with the given (seconds, keys) strokes."""
+        filename = os.path.join(self.dir, 'plover.log')
+        with open(filename, 'wb') as f:
+            for seconds, keys in strokes:
+                f.write('%s Stroke(%s)\n' % (format_time(seconds),
+                                             ' '.join(keys)))
+        return filename
+
+    def test_parse_log(self):
+        strokes = list(parse_log(StringIO.StringIO(LOG)))
+        self.assertEqual([keys for seconds, keys in strokes],
+                         [['S-', '-P'], ['H-', '-L']])
+        self.assertAlmostEqual(strokes[1][0] - strokes[0][0], 1.25)
+        self.assertEqual(format_time(strokes[1][0]), '2013-05-01 10:00:01,250')
+
+    def test_plan_shards(self):
+        times = [0, 1, 2, 10, 11, 12, 13, 30, 31]
+        self.assertEqual(plan_shards(times, 2, 5), [0, 3, 7])
+        self.assertEqual(plan_shards(times, 4, 5), [0, 7])
+        self.assertEqual(plan_shards(times, 2, 100), [0])
+
+    def make_strokes(self):
+        words = [['W-', '-P', '-B'], ['H-', '-E', '-L'], ['-P'],
+                 ['T-', 'P-', '-P', '-L'], ['K-', 'W-', 'R-', '-S'],
+                 ['*'], ['Fn']]
+        rng = random.Random(1)
+        strokes = []
+        seconds = 1367400000
+        for i in xrange(200):
+            seconds += 0.5 if i % 10 else 60
+            strokes.append((seconds, rng.choice(words)))
+        # A word finished and one corrected right after a pause.
+        strokes[100] = (strokes[100][0], ['-P'])
+        strokes[150] = (strokes[150][0], ['*'])
+        return strokes
+
+    def test_translate_log(self):
+        strokes = self.make_strokes()
+        log = self.write_log(strokes)
+
+        times, rows = translate_log([log], [self.dictionary], jobs=1)
+        self.assertEqual(len(times), len(strokes))
+        out = StringIO.StringIO()
+        write_text(rows, out)
+        expected = out.getvalue()
+        self.assertIn('help', expected)
+        self.assertIn('. Yes', expected)
+        for shard_size in (1, 7, 30):
+            with patch('plover.transcript.MIN_SHARD_SIZE', shard_size):
+                sharded_times, sharded_rows = translate_log(
+                    [log], [self.dictionary], jobs=2, min_gap=30)
+            self.assertEqual(sharded_rows, rows)
+            out = StringIO.StringIO()
+            write_text(sharded_rows, out)
+            self.assertEqual(out.getvalue(), expected)
+
+        out = StringIO.StringIO()
+        write_table(times, rows, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), len(rows))
+        self.assertEqual(lines[0].split('\t'),
+                         [format_time(times[rows[0][0]]),
+                          '/'.join(rows[0][2]), rows[0][3]])
+
+    def test_translate_log_retry(self):
+        log = self.write_log(self.make_strokes())
+        rows = translate_log([log], [self.dictionary], jobs=1)[1]
+        with patch('plover.transcript.MIN_SHARD_SIZE', 7), \
+             patch('plover.transcript._translate_shard_in_worker',
+                   _translate_shard_without_head), \
+             patch('plover.transcript.translate_shard',
+                   wraps=translate_shard) as retry:
+            sharded_rows = translate_log([log], [self.dictionary], jobs=2,
+                                         min_gap=30)[1]
+        self.assertEqual(sharded_rows, rows)
+        # The log has 7 shards and each boundary is translated again once,
+        # from just before it.
+        self.assertEqual(retry.call_count, 6)
+
+    def test_write_text(self):
+        out = StringIO.StringIO()
+        rows = [(0, 0, ('A',), 'a', ('a' * 5000,)), (1, 1, ('B',), 'b', (1,))]
+        write_text(rows, out)
+        self.assertEqual(out.getvalue(), 'a' * 4999)
+        rows.append((2, 2, ('C',), 'c', (2000,)))
+        self.assertRaises(ValueError, write_text, rows, StringIO.StringIO())
+
+    def test_journal(self):
+        strokes = [(1367400000 + i * 0.5, ['H-', '-E', '-L']) for i in
+                   xrange(10)]
+        log = self.write_log(strokes)
+        journal = os.path.join(self.dir, 'plover.journal')
+        convert_log(read_log(log), journal)
+        binary = os.path.join(self.dir, 'plover.strokes')
+        handler = BinaryStrokeHandler(binary)
+        for seconds, keys in strokes:
+            record = logging.LogRecord('test', logging.INFO, __file__, 0,
+                                       StrokeMessage(keys), None, None)
+            record.created = seconds
+            handler.handle(record)
+        handler.close()
+        start, end = strokes[3][0], strokes[7][0]
+        for filename in (log, journal, binary):
+            logged = list(read_log(filename, start, end))
+            self.assertEqual([tuple(keys) for seconds, keys in logged],
+                             [('H-', '-E', '-L')] * 4)
+            self.assertAlmostEqual(logged[0][0], start, places=3)
+        self.assertEqual(translate_log([journal], [self.dictionary],
+                                       jobs=1)[1],
+                         translate_log([log], [self.dictionary], jobs=1)[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -195,6 +195,83 @@ class TranslatorTestCase(unittest.TestCase):
                            [Translation([Stroke('P')], d)], 
                            Translation([Stroke('S'), Stroke('P')], d))])
 
+    def test_retranslate(self):
+        output = []
+        def listener(undo, do, prev):
+            output.append((undo, do, prev))
+
+        d = StenoDictionary()
+        t = Translator()
+        t.set_dictionary(d)
+        t.set_min_undo_length(10)
+        for rtfcre in ('T', 'S', 'P'):
+            t.translate(Stroke(rtfcre))
+        t.add_listener(listener)
+        d[('S', 'P')] = 'hi'
+        t.retranslate(2)
+        self.assertEqual(output, [([Translation([Stroke('S')], d),
+                                    Translation([Stroke('P')], d)],
+                                   [Translation([Stroke('S'), Stroke('P')], d)],
+                                   Translation([Stroke('T')], d))])
+        self.assertEqual(t.get_state().translations,
+                         [Translation([Stroke('T')], d),
+                          Translation([Stroke('S'), Stroke('P')], d)])
+
+        # Only whole translations are retranslated.
+        del output[:]
+        del d[('S', 'P')]
+        t.retranslate(1)
+        self.assertEqual(output, [([Translation([Stroke('S'), Stroke('P')], d)],
+                                   [Translation([Stroke('S')], d),
+                                    Translation([Stroke('P')], d)],
+                                   Translation([Stroke('T')], d))])
+
+        # Retranslating a stroke can join it with an earlier translation.
+        del output[:]
+        d[('S', 'P')] = 'hi'
+        t.retranslate(1)
+        self.assertEqual(output, [([Translation([Stroke('S')], d),
+                                    Translation([Stroke('P')], d)],
+                                   [Translation([Stroke('S'), Stroke('P')], d)],
+                                   Translation([Stroke('T')], d))])
+
+        del output[:]
+        t.clear_state()
+        t.retranslate(10)
+        self.assertEqual(output, [])
+
+    def test_translate_many(self):
+        d = StenoDictionary()
+        d[('S', 'P')] = 'hi'
+        d[('T', 'S', 'P')] = 'tip'
+        d[('P',)] = 'p'
+        strokes = [Stroke(s, s == '*') for s in
+                   'T S P S P * * S T P T S P * * * * S * P'.split()]
+
+        for undo_length in (0, 1, 3, 10):
+            # What translating one stroke at a time leaves on the screen.
+            screen = []
+            def listener(undo, do, prev):
+                for u in reversed(undo):
+                    self.assertIs(screen.pop(), u)
+                screen.extend(do)
+            t = Translator()
+            t.set_dictionary(d)
+            t.set_min_undo_length(undo_length)
+            t.add_listener(listener)
+            for stroke in strokes:
+                t.translate(stroke)
+
+            output = []
+            def other_listener(undo, do, prev):
+                output.append((undo, do, prev))
+            t.add_listener(other_listener)
+            for batch in (0, 2, 256):
+                with patch('plover.translation._TRANSLATE_MANY_BATCH', batch):
+                    committed = list(t.translate_many(iter(strokes)))
+                self.assertEqual(committed, screen)
+            self.assertEqual(output, [])
+
     def test_translator(self):
 
         # It's not clear that this test is needed anymore. There are separate 
@@ -527,6 +604,24 @@ class TranslateStrokeTestCase(unittest.TestCase):
         self.assertTranslations(self.lt('P P'))
         self.assertOutput(self.lt('P/P/-D'), self.lt('P P'), None)
 
+    def test_skip_impossible_lookups(self):
+        self.define('S/T/-B/-G', 'long')
+        self.s.translations = self.lt('P T -B')
+        lookups = []
+        get = self.d.get
+        lookup = self.d.lookup
+        def counting_get(key, default=None):
+            lookups.append(key)
+            return get(key, default)
+        def counting_lookup(key):
+            lookups.append(key)
+            return lookup(key)
+        self.d.get = counting_get
+        self.d.lookup = counting_lookup
+        self.translate(Stroke('-G'))
+        self.assertEqual(lookups, [('-G',)])
+        self.assertTranslations(self.lt('P T -B -G'))
+
     def test_undo_tail(self):
         self.s.tail = self.t('T/A/I/L')
         self.translate(Stroke('*', True))
@@ -0,0 +1,435 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Rebuild transcripts from stroke logs.
+
+The engine logs every stroke to plover.log, or to the binary logs of the
+binary_stroke_log and stroke_journal options, see plover.stroke_log. This
+module translates the logged strokes again with the current dictionaries,
+without any OS output, and writes the resulting text or a table with one row
+per translation.
+
+Run with: python -m plover.transcript [options] logfile...
+
+Long logs are split into shards at pauses in writing, which are translated in
+parallel worker processes. Each shard starts translating a little before its
+first stroke so the translator and formatter are in the same state as when
+translating the whole log. The translations of that overlap are compared with
+the end of the previous shard, and when they differ, for example because a
+word was finished or corrected right after the pause, the shard is translated
+again from a little before the pause.
+
+"""
+
+import argparse
+import codecs
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import plover.config as conf
+import plover.journal as journal
+import plover.stroke_log as stroke_log
+from plover.dictionary_cache import CompiledDictionary, load_dictionary_file
+from plover.formatting import _TEXT_HOLD, Formatter, _TextOutput
+from plover.steno import Stroke, normalize_steno
+from plover.steno_dictionary import (CompactStenoDictionary,
+                                     StenoDictionaryCollection)
+from plover.translation import Translator
+
+# The undo history kept by the translator, the same as in the engine.
+UNDO_LENGTH = 10
+
+# Only pauses at least this long, in seconds, are used to split shards.
+DEFAULT_MIN_GAP = 5.0
+
+# The smallest number of strokes in a shard.
+MIN_SHARD_SIZE = 2000
+
+_STROKE_LINE = re.compile(
+    r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d+) Stroke\((.*)\)\s*$')
+
+_LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_log(lines):
+    """Yield the strokes in stroke log lines.
+
+    Lines that are not stroke lines, like logged translations, are skipped.
+
+    Arguments:
+
+    lines -- An iterable of log lines as written by StenoEngine.
+
+    Yields (time, steno keys) tuples where time is in seconds since the epoch.
+
+    """
+    last_date = None
+    last_seconds = None
+    for line in lines:
+        match = _STROKE_LINE.match(line)
+        if match is None:
+            continue
+        date, millis, keys = match.groups()
+        keys = keys.split()
+        if not keys:
+            continue
+        if date != last_date:
+            last_date = date
+            last_seconds = time.mktime(time.strptime(date, _LOG_TIME_FORMAT))
+        yield last_seconds + int(millis) / 1000.0, keys
+
+def read_log(filename, start=None, end=None):
+    """Yield the strokes in a stroke log, binary stroke log or journal.
+
+    Arguments:
+
+    filename -- A log written by StenoEngine, or a binary stroke log or
+    journal, see plover.stroke_log.
+
+    start, end -- Only strokes at or after start and before end, in seconds
+    since the epoch, are yielded. A journal is read from start without
+    reading the strokes before it.
+
+    Yields (time, steno keys) tuples where time is in seconds since the epoch.
+
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(max(len(journal.MAGIC), len(stroke_log.MAGIC)))
+        is_journal = magic.startswith(journal.MAGIC)
+        if not is_journal:
+            f.seek(0)
+            if magic.startswith(stroke_log.MAGIC):
+                strokes = stroke_log.read_strokes(f.read())
+            else:
+                strokes = parse_log(f)
+            for seconds, keys in strokes:
+                if start is not None and seconds < start:
+                    continue
+                if end is not None and seconds >= end:
+                    continue
+                yield seconds, keys
+            return
+    with journal.Journal(filename) as strokes:
+        offset = strokes.start_time
+        for seconds, keys in strokes.strokes_between(
+            0.0 if start is None else start - offset,
+            None if end is None else end - offset):
+            yield offset + seconds, keys
+
+def format_time(seconds):
+    """Format a time like the log does."""
+    return '%s,%03d' % (time.strftime(_LOG_TIME_FORMAT,
+                                      time.localtime(seconds)),
+                        int(round(seconds % 1 * 1000)) % 1000)
+
+def parse_time(text):
+    """Return the seconds since the epoch of a time formatted like the log."""
+    return time.mktime(time.strptime(text, _LOG_TIME_FORMAT))
+
+def load_dictionaries(filenames):
+    """Load dictionary files as a StenoDictionaryCollection.
+
+    Arguments:
+
+    filenames -- Dictionary files, absolute or relative to the configuration
+    directory, from highest to lowest priority.
+
+    """
+    dicts = []
+    for filename in filenames:
+        path = os.path.join(conf.CONFIG_DIR, filename)
+        if os.path.splitext(path)[1] == '.json':
+            dicts.append(load_dictionary_file(path))
+            continue
+        # Other formats are read with the dictionary manager's loaders.
+        from dictionarymanager.store.ParallelLoader import getLoaderClass
+        loader_class = getLoaderClass(path)
+        if loader_class is None:
+            raise ValueError('Unknown dictionary format %s.' % filename)
+        data, dict_conf = loader_class().load(path)
+        dicts.append(CompactStenoDictionary(
+            (normalize_steno(k), v) for k, v in data.iteritems()))
+    return StenoDictionaryCollection(dicts)
+
+def close_dictionaries(dictionary):
+    """Unmap the compiled dictionaries of load_dictionaries."""
+    for d in dictionary.dicts:
+        if isinstance(d, CompiledDictionary):
+            d.close()
+
+class _LoggedStroke(object):
+    """A stroke that knows its position in the log."""
+    __slots__ = ('rtfcre', 'is_correction', 'index')
+
+    def __init__(self, stroke, index):
+        self.rtfcre = stroke.rtfcre
+        self.is_correction = stroke.is_correction
+        self.index = index
+
+class _RecordingOutput(object):
+    """An output that records the text instructions it is sent."""
+
+    def __init__(self):
+        self.instructions = []
+
+    def send_backspaces(self, n):
+        self.instructions.append(n)
+
+    def send_string(self, s):
+        self.instructions.append(s)
+
+    def take(self):
+        instructions = tuple(self.instructions)
+        del self.instructions[:]
+        return instructions
+
+def translate_shard(dictionary, offset, begin, tail_from, keys):
+    """Translate logged strokes.
+
+    Arguments:
+
+    dictionary -- The dictionary to translate with.
+
+    offset -- The log index of the first stroke in keys.
+
+    begin -- The log index of the first stroke whose translations are kept.
+    The strokes before it only set up the translator and formatter.
+
+    tail_from -- Translations starting at this log index or later are
+    returned again for comparison with the start of the next shard.
+
+    keys -- The steno keys of the strokes.
+
+    Returns a tuple (rows, head, tail). rows has a tuple (first index, last
+    index, rtfcre, english, instructions) for each kept translation, where
+    instructions are the backspace counts and strings it output. head and
+    tail describe the translations before begin and from tail_from as lists
+    of (first index, last index, english, formatting).
+
+    """
+    strokes = []
+    for index, steno_keys in enumerate(keys, offset):
+        try:
+            stroke = Stroke.from_keys(steno_keys)
+        except KeyError:
+            # The engine can't translate these either.
+            continue
+        strokes.append(_LoggedStroke(stroke, index))
+    translator = Translator()
+    translator.set_dictionary(dictionary)
+    translator.set_min_undo_length(UNDO_LENGTH)
+    output = _RecordingOutput()
+    formatter = Formatter()
+    formatter.set_output(output)
+    rows = []
+    head = []
+    tail = []
+    prev = None
+    for t in translator.translate_many(strokes):
+        formatter.format([], [t], prev)
+        prev = t
+        instructions = output.take()
+        first = t.strokes[0].index
+        last = t.strokes[-1].index
+        if first < begin:
+            head.append((first, last, t.english, t.formatting))
+            continue
+        rows.append((first, last, t.rtfcre, t.english, instructions))
+        if tail_from is not None and first >= tail_from:
+            tail.append((first, last, t.english, t.formatting))
+    return rows, head, tail
+
+_worker_dictionary = None
+
+def _init_worker(filenames):
+    global _worker_dictionary
+    _worker_dictionary = load_dictionaries(filenames)
+
+def _translate_shard_in_worker(args):
+    return translate_shard(_worker_dictionary, *args)
+
+def plan_shards(times, shard_size, min_gap):
+    """Return the log index of the first stroke of each shard.
+
+    A shard ends at the first pause of at least min_gap seconds after it has
+    shard_size strokes.
+
+    """
+    starts = [0]
+    for i in xrange(1, len(times)):
+        if i - starts[-1] >= shard_size and times[i] - times[i - 1] >= min_gap:
+            starts.append(i)
+    return starts
+
+def translate_log(filenames, dictionary_files, jobs=None,
+                  min_gap=DEFAULT_MIN_GAP, start=None, end=None):
+    """Translate the strokes in log files.
+
+    Arguments:
+
+    filenames -- Log or journal files, oldest first.
+
+    dictionary_files -- Dictionary files, from highest to lowest priority.
+
+    jobs -- The number of worker processes, defaults to the number of cores.
+
+    min_gap -- The shortest pause in seconds at which the log may be split.
+
+    start, end -- The time range of the strokes to translate, see read_log.
+
+    Returns the log times of the strokes and the translation rows, as
+    described in translate_shard, in order.
+
+    """
+    times = []
+    keys = []
+    for filename in filenames:
+        for seconds, steno_keys in read_log(filename, start, end):
+            times.append(seconds)
+            keys.append(steno_keys)
+    dictionary = load_dictionaries(dictionary_files)
+    try:
+        return times, _translate_keys(dictionary, dictionary_files, times,
+                                      keys, jobs, min_gap)
+    finally:
+        close_dictionaries(dictionary)
+
+def _translate_keys(dictionary, dictionary_files, times, keys, jobs, min_gap):
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    shard_size = max(len(keys) / (jobs * 4), MIN_SHARD_SIZE)
+    starts = plan_shards(times, shard_size, min_gap) if jobs > 1 else [0]
+    ends = starts[1:] + [len(keys)]
+    # Enough strokes before a shard to rebuild the undo history, including
+    # translations that started before it.
+    overlap = max(dictionary.longest_key, UNDO_LENGTH) + dictionary.longest_key
+
+    def shard_args(begin, end):
+        # A shard reports its translations from twice the overlap before its
+        # end, so a failed join can translate again from inside the shard and
+        # still be checked.
+        offset = max(begin - overlap, 0)
+        tail_from = end - 2 * overlap if end < len(keys) else None
+        return offset, begin, tail_from, keys[offset:end]
+
+    args = [shard_args(start, end) for start, end in zip(starts, ends)]
+    if len(args) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(args)), _init_worker,
+                                    (dictionary_files,))
+        try:
+            results = pool.map(_translate_shard_in_worker, args)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = [translate_shard(dictionary, *a) for a in args]
+
+    def joins(head, tail, offset, begin):
+        # The translations before a shard must match the ones already made.
+        # The first few strokes may belong to a translation that started
+        # before the shard's strokes, and the first translation is formatted
+        # without knowing the one before it, so they are left out.
+        if offset > 0:
+            offset += dictionary.longest_key
+        head = [t for t in head if t[0] >= offset]
+        tail = [t for t in tail if offset <= t[0] < begin]
+        return (bool(head) and [t[:3] for t in head] == [t[:3] for t in tail]
+                and head[1:] == tail[1:])
+
+    rows, tail = results[0][0], results[0][2]
+    # Everything from here on translates the same as a single pass would.
+    start = 0
+    for i in xrange(1, len(results)):
+        next_rows, next_head, next_tail = results[i]
+        if joins(next_head, tail, args[i][0], starts[i]):
+            rows.extend(next_rows)
+            start = starts[i]
+        else:
+            # Translate again from a little before the boundary, where the
+            # rows are still right, and check the start against them.
+            begin = max(starts[i] - overlap, start)
+            offset = shard_args(begin, ends[i])[0]
+            next_rows, next_head, next_tail = translate_shard(
+                dictionary, *shard_args(begin, ends[i]))
+            if begin > start and not joins(next_head, tail, offset, begin):
+                # Only the last known good point is left.
+                begin = start
+                next_rows, next_head, next_tail = translate_shard(
+                    dictionary, *shard_args(begin, ends[i]))
+            while rows and rows[-1][0] >= begin:
+                rows.pop()
+            rows.extend(next_rows)
+            start = begin
+        tail_from = ends[i] - 2 * overlap
+        tail = [t for t in tail if t[0] >= tail_from] + next_tail
+    return rows
+
+def write_text(rows, out):
+    """Write the text output by translation rows.
+
+    Raises ValueError if a translation deletes text that was already written.
+
+    """
+    output = _TextOutput()
+    for row in rows:
+        for instruction in row[4]:
+            if isinstance(instruction, int):
+                output.send_backspaces(instruction)
+            else:
+                output.send_string(instruction)
+        out.write(output.take(_TEXT_HOLD))
+    out.write(output.text)
+
+def write_table(times, rows, out):
+    """Write a tab separated table with one row per translation."""
+    for first, last, rtfcre, english, instructions in rows:
+        out.write(u'%s\t%s\t%s\n' % (format_time(times[first]),
+                                      '/'.join(rtfcre),
+                                      english if english is not None else ''))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Translate plover stroke logs again.')
+    parser.add_argument('logs', metavar='LOG', nargs='+',
+                        help='stroke log or journal files, oldest first')
+    parser.add_argument('-d', '--dictionary', action='append',
+                        help='dictionary file, the first has the highest '
+                             'priority (default: the configured dictionaries)')
+    parser.add_argument('-f', '--format', choices=('text', 'table'),
+                        default='text', help='output format')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='worker processes (default: number of cores)')
+    parser.add_argument('--min-gap', type=float, default=DEFAULT_MIN_GAP,
+                        help='shortest pause in seconds to split the log at')
+    parser.add_argument('--start', type=parse_time,
+                        help='translate strokes from this time, like '
+                             '"2013-05-01 10:00:00"')
+    parser.add_argument('--end', type=parse_time,
+                        help='translate strokes before this time')
+    options = parser.parse_args(args)
+
+    dictionary_files = options.dictionary
+    if not dictionary_files:
+        dictionary_files = conf.get_option_as_list(
+            conf.get_config(), conf.DICTIONARY_CONFIG_SECTION,
+            conf.DICTIONARY_FILE_OPTION)
+    times, rows = translate_log(options.logs, dictionary_files, options.jobs,
+                                options.min_gap, options.start, options.end)
+    if options.output:
+        out = codecs.open(options.output, 'w', 'utf-8')
+    else:
+        out = codecs.getwriter('utf-8')(sys.stdout)
+    try:
+        if options.format == 'table':
+            write_table(times, rows, out)
+        else:
+            write_text(rows, out)
+    finally:
+        if options.output:
+            out.close()
+
+if __name__ == '__main__':
+    main()
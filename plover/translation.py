@@ -16,8 +16,17 @@ emits one or more Translation objects based on a greedy conversion algorithm.
 
 """
 
+import threading
+import latency
 from steno_dictionary import StenoDictionary
 
+def _lookup(dictionary, rtfcre):
+    """Return the translation of rtfcre and its compiled form, if any."""
+    lookup = getattr(dictionary, 'lookup', None)
+    if lookup is None:
+        return dictionary.get(rtfcre, None), None
+    return lookup(rtfcre)
+
 class Translation(object):
     """A data model for the mapping between a sequence of Strokes and a string.
 
@@ -41,9 +50,14 @@ class Translation(object):
     formatting -- Information stored on the translation by the formatter for
     sticky state (e.g. capitalize next stroke) and to hold undo info.
 
+    template -- The compiled form of english kept by the dictionary, if any.
+    See StenoDictionary.set_value_compiler.
+
     """
+    __slots__ = ('strokes', 'rtfcre', 'english', 'template', 'replaced',
+                 'formatting')
 
-    def __init__(self, strokes, rtfcreDict):
+    def __init__(self, strokes, rtfcreDict, found=None):
         """Create a translation by looking up strokes in a dictionary.
 
         Arguments:
@@ -53,10 +67,15 @@ class Translation(object):
         rtfcreDict -- A dictionary that maps strings in RTF/CRE format
         to English phrases or meta commands.
 
+        found -- The english and template of the strokes if they were already
+        looked up in rtfcreDict, so they aren't looked up again.
+
         """
         self.strokes = strokes
         self.rtfcre = tuple(s.rtfcre for s in strokes)
-        self.english = rtfcreDict.get(self.rtfcre, None)
+        if found is None:
+            found = _lookup(rtfcreDict, self.rtfcre)
+        self.english, self.template = found
         self.replaced = []
         self.formatting = None
 
@@ -106,8 +125,12 @@ class Translator(object):
     A Translator takes input via the translate method and provides translation
     output to every function that has registered via the add_callback method.
 
+    The dictionary may be changed from another thread while strokes are being
+    translated, for example while dictionaries are loaded in the background.
+
     """
     def __init__(self):
+        self._lock = threading.RLock()
         self._undo_length = 0
         self._dictionary = None
         self.set_dictionary(StenoDictionary())
@@ -116,8 +139,80 @@ class Translator(object):
 
     def translate(self, stroke):
         """Process a single stroke."""
-        _translate_stroke(stroke, self._state, self._dictionary, self._output)
-        self._resize_translations()
+        with self._lock:
+            _translate_stroke(stroke, self._state, self._dictionary,
+                              self._output)
+            self._resize_translations()
+
+    def retranslate(self, n):
+        """Translate the last strokes again with the current dictionary.
+
+        The translations covering the last n strokes are undone and their
+        strokes are translated again. Listeners receive the difference as a
+        single output. Only strokes that are still in the undo history can be
+        retranslated.
+
+        Arguments:
+
+        n -- The number of strokes to retranslate.
+
+        """
+        with self._lock:
+            state = self._state
+            old = list(state.translations)
+            strokes = []
+            while state.translations and len(strokes) < n:
+                strokes[0:0] = state.translations.pop().strokes
+            if not strokes:
+                return
+            def ignore(undo, do, prev):
+                pass
+            for stroke in strokes:
+                _translate_stroke(stroke, state, self._dictionary, ignore)
+            new = state.translations
+            i = 0
+            while i < min(len(old), len(new)) and old[i] is new[i]:
+                i += 1
+            prev = new[i - 1] if i else state.tail
+            self._output(old[i:], new[i:], prev)
+            self._resize_translations()
+
+    def translate_many(self, strokes):
+        """Translate a sequence of strokes and yield the committed translations.
+
+        A translation is committed once it drops out of the undo history, so
+        it can no longer be replaced or undone, and all remaining translations
+        are committed at the end. Listeners are not called and the translator's
+        own state is not used, which makes this suitable for translating stroke
+        logs offline. Corrections undo exactly what they would undo when
+        translating one stroke at a time.
+
+        Arguments:
+
+        strokes -- An iterable of Stroke objects.
+
+        """
+        with self._lock:
+            dictionary = self._dictionary
+            undo_length = self._undo_length
+        state = _State()
+        def ignore(undo, do, prev):
+            pass
+        # The history is trimmed in batches rather than after every stroke.
+        # Only corrections reach further back than the longest key, so the
+        # history is trimmed exactly before each of them.
+        batch = _TRANSLATE_MANY_BATCH
+        for stroke in strokes:
+            size = max(dictionary.longest_key, undo_length)
+            if stroke.is_correction:
+                for t in state.restrict_size(size):
+                    yield t
+            _translate_stroke(stroke, state, dictionary, ignore)
+            if len(state.translations) > size + batch:
+                for t in state.restrict_size(size):
+                    yield t
+        for t in state.translations:
+            yield t
 
     def set_dictionary(self, d):
         """Set the dictionary."""
@@ -150,10 +245,13 @@ class Translator(object):
         dictionary.
 
         """
-        self._undo_length = n
-        self._resize_translations()
+        with self._lock:
+            self._undo_length = n
+            self._resize_translations()
 
     def _output(self, undo, do, prev):
+        if latency.enabled:
+            latency.mark('translate')
         for callback in self._listeners:
             callback(undo, do, prev)
 
@@ -162,7 +260,8 @@ class Translator(object):
                                       self._undo_length))
 
     def _dict_callback(self, value):
-        self._resize_translations()
+        with self._lock:
+            self._resize_translations()
         
     def get_state(self):
         """Get the state of the translator."""
@@ -170,11 +269,16 @@ class Translator(object):
         
     def set_state(self, state):
         """Set the state of the translator."""
-        self._state = state
+        with self._lock:
+            self._state = state
         
     def clear_state(self):
         """Reset the sate of the translator."""
-        self._state = _State()
+        with self._lock:
+            self._state = _State()
+
+# Translations kept beyond the undo history before translate_many trims it.
+_TRANSLATE_MANY_BATCH = 256
 
 class _State(object):
     """An object representing the current state of the translator state machine.
@@ -197,7 +301,11 @@ class _State(object):
         return self.tail
 
     def restrict_size(self, n):
-        """Reduce the history of translations to n."""
+        """Reduce the history of translations to n.
+
+        Returns the translations that were removed.
+
+        """
         stroke_count = 0
         translation_count = 0
         for t in reversed(self.translations):
@@ -206,9 +314,12 @@ class _State(object):
             if stroke_count >= n:
                 break
         translation_index = len(self.translations) - translation_count
-        if translation_index:
-            self.tail = self.translations[translation_index - 1]
+        if not translation_index:
+            return []
+        removed = self.translations[:translation_index]
+        self.tail = removed[-1]
         del self.translations[:translation_index]
+        return removed
 
 def _translate_stroke(stroke, state, dictionary, callback):
     """Process a stroke.
@@ -252,16 +363,20 @@ def _translate_stroke(stroke, state, dictionary, callback):
         
         # The new stroke can either create a new translation or replace
         # existing translations by matching a longer entry in the
-        # dictionary.
+        # dictionary. Strokes that don't start any longer entry can't be
+        # extended by the new stroke so they are not looked up.
+        rtfcre = tuple(s.rtfcre for s in strokes)
+        start = 0
         for i in xrange(translation_index, len(state.translations)):
-            t = Translation(strokes, dictionary)
-            if t.english != None:
-                t.replaced = state.translations[i:]
-                undo.extend(t.replaced)
-                do.append(t)
-                break
-            else:
-                del strokes[:len(state.translations[i])]
+            if dictionary.has_prefix(rtfcre[start:-1]):
+                found = _lookup(dictionary, rtfcre[start:])
+                if found[0] is not None:
+                    t = Translation(strokes[start:], dictionary, found)
+                    t.replaced = state.translations[i:]
+                    undo.extend(t.replaced)
+                    do.append(t)
+                    break
+            start += len(state.translations[i])
         else:
             do.append(Translation([stroke], dictionary))
     
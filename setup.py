@@ -26,7 +26,7 @@ setup(name='plover',
       package_data={'plover' : ['assets/*']},
       data_files=[('/usr/share/applications', ['application/Plover.desktop']),
                   ('/usr/share/pixmaps', ['plover/assets/plover_on.png']),],
-      scripts=['application/plover'],
+      scripts=['application/plover', 'application/plovertranscript'],
       requires=['serial', 'Xlib', 'wx', 'appdirs'],
       platforms=['GNU/Linux'],
       classifiers=['Programming Language :: Python',
@@ -1,7 +1,10 @@
 # -*- mode: python -*-
 a = Analysis(['..\\application\\plover'],
              pathex=['..'],
-             hiddenimports=[],
+             hiddenimports=['plover.machine.geminipr',
+                            'plover.machine.txbolt',
+                            'plover.machine.sidewinder',
+                            'plover.machine.stentura'],
              hookspath=None)
 pyz = PYZ(a.pure)
 exe = EXE(pyz,